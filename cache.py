@@ -0,0 +1,180 @@
+import inspect
+import threading
+from concurrent.futures import Future
+
+import pandas as pd
+
+# SHARED SNAPSHOT CACHE
+# what a snapshot's loaders build, held once per server process and handed to every session as is.
+# The frames are frozen: anything that would change one in place raises, while what is derived from
+# one (a filter, a copy, an assign) is an ordinary frame the view owns
+
+class FrozenError(TypeError):
+  pass
+
+def frozen():
+  return FrozenError('frames from the snapshot cache are shared by every session and read-only, work on a copy')
+
+class FrozenIndexer:
+  # .loc, .iloc, .at and .iat that read as usual and refuse to write
+  def __init__(self, indexer):
+    self.indexer = indexer
+
+  def __getitem__(self, key):
+    return self.indexer[key]
+
+  def __setitem__(self, key, value):
+    raise frozen()
+
+  def __call__(self, *args, **kwargs):
+    return FrozenIndexer(self.indexer(*args, **kwargs))
+
+  def __getattr__(self, name):
+    return getattr(self.indexer, name)
+
+class Frozen:
+  # mixed into a pandas class ahead of it; results are built with the plain class, so they are not frozen
+  _frozen = False
+
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    object.__setattr__(self, '_frozen', True)
+
+  def __setattr__(self, name, value):
+    # columns, index, name and the like; pandas keeps its own state in underscored attributes
+    if self._frozen and not name.startswith('_'):
+      raise frozen()
+    super().__setattr__(name, value)
+
+  def __setitem__(self, key, value):
+    raise frozen()
+
+  def __delitem__(self, key):
+    raise frozen()
+
+  @property
+  def loc(self):
+    return FrozenIndexer(super().loc)
+
+  @property
+  def iloc(self):
+    return FrozenIndexer(super().iloc)
+
+  @property
+  def at(self):
+    return FrozenIndexer(super().at)
+
+  @property
+  def iat(self):
+    return FrozenIndexer(super().iat)
+
+  @property
+  def values(self):
+    return read_only_array(super().values)
+
+  def to_numpy(self, *args, **kwargs):
+    return read_only_array(super().to_numpy(*args, **kwargs))
+
+def read_only_array(values):
+  # a view of its own, so the flag does not reach anyone else's
+  if hasattr(values, 'view') and hasattr(values, 'flags'):
+    values = values.view()
+    values.flags.writeable = False
+  return values
+
+def refuse(name):
+  def method(self, *args, **kwargs):
+    raise frozen()
+  method.__name__ = name
+  return method
+
+def refuse_inplace(cls, base):
+  # every method taking inplace refuses it, and the ones that always change the object refuse outright
+  for name, member in inspect.getmembers(base, callable):
+    if name.startswith('__i') and name[3:-2] in ('add', 'sub', 'mul', 'truediv', 'floordiv', 'mod', 'pow', 'and', 'or', 'xor'):
+      setattr(cls, name, refuse(name))
+      continue
+    try:
+      signature = inspect.signature(member)
+    except (TypeError, ValueError):
+      continue
+    if 'inplace' in signature.parameters:
+      setattr(cls, name, inplace_guard(member, signature))
+  for name in ('insert', 'pop', 'update', 'isetitem'):
+    if hasattr(base, name):
+      setattr(cls, name, refuse(name))
+  return cls
+
+def inplace_guard(member, signature):
+  def method(self, *args, **kwargs):
+    try:
+      inplace = signature.bind(self, *args, **kwargs).arguments.get('inplace', False)
+    except TypeError:
+      inplace = kwargs.get('inplace', False)
+    if inplace:
+      raise frozen()
+    return member(self, *args, **kwargs)
+  method.__name__ = member.__name__
+  return method
+
+class FrozenSeries(Frozen, pd.Series):
+  @property
+  def _constructor(self):
+    return pd.Series
+
+  @property
+  def _constructor_expanddim(self):
+    return pd.DataFrame
+
+class FrozenFrame(Frozen, pd.DataFrame):
+  @property
+  def _constructor(self):
+    return pd.DataFrame
+
+  @property
+  def _constructor_sliced(self):
+    # a column read from the frame shares its values, so it is frozen too
+    return FrozenSeries
+
+refuse_inplace(FrozenSeries, pd.Series)
+refuse_inplace(FrozenFrame, pd.DataFrame)
+
+def read_only(value):
+  # a frame, or a tuple of them, as the loaders return them; anything else is handed out as it is
+  if isinstance(value, tuple):
+    return tuple(read_only(item) for item in value)
+  if isinstance(value, pd.DataFrame) and not isinstance(value, FrozenFrame):
+    return FrozenFrame(value)
+  return value
+
+class SnapshotCache:
+  def __init__(self, keep):
+    self.keep = keep
+    # only guards the entries, never held while one builds
+    self.lock = threading.Lock()
+    self.entries = {}
+
+  def get(self, snapshot, name, build):
+    # every session on the snapshot gets the same object, so the views select from it and never write into it.
+    # A snapshot is never written to once published, so its entries only go when it is pruned
+    with self.lock:
+      entries = self.entries.setdefault(snapshot, {})
+      future = entries.get(name)
+      building = future is None
+      if building:
+        # whoever asks first builds, the others asking for the same entry wait on its future.
+        # Other entries build alongside it, and building one may read another of the same snapshot
+        future = entries[name] = Future()
+        # sessions still on an older snapshot keep theirs until it is pruned like the snapshot itself
+        for old in list(self.entries)[:-self.keep]:
+          del self.entries[old]
+    if building:
+      try:
+        future.set_result(read_only(build()))
+      except BaseException as error:
+        # the next one to ask builds it again
+        with self.lock:
+          if self.entries.get(snapshot, {}).get(name) is future:
+            del self.entries[snapshot][name]
+        future.set_exception(error)
+    return future.result()
@@ -0,0 +1,547 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+from scipy import sparse
+
+# SNAPSHOT INDEXES
+# what the views read, built from a snapshot's stake actions and the staker engine's datasets.
+# Nothing here reads files or streamlit, main.py loads the inputs and keeps the results per snapshot
+
+# EVENTS
+# the succeeded stake actions of a snapshot, prepared once and shared by every view: amounts in SOL,
+# months as 'YYYY-MM' for the axes and as YYYYMM ints for filtering, and the action reduced to its kind
+DEPOSIT_ACTIONS = ['deposit', 'deposit_stake', 'deposit_dao', 'deposit_dao_stake', 'deposit_dao_with_referrer']
+WITHDRAW_ACTIONS = ['withdraw', 'withdraw_stake', 'withdraw_dao', 'withdraw_dao_stake', 'claim']
+EVENT_KINDS = ['deposit', 'withdraw', 'order_unstake', 'other']
+# the User Analysis views also count an unstake order as taking the stake out
+ANALYSIS_WITHDRAW_KINDS = ['withdraw', 'order_unstake']
+
+def month_key_of(month):
+  return int(month.replace('-', ''))
+
+def month_of(month_key):
+  return f'{month_key // 100}-{month_key % 100:02d}'
+
+def last_day_of(month):
+  return datetime.strptime(month, '%Y-%m') + relativedelta(day=31)
+
+def in_month(dates, month):
+  # a mask rather than a reformatted column, so the shared frame is only read
+  first = datetime.strptime(month, '%Y-%m')
+  return (dates >= first) & (dates < first + relativedelta(months=1))
+
+def lamports_of(amount):
+  amount = pd.to_numeric(amount)
+  return amount.values.astype('int64') if amount.dtype.kind in 'iu' else np.rint(amount.values).astype('int64')
+
+def prepare_events(df):
+  df = df[df['succeeded'] == True]
+  block_timestamp = pd.to_datetime(df['block_timestamp']).astype('datetime64[ns]')
+  month_key = (block_timestamp.dt.year * 100 + block_timestamp.dt.month).astype('int32')
+  # formatted once per month instead of once per row
+  months = {key: month_of(key) for key in month_key.unique()}
+  kind = np.select(
+    [df['action'].isin(DEPOSIT_ACTIONS), df['action'].isin(WITHDRAW_ACTIONS), df['action'].isin(['order_unstake'])],
+    EVENT_KINDS[:3], 'other')
+  lamports = lamports_of(df['amount'])
+  amount = lamports / 10**9
+  events = pd.DataFrame({
+    'block_timestamp': block_timestamp.values,
+    'month': month_key.map(months).values,
+    'month_key': month_key.values,
+    'tx_id': df['tx_id'].values,
+    'address': df['address'].values,
+    'stake_pool_name': df['stake_pool_name'].values,
+    'kind': pd.Categorical(kind, categories = EVENT_KINDS),
+    'lamports': lamports,
+    'amount': amount,
+    # what the event does to the pool's net stake, an unstake order only announces a withdrawal
+    'signed_amount': np.select([kind == 'deposit', kind == 'withdraw'], [amount, -amount], 0.0),
+  })
+  return events
+
+# net stake per (wallet, pool) as it stood at the end of each day it changed, every row holding
+# until the pair's next change, grouped by pool and sorted by day so an as-of date is a binary search
+class BalanceIndex:
+  def __init__(self, events, withdraw_kinds = ANALYSIS_WITHDRAW_KINDS):
+    moves = events[events['kind'].isin(['deposit'] + withdraw_kinds)]
+    pools = pd.Categorical(moves['stake_pool_name'])
+    daily = pd.DataFrame({
+      'pool': pools.codes,
+      'address': moves['address'].values,
+      'day': moves['block_timestamp'].values.astype('datetime64[D]'),
+      'lamports': np.where(moves['kind'] == 'deposit', moves['lamports'], -moves['lamports']),
+    }).groupby(['pool', 'address', 'day'], sort = True)['lamports'].sum().reset_index()
+    pool = daily['pool'].values
+    address = daily['address'].values
+    day = daily['day'].values.astype('datetime64[D]')
+    lamports = daily.groupby(['pool', 'address'], sort = False)['lamports'].cumsum().values
+    # rows come sorted by pair then day, so each holds until the pair's next row
+    last = np.ones(len(day), dtype = bool)
+    last[:-1] = (pool[1:] != pool[:-1]) | (address[1:] != address[:-1])
+    until = np.empty_like(day)
+    until[:-1] = day[1:]
+    until[last] = np.datetime64('9999-12-31')
+    order = np.lexsort((day, pool))
+
+    self.pools = list(pools.categories)
+    self.offsets = np.searchsorted(pool[order], np.arange(len(self.pools) + 1))
+    self.day = day[order]
+    self.until = until[order]
+    self.address = address[order]
+    self.lamports = lamports[order]
+
+  def as_of(self, date, pool = None):
+    # every (wallet, pool) that had moved stake by the end of date, for one pool or all of them
+    day = np.datetime64(date, 'D')
+    codes = range(len(self.pools)) if pool is None else [self.pools.index(pool)] if pool in self.pools else []
+    rows = []
+    names = []
+    for code in codes:
+      start = self.offsets[code]
+      end = start + np.searchsorted(self.day[start:self.offsets[code + 1]], day, side = 'right')
+      live = start + np.flatnonzero(self.until[start:end] > day)
+      rows.append(live)
+      names.append(np.full(len(live), code))
+    rows = np.concatenate(rows) if rows else np.array([], dtype = 'int64')
+    names = np.concatenate(names) if names else np.array([], dtype = 'int64')
+    return pd.DataFrame({
+      'address': self.address[rows],
+      'stake_pool_name': pd.Categorical.from_codes(names, categories = self.pools),
+      'net_stake': self.lamports[rows] / 10**9,
+    })
+
+  def stakers(self, date, pool = None):
+    balances = self.as_of(date, pool)
+    return balances[balances['net_stake'] > 0]
+
+  def codes(self):
+    # the pool of every row
+    return np.repeat(np.arange(len(self.pools)), np.diff(self.offsets))
+
+  def staking_months(self, pool = None, latest = None):
+    # every month end a (wallet, pool) was staking at, up to the latest month (the data's unless given), as months since 1970.
+    # A row holds for the month ends from its own month up to the one before the month it is replaced in
+    if pool is None:
+      rows = slice(0, len(self.day))
+    elif pool in self.pools:
+      code = self.pools.index(pool)
+      rows = slice(self.offsets[code], self.offsets[code + 1])
+    else:
+      rows = slice(0, 0)
+    codes = self.codes()[rows]
+    positions = np.arange(len(self.day))[rows]
+    staking = self.lamports[rows] > 0
+    if latest is None:
+      latest = self.day.max().astype('datetime64[M]').astype('int64') if len(self.day) else 0
+    start = self.day[rows][staking].astype('datetime64[M]').astype('int64')
+    end = np.minimum(self.until[rows][staking].astype('datetime64[M]').astype('int64') - 1, latest)
+    months = np.maximum(end - start + 1, 0)
+    row = np.repeat(np.arange(len(start)), months)
+    return pd.DataFrame({
+      'address': np.repeat(self.address[rows][staking], months),
+      'pool': np.repeat(codes[staking], months),
+      'month': start[row] + np.arange(len(row)) - np.repeat(np.cumsum(months) - months, months),
+      # the index row the month comes from, for looking up its balance
+      'row': positions[staking][row],
+    })
+
+def prepare_net(events):
+  # GET NET DEPOSIT
+  deposits = events[events['kind'] == 'deposit']
+  deposits = deposits.groupby(['month', 'stake_pool_name'], observed = True)['amount'].sum().reset_index()
+
+  withdrawals = events[events['kind'] == 'withdraw']
+  withdrawals = withdrawals.groupby(['month', 'stake_pool_name'], observed = True)['amount'].sum().reset_index()
+
+  net = deposits.merge(withdrawals, how='outer', left_on = ['month', 'stake_pool_name'], right_on = ['month', 'stake_pool_name'])
+  net = net.fillna(0)
+  net = net.rename(columns={'amount_x': 'deposit', 'amount_y': 'withdraw'})
+
+  net['net_deposit'] = net['deposit'] - net['withdraw']
+  net['stake_pool_name'] = net['stake_pool_name'].str.capitalize()
+  net['cumulative_net_deposit'] = net.groupby(['stake_pool_name'], observed = True)['net_deposit'].apply(lambda x: x.cumsum())
+  net.sort_values(by = 'month', ascending = True)
+  return net
+
+# STAKER COUNTS
+# running lamport balances per (wallet, pool), so a refresh folds in only the actions after the
+# watermark instead of regrouping the whole history once per month. Every pool gets a bit in the
+# order it first shows up, and a wallet's membership is the mask of the pools it is staking in.
+# The month of each pair's first deposit is kept on the way for the new staker and cohort views
+class StakerCountEngine:
+  # one bit per pool in a signed int64
+  MASK_POOLS = 63
+
+  def __init__(self, balances = None, counts = None, pool_counts = None, memberships = None, watermark = None, pools = None, first_deposits = None):
+    # a pair only counts towards its wallet once it has a deposit, like the left merge this replaces
+    self.balances = balances if balances is not None else pd.DataFrame({
+      'address': pd.Series(dtype = object), 'stake_pool_name': pd.Series(dtype = object),
+      'deposit': pd.Series(dtype = 'int64'), 'withdraw': pd.Series(dtype = 'int64'), 'deposits': pd.Series(dtype = 'int64')})
+    self.counts = counts if counts is not None else pd.DataFrame({
+      'month': pd.Series(dtype = object), 'staker_count': pd.Series(dtype = 'int64')})
+    self.pool_counts = pool_counts if pool_counts is not None else pd.DataFrame({
+      'date_stake': pd.Series(dtype = object), 'stake_pool_name': pd.Series(dtype = object), 'staker_status': pd.Series(dtype = 'int64')})
+    self.memberships = memberships if memberships is not None else pd.DataFrame({
+      'date_stake': pd.Series(dtype = object), 'pool_mask': pd.Series(dtype = 'int64'), 'staker_count': pd.Series(dtype = 'int64')})
+    self.first_deposits = first_deposits if first_deposits is not None else pd.DataFrame({
+      'address': pd.Series(dtype = object), 'stake_pool_name': pd.Series(dtype = object), 'month_key': pd.Series(dtype = 'int64')})
+    self.watermark = watermark
+    self.pools = pools if pools is not None else []
+
+  def unseen(self, df):
+    # rows sharing the watermark timestamp are told apart by tx_id, like the actions ingest does
+    if self.watermark is not None:
+      last = pd.Timestamp(self.watermark['block_timestamp'])
+      df = df[(df['block_timestamp'] > last) | ((df['block_timestamp'] == last) & ~df['tx_id'].isin(self.watermark['boundary']))]
+    if len(df) > 0:
+      last = df['block_timestamp'].max()
+      boundary = df.loc[df['block_timestamp'] == last, 'tx_id'].tolist()
+      if self.watermark is not None and pd.Timestamp(self.watermark['block_timestamp']) == last:
+        boundary += self.watermark['boundary']
+      self.watermark = {'block_timestamp': str(last), 'boundary': boundary}
+    return df
+
+  def append(self, df):
+    # recounts only the months the new actions reach, every month with a deposit gets a row
+    df = self.unseen(df)
+    df = df[(df['succeeded'] == True) & df['action'].isin(DEPOSIT_ACTIONS + WITHDRAW_ACTIONS)]
+    if len(df) == 0:
+      return
+
+    deposit = df['action'].isin(DEPOSIT_ACTIONS).values
+    lamports = lamports_of(df['amount'])
+    block_timestamp = pd.to_datetime(df['block_timestamp'])
+    month_key = (block_timestamp.dt.year * 100 + block_timestamp.dt.month).values.astype('int64')
+    pool = np.asarray(df['stake_pool_name'], dtype = object)
+    pools = self.pools + [name for name in pd.unique(pool) if name not in self.pools]
+    if len(pools) > self.MASK_POOLS:
+      # past that the bits overflow the int64 mask and memberships would come out silently wrong
+      raise ValueError(f'{len(pools)} stake pools, pool membership masks hold at most {self.MASK_POOLS}')
+    self.pools = pools
+    moves = pd.DataFrame({
+      'address': np.asarray(df['address'], dtype = object),
+      'stake_pool_name': pool,
+      'month_key': month_key,
+      'deposit': np.where(deposit, lamports, 0),
+      'withdraw': np.where(deposit, 0, lamports),
+      'deposits': deposit.astype('int64'),
+    })
+    # the balances so far go in as month 0, ahead of every real month
+    balances = self.balances.assign(stake_pool_name = np.asarray(self.balances['stake_pool_name'], dtype = object), month_key = 0)
+    moves = pd.concat([balances, moves], ignore_index = True)
+    moves = moves.groupby(['address', 'stake_pool_name', 'month_key'], sort = True)[['deposit', 'withdraw', 'deposits']].sum().reset_index()
+
+    # running totals per pair, then what each month changes about the pair
+    pair = moves.groupby(['address', 'stake_pool_name'], sort = False)
+    moves[['deposit', 'withdraw', 'deposits']] = pair[['deposit', 'withdraw', 'deposits']].cumsum()
+    first = (pair.ngroup() != pair.ngroup().shift()).values
+    def changes(values):
+      return values - np.where(first, 0, np.roll(values, 1))
+    moves['change'] = changes(np.where(moves['deposits'] > 0, moves['deposit'] - moves['withdraw'], 0))
+    moves['joined'] = changes((moves['deposit'] - moves['withdraw'] > 0).values.astype('int64'))
+    moves['pool_mask'] = moves['joined'] * moves['stake_pool_name'].map({name: 1 << bit for bit, name in enumerate(self.pools)}).astype('int64')
+    # a pair's first deposit is the month its deposit count leaves zero, month 0 pairs already had theirs
+    started = (changes((moves['deposits'] > 0).values.astype('int64')) > 0) & (moves['month_key'] > 0).values
+    self.first_deposits = pd.concat([
+      self.first_deposits.assign(stake_pool_name = np.asarray(self.first_deposits['stake_pool_name'], dtype = object)),
+      moves.loc[started, ['address', 'stake_pool_name', 'month_key']],
+    ], ignore_index = True)
+    self.balances = pair.tail(1)[['address', 'stake_pool_name', 'deposit', 'withdraw', 'deposits']].reset_index(drop = True)
+
+    wallets = moves.groupby(['address', 'month_key'], sort = True)[['change', 'pool_mask']].sum().groupby(level = 'address').cumsum()
+    previous = wallets.groupby(level = 'address').shift(fill_value = 0)
+
+    first_month = month_key.min()
+    kept = self.counts['month'].map(month_key_of) < first_month
+    months = sorted(set(self.counts.loc[~kept, 'month'].map(month_key_of)) | set(month_key[deposit]))
+    def recount(stakers):
+      # month by month totals from the changes, carried into months where nothing changed
+      stakers = stakers.sort_index().cumsum()
+      return stakers.reindex(stakers.index.union(months)).ffill().loc[months]
+
+    # a wallet stakes while its balance summed over pools is positive
+    staking = (wallets['change'] > 0).astype('int64') - (previous['change'] > 0).astype('int64')
+    counts = recount(staking.groupby(level = 'month_key').sum())
+    self.counts = pd.concat([
+      self.counts.loc[kept, ['month', 'staker_count']],
+      pd.DataFrame({'month': [month_of(key) for key in months], 'staker_count': counts.values.astype('int64')}),
+    ], ignore_index = True)
+
+    # a pool counts the wallets with a positive balance in it, from the month of its first deposit
+    opened = moves[moves['deposits'] > 0].groupby('stake_pool_name')['month_key'].min()
+    pool_counts = recount(moves.groupby(['month_key', 'stake_pool_name'])['joined'].sum().unstack(fill_value = 0))
+    pool_counts = pool_counts.rename_axis(index = 'month_key', columns = 'stake_pool_name').stack().rename('staker_status').reset_index()
+    pool_counts = pool_counts[pool_counts['month_key'] >= pool_counts['stake_pool_name'].map(opened)]
+    self.pool_counts = pd.concat([
+      self.pool_counts[self.pool_counts['date_stake'].map(month_key_of) < first_month],
+      pd.DataFrame({'date_stake': pool_counts['month_key'].map(month_of).values, 'stake_pool_name': pool_counts['stake_pool_name'].str.capitalize().values,
+        'staker_status': pool_counts['staker_status'].values.astype('int64')}),
+    ], ignore_index = True)
+
+    # every wallet whose mask moved leaves its old combination of pools and joins the new one
+    moved = wallets['pool_mask'] != previous['pool_mask']
+    joined = pd.concat([
+      pd.DataFrame({'month_key': wallets.index.get_level_values('month_key')[moved], 'pool_mask': wallets.loc[moved, 'pool_mask'].values, 'wallets': 1}),
+      pd.DataFrame({'month_key': wallets.index.get_level_values('month_key')[moved], 'pool_mask': previous.loc[moved, 'pool_mask'].values, 'wallets': -1}),
+    ])
+    joined = joined[joined['pool_mask'] != 0]
+    memberships = recount(joined.groupby(['month_key', 'pool_mask'])['wallets'].sum().unstack(fill_value = 0))
+    memberships = memberships.rename_axis(index = 'month_key', columns = 'pool_mask').stack().rename('staker_count').reset_index()
+    memberships = memberships[memberships['staker_count'] > 0]
+    self.memberships = pd.concat([
+      self.memberships[self.memberships['date_stake'].map(month_key_of) < first_month],
+      pd.DataFrame({'date_stake': memberships['month_key'].map(month_of).values, 'pool_mask': memberships['pool_mask'].values.astype('int64'),
+        'staker_count': memberships['staker_count'].values.astype('int64')}),
+    ], ignore_index = True)
+
+# MARKET SHARE
+# month x pool tables for each metric, built once per snapshot: the monthly value, its running total
+# and the running total's share of the month. A pool is carried through the months it saw no activity
+# from its first one on, so a quiet month no longer drops it out of everyone else's share
+class MarketShareCube:
+  METRICS = ['sol', 'transactions', 'stakers']
+
+  def __init__(self, net, events, scp):
+    deposits = events[events['kind'] == 'deposit']
+    transactions = deposits.groupby(['month', 'stake_pool_name'], observed = True)['tx_id'].nunique().reset_index()
+    transactions['stake_pool_name'] = transactions['stake_pool_name'].str.capitalize()
+    tables = {
+      'sol': net.pivot_table(index = 'month', columns = 'stake_pool_name', values = 'net_deposit', aggfunc = 'sum'),
+      'transactions': transactions.pivot_table(index = 'month', columns = 'stake_pool_name', values = 'tx_id', aggfunc = 'sum'),
+      # stored as a categorical, which would carry every pool into each slice
+      'stakers': scp.astype({'stake_pool_name': str}).pivot_table(index = 'date_stake', columns = 'stake_pool_name', values = 'staker_status', aggfunc = 'sum').rename_axis(index = 'month'),
+    }
+    self.value = {}
+    self.cumulative = {}
+    self.share = {}
+    for metric, table in tables.items():
+      table = table.sort_index().astype('float64')
+      opened = table.notna().cummax()
+      value = table.fillna(0).where(opened)
+      # a staker count is already a running total
+      cumulative = value if metric == 'stakers' else value.cumsum().where(opened)
+      self.value[metric] = value
+      self.cumulative[metric] = cumulative
+      self.share[metric] = cumulative.div(cumulative.sum(axis = 1), axis = 0) * 100
+
+  def frame(self, metric, result = None):
+    # one metric in long form, with the share taken among the pools result matches when given
+    value, cumulative, share = self.value[metric], self.cumulative[metric], self.share[metric]
+    if result is not None:
+      pools = value.columns[value.columns.str.contains(result, case = False)]
+      value, cumulative = value[pools], cumulative[pools]
+      share = cumulative.div(cumulative.sum(axis = 1), axis = 0) * 100
+    return pd.DataFrame({
+      'value': value.stack(),
+      'cumulative': cumulative.stack(),
+      'market_share': share.stack(),
+    }).rename_axis(['month', 'stake_pool_name']).reset_index()
+
+  def top(self, metric):
+    # the pool with the largest share in the latest month, and its share over time
+    share = self.share[metric]
+    pool = share.iloc[-1].idxmax()
+    return pool, share[pool].dropna()
+
+# COHORTS
+# wallets by the month of their first deposit, overall and per pool, from the first deposits the
+# staker engine keeps, and month by month how many of each cohort were still staking
+def first_deposits_of(events):
+  deposits = events[events['kind'] == 'deposit']
+  return deposits.groupby(['address', 'stake_pool_name'], observed = True)['month_key'].min().reset_index()
+
+def month_index_of(month_key):
+  return (month_key // 100 - 1970) * 12 + month_key % 100 - 1
+
+def month_slot(month, first, months):
+  # where month sits in per-month arrays starting at month index first, None before it;
+  # the latest month holds for the months after it
+  slot = month_index_of(month_key_of(month)) - first
+  if slot < 0 or months == 0:
+    return None
+  return min(slot, months - 1)
+
+class CohortIndex:
+  def __init__(self, first_deposits, balances):
+    self.first = first_deposits.assign(stake_pool_name = first_deposits['stake_pool_name'].astype(str))
+    self.first_global = self.first.groupby('address')['month_key'].min()
+    self.new_global = self.first_global.value_counts().sort_index()
+    self.new_by_pool = self.first.groupby(['stake_pool_name', 'month_key']).size()
+    self.balances = balances
+    # filled on first use, computing one twice in a race is harmless
+    self.retention_by_pool = {}
+
+  def new_stakers(self, month_key, pool = None):
+    if pool is None:
+      return int(self.new_global.get(month_key, 0))
+    return int(self.new_by_pool.get((pool, month_key), 0))
+
+  def new_stakers_by_month(self):
+    return pd.DataFrame({'month': [month_of(key) for key in self.new_global.index], 'New_Wallets': self.new_global.values})
+
+  def retention(self, pool = None):
+    # first deposit month x months since, the share of the cohort with a positive stake at that month's end
+    if pool not in self.retention_by_pool:
+      first = self.first_global if pool is None else self.first[self.first['stake_pool_name'] == pool].set_index('address')['month_key']
+      cohort_of = month_index_of(first)
+      staking = self.balances.staking_months(pool)
+      if pool is None:
+        # a wallet staking in several pools is retained once
+        staking = staking.drop_duplicates(['address', 'month'])
+      cohort = cohort_of.reindex(staking['address']).values
+      age = staking['month'].values - cohort
+      kept = age >= 0
+      retained = pd.Series(1, index = pd.MultiIndex.from_arrays([cohort[kept].astype('int64'), age[kept].astype('int64')], names = ['cohort', 'age']))
+      retained = retained.groupby(level = ['cohort', 'age']).sum().unstack(fill_value = 0)
+
+      sizes = cohort_of.value_counts().sort_index()
+      latest = max(sizes.index.max(), staking['month'].max()) if len(staking) else sizes.index.max() if len(sizes) else 0
+      ages = np.arange(latest - sizes.index.min() + 1) if len(sizes) else np.arange(0)
+      retained = retained.reindex(index = sizes.index, columns = ages, fill_value = 0)
+      # a cohort has no value for the months after the latest one
+      observed = sizes.index.values[:, None] + ages[None, :] <= latest
+      retention = (retained.div(sizes, axis = 0) * 100).where(observed)
+      retention.index = np.datetime_as_string(retention.index.values.astype('datetime64[M]'))
+      self.retention_by_pool[pool] = retention.rename_axis(index = 'cohort', columns = 'months_since')
+    return self.retention_by_pool[pool]
+
+# CHURN
+# a wallet churns from a pool in a month it moved stake in and ended with nothing left there.
+# Every pool and month at once: net per (pool, wallet, month), summed up month by month
+class ChurnTable:
+  def __init__(self, events):
+    # anything that is not a deposit counts against the wallet, like the per-month scan did
+    signed = np.where(events['kind'] == 'deposit', events['lamports'], -events['lamports'])
+    monthly = pd.DataFrame({
+      'stake_pool_name': events['stake_pool_name'].values,
+      'address': events['address'].values,
+      'month_key': events['month_key'].values,
+      'lamports': signed,
+    }).groupby(['stake_pool_name', 'address', 'month_key'], observed = True, sort = True)['lamports'].sum()
+    net = monthly.groupby(level = ['stake_pool_name', 'address'], observed = True).cumsum()
+    churned = (net <= 0).values
+    self.table = pd.DataFrame({
+      'churned_wallets': churned.astype('int64'),
+      # what the churned wallets took out in the month they left
+      'churned_sol': np.where(churned, -monthly.values, 0) / 10**9,
+    }, index = monthly.index).groupby(level = ['stake_pool_name', 'month_key'], observed = True).sum()
+
+  def churned(self, pool, month_key):
+    # (wallets, SOL) for one pool and month
+    if (pool, month_key) not in self.table.index:
+      return 0, 0.0
+    row = self.table.loc[(pool, month_key)]
+    return int(row['churned_wallets']), float(row['churned_sol'])
+
+# CROSSOVER
+# wallets staking in both of two pools at each month end, from a sparse wallet x pool membership
+# matrix per month: its gram matrix has the pool's stakers on the diagonal and every overlap off it
+class CrossoverMatrix:
+  def __init__(self, balances):
+    self.balances = balances
+    self.pools = balances.pools
+    staking = balances.staking_months()
+    self.first = staking['month'].min() if len(staking) else 0
+    months = staking['month'].max() - self.first + 1 if len(staking) else 0
+    self.overlaps = np.zeros((months, len(self.pools), len(self.pools)), dtype = 'int64')
+    staking = staking.sort_values('month', kind = 'stable')
+    bounds = np.searchsorted(staking['month'].values, self.first + np.arange(months + 1))
+    for month in range(months):
+      rows = staking.iloc[bounds[month]:bounds[month + 1]]
+      membership = self.membership(rows['address'].values, rows['pool'].values, len(self.pools))
+      self.overlaps[month] = (membership.T @ membership).toarray()
+
+  def membership(self, addresses, codes, width):
+    # one row per wallet, a one in the column of each pool it stakes in
+    wallets, index = pd.factorize(addresses)
+    return sparse.csr_matrix((np.ones(len(wallets), dtype = 'int64'), (wallets, codes)), shape = (len(index), width))
+
+  def pairs(self, month):
+    # pool x pool wallet counts at the end of month, the diagonal is each pool's stakers
+    slot = month_slot(month, self.first, len(self.overlaps))
+    counts = self.overlaps[slot] if slot is not None else np.zeros((len(self.pools), len(self.pools)), dtype = 'int64')
+    return pd.DataFrame(counts, index = self.pools, columns = self.pools)
+
+  def crossover(self, pool, month):
+    # the pool's stakers by the other pools they also stake in
+    if pool not in self.pools:
+      return pd.Series(dtype = 'int64')
+    counts = self.pairs(month).loc[pool].drop(pool)
+    return counts[counts > 0]
+
+  def overlap(self, pools, month):
+    # wallets staking in every one of pools at the end of month
+    pools = [pool for pool in pools if pool in self.pools]
+    if len(pools) == 0:
+      return 0
+    stakers = self.balances.stakers(last_day_of(month))
+    stakers = stakers[stakers['stake_pool_name'].isin(pools)]
+    codes = pd.Categorical(stakers['stake_pool_name'], categories = pools).codes
+    membership = self.membership(stakers['address'].values, codes, len(pools))
+    return int((np.asarray(membership.sum(axis = 1)).ravel() == len(pools)).sum())
+
+# HISTOGRAMS
+# the stakers of every pool at every month end, bucketed by their stake and by how long they have been
+# around the pool, with np.digitize over the whole expansion instead of a function per wallet
+def duration_name(days):
+  for unit, length in (('Year', 360), ('Month', 30), ('Week', 7), ('Day', 1)):
+    if days % length == 0:
+      count = days // length
+      return f'{count} {unit}' + ('s' if count > 1 else '')
+
+def bucket_labels(edges, name, bound):
+  # 'a. SOL < 10', 'b. 10 < SOL < 100', ... 'e. 10,000 < SOL'
+  bounds = [bound(edge) for edge in edges]
+  labels = [f'{name} < {bounds[0]}'] + [f'{low} < {name} < {high}' for low, high in zip(bounds, bounds[1:])] + [f'{bounds[-1]} < {name}']
+  return [f'{chr(ord("a") + i)}. {label}' for i, label in enumerate(labels)]
+
+class StakeHistograms:
+  def __init__(self, events, balances, amount_edges, age_edges, now = None):
+    now = datetime.now() if now is None else now
+    self.pools = balances.pools
+    self.amount_labels = bucket_labels(amount_edges, 'SOL', lambda edge: f'{edge:,}')
+    self.age_labels = bucket_labels(age_edges, 'Stake', duration_name)
+    # carried up to the running month, which is aged to now
+    staking = balances.staking_months(latest = np.datetime64(now, 'M').astype('int64'))
+    row = staking['row'].values
+    month = staking['month'].values
+    self.first = month.min() if len(month) else 0
+    months = month.max() - self.first + 1 if len(month) else 0
+
+    amount = np.digitize(balances.lamports[row] / 10**9, amount_edges)
+
+    # a wallet's age in a pool runs from its first action there, to the month end or to now for the running month
+    started = events.groupby(['stake_pool_name', 'address'], observed = True)['block_timestamp'].min()
+    started = started.reindex(pd.MultiIndex.from_arrays([np.asarray(self.pools, dtype = object)[balances.codes()], balances.address])).values
+    month_end = ((month + 1).astype('datetime64[M]').astype('datetime64[D]') - np.timedelta64(1, 'D')).astype('datetime64[ns]')
+    until = np.minimum(month_end, np.datetime64(now, 'ns'))
+    age = np.digitize(np.floor((until - started[row]) / np.timedelta64(1, 'D')), age_edges)
+
+    pools = staking['pool'].values
+    self.amounts = self.count(month - self.first, pools, amount, months, len(self.amount_labels))
+    self.ages = self.count(month - self.first, pools, age, months, len(self.age_labels))
+
+  def count(self, month, pools, bucket, months, buckets):
+    # months x pools x buckets wallet counts
+    counts = np.zeros(months * len(self.pools) * buckets, dtype = 'int64')
+    np.add.at(counts, (month * len(self.pools) + pools) * buckets + bucket, 1)
+    return counts.reshape(months, len(self.pools), buckets)
+
+  def histogram(self, counts, labels, pool, month):
+    # the non-empty buckets of one pool at the end of month
+    slot = month_slot(month, self.first, len(counts))
+    if slot is None or pool not in self.pools:
+      values = np.zeros(len(labels), dtype = 'int64')
+    else:
+      values = counts[slot, self.pools.index(pool)]
+    histogram = pd.DataFrame({'category': labels, 'count_wallets': values})
+    return histogram[histogram['count_wallets'] > 0]
+
+  def amount(self, pool, month):
+    return self.histogram(self.amounts, self.amount_labels, pool, month)
+
+  def age(self, pool, month):
+    return self.histogram(self.ages, self.age_labels, pool, month)
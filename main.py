@@ -4,11 +4,33 @@ import numpy as np
 import plotly.figure_factory as ff
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
 from shroomdk import ShroomDK
 from datetime import datetime
 from plotly.subplots import make_subplots
+from collections import Counter, OrderedDict, deque
 from dateutil.relativedelta import relativedelta
+import atexit
 import datetime as dt
+import functools
+import hashlib
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from tenacity import retry, retry_if_not_exception_type, stop_after_attempt, wait_exponential
+from shroomdk.errors import UserError
+from cache import SnapshotCache
+from warehouse import query_pages
+from indexes import (
+  month_key_of, last_day_of, in_month, prepare_events, BalanceIndex, prepare_net, StakerCountEngine,
+  MarketShareCube, first_deposits_of, month_index_of, CohortIndex, ChurnTable, CrossoverMatrix,
+  StakeHistograms
+)
 sdk = ShroomDK(st.secrets['sdk_key'])
 
 # SETTING PAGE CONFIG TO WIDE MODE AND ADDING A TITLE AND FAVICON
@@ -16,143 +38,1073 @@ st.set_page_config(layout="wide", page_title="Solana Staking Pool", page_icon="
 st.title('Solana Staking Pool - Live Dashboard')
 
 # SETUP
-def update_data():
-  my_bar = st.progress(0)
-  total = 8
-  curr = 1
-  st.write(curr, '/', total, 'Updating Staking Pool data ...')
+class RefreshStage:
+  def __init__(self, name, label, upstream, run, restore):
+    self.name = name
+    self.label = label
+    self.upstream = upstream
+    self.run = run
+    # reads the stage output back from the snapshot when a checkpoint says it already finished
+    self.restore = restore
+    self.resumed = False
+    self.status = 'pending'
+    self.fraction = 0.0
+    self.started = None
+    self.ended = None
+    self.error = None
+
+  # same call as st.progress, so loaders report to the stage instead of a widget
+  def progress(self, fraction):
+    self.fraction = min(max(fraction, 0.0), 1.0)
+
+  def seconds(self):
+    if self.started is None:
+      return 0.0
+    return (self.ended or time.time()) - self.started
+
+  def state(self):
+    # what other sessions and processes see of the stage, through the refresh state file
+    return {
+      'label': self.label,
+      'status': self.status,
+      'fraction': self.fraction,
+      'seconds': None if self.started is None else self.seconds(),
+      'resumed': self.resumed,
+      'error': None if self.error is None else repr(self.error),
+    }
+
+def stage_actions(inputs, bar, directory, full_refresh = False):
+  load_stake_pool_actions(full_refresh, directory)
+  # the stages after it pick their stakers from the whole history, with wallet strings for their sql
+  return read_actions(directory, decode = True)
+
+def stage_stakers(inputs, bar, directory, full_refresh = False):
+  # carries on from the published snapshot's balances, which stay as they are if this stage is rerun
+  engine = StakerCountEngine() if full_refresh else load_staker_engine(current_snapshot_dir())
+  engine.append(inputs['actions'])
+  bar.progress(0.5)
+  sc = save_dataset(engine.counts, directory, 'sc')
+  scp = save_dataset(engine.pool_counts, directory, 'scp')
+  save_staker_engine(engine, directory)
+  return sc, scp
+
+def stage_sol_holdings(inputs, bar, directory):
+  # the loaders rescale amount in place, so each gets its own copy of the shared frame
+  return save_dataset(load_sol_holdings(inputs['actions'].copy(), bar), directory, 'sol_holdings_df')
+
+def stage_protocol_interactions(inputs, bar, directory):
+  return save_dataset(load_protocol_interactions(inputs['actions'].copy(), bar), directory, 'protocol_interactions_df')
+
+def stage_bridgers(inputs, bar, directory):
+  return save_dataset(load_bridge_sources(inputs['actions'], bar), directory, 'eth_bridgers_df')
+
+def stage_sol_transfers(inputs, bar, directory):
+  return save_dataset(load_sol_transfer_sources(inputs['actions'], bar), directory, 'sol_transfers_df')
+
+def stage_all_sources(inputs, bar, directory):
+  return save_dataset(load_all_sources(inputs['bridgers'], inputs['sol_transfers']), directory, 'df_stake_pools_all_sources')
+
+def stage_marinade_instant_unstaking(inputs, bar, directory):
+  return save_dataset(load_marinade_instant_unstaking(bar), directory, 'marinade_instant_unstaking')
+
+def refresh_stages(full_refresh = False):
+  # listed in dependency order
+  return [
+    RefreshStage('actions', 'Staking Pool', [], lambda inputs, bar, directory: stage_actions(inputs, bar, directory, full_refresh),
+      lambda directory: read_actions(directory, decode = True)),
+    RefreshStage('stakers', 'Stakers', ['actions'], lambda inputs, bar, directory: stage_stakers(inputs, bar, directory, full_refresh),
+      lambda directory: (read_dataset(directory, 'sc'), read_dataset(directory, 'scp'))),
+    RefreshStage('sol_holdings', 'SOL Holdings', ['actions'], stage_sol_holdings,
+      lambda directory: read_dataset(directory, 'sol_holdings_df', decode = True)),
+    RefreshStage('protocol_interactions', 'Protocol Interactions', ['actions'], stage_protocol_interactions,
+      lambda directory: read_dataset(directory, 'protocol_interactions_df', decode = True)),
+    RefreshStage('bridgers', 'Bridgers', ['actions'], stage_bridgers,
+      lambda directory: read_dataset(directory, 'eth_bridgers_df', decode = True)),
+    RefreshStage('sol_transfers', 'SOL Transfers', ['actions'], stage_sol_transfers,
+      lambda directory: read_dataset(directory, 'sol_transfers_df', decode = True)),
+    RefreshStage('all_sources', 'ALL SOURCES', ['bridgers', 'sol_transfers'], stage_all_sources,
+      lambda directory: read_dataset(directory, 'df_stake_pools_all_sources', decode = True)),
+    RefreshStage('marinade_instant_unstaking', 'Marinade Instant Unstaking', [], stage_marinade_instant_unstaking,
+      lambda directory: read_dataset(directory, 'marinade_instant_unstaking')),
+  ]
+
+def run_stages(stages, directory, on_update = None, checkpoint = None, poll_seconds = 0.5):
+  by_name = {stage.name: stage for stage in stages}
+  outputs = {}
+  running = {}
+
+  with ThreadPoolExecutor(max_workers = len(stages)) as pool:
+    while True:
+      for stage in stages:
+        if stage.status != 'pending':
+          continue
+        upstream = [by_name[name] for name in stage.upstream]
+        # a failed stage only takes down what depends on it
+        if any(u.status in ('failed', 'skipped') for u in upstream):
+          stage.status = 'skipped'
+        elif checkpoint is not None and checkpoint.is_complete(stage.name):
+          outputs[stage.name] = stage.restore(directory)
+          stage.status = 'done'
+          stage.resumed = True
+          stage.progress(1)
+        elif all(u.status == 'done' for u in upstream):
+          stage.status = 'running'
+          stage.started = time.time()
+          inputs = {name: outputs[name] for name in stage.upstream}
+          running[pool.submit(stage.run, inputs, stage, directory)] = stage
+
+      if len(running) == 0:
+        break
+
+      done, _ = wait(running, timeout = poll_seconds, return_when = FIRST_COMPLETED)
+      for future in done:
+        stage = running.pop(future)
+        stage.ended = time.time()
+        try:
+          outputs[stage.name] = future.result()
+          stage.status = 'done'
+          stage.progress(1)
+          if checkpoint is not None:
+            checkpoint.complete(stage.name)
+        except Exception as e:
+          stage.status = 'failed'
+          stage.error = e
+
+      if on_update is not None:
+        on_update(stages)
+
+  return outputs
+
+def show_refresh_stages(stages):
+  # stages as written by RefreshStage.state
+  for curr, stage in enumerate(stages, 1):
+    st.progress(stage['fraction'])
+    text = f"{curr} / {len(stages)} {stage['label']}: {stage['status']}"
+    if stage['resumed']:
+      text = text + ' (from checkpoint)'
+    if stage['seconds'] is not None:
+      text = text + f" ({stage['seconds']:.1f}s)"
+    if stage['error'] is not None:
+      text = text + f" - {stage['error']}"
+    st.caption(text)
+
+def update_data(stages, full_refresh = False):
+  # runs off the script thread, so no st.* calls in here; sessions read the stages for progress
+  # a failed refresh leaves its checkpoint behind and the next one picks up from there
+  checkpoint = RefreshCheckpoint(fresh = full_refresh)
+  if len(checkpoint.state['stages']) == 0:
+    seed_snapshot(current_snapshot_dir(), STAGING_DIR)
+  # run_stages calls back every poll, which doubles as the heartbeat of the refresh lock
+  run_stages(stages, STAGING_DIR, lambda stages: write_refresh_state('running', stages), checkpoint)
+  if any(stage.status != 'done' for stage in stages):
+    return None
+  checkpoint.clear()
+  return publish_snapshot(STAGING_DIR)
+
+class RefreshService:
+  def __init__(self):
+    self.thread = None
+
+  def start(self, seen_snapshot, full_refresh = False):
+    # 'running' when another session or process already holds the refresh, the caller follows that one;
+    # 'current' when a refresh published since the caller loaded seen_snapshot
+    if not acquire_refresh_lock():
+      return 'running'
+    if current_snapshot_dir() != seen_snapshot:
+      release_refresh_lock()
+      return 'current'
+    stages = refresh_stages(full_refresh)
+    write_refresh_state('running', stages)
+    # taken here, on the script thread, where the singleton hands it out
+    self.thread = threading.Thread(target = self.run, args = (stages, full_refresh, warm_up()), name = 'refresh', daemon = True)
+    self.thread.start()
+    return 'started'
+
+  def run(self, stages, full_refresh, warm_up):
+    version = None
+    error = None
+    try:
+      version = update_data(stages, full_refresh)
+      if version is not None:
+        warm_up.start(os.path.join(SNAPSHOT_DIR, version))
+    except Exception as e:
+      error = repr(e)
+    finally:
+      write_refresh_state('done' if version is not None else 'failed', stages, version = version, error = error)
+      release_refresh_lock()
+
+# every st.experimental_singleton below makes one object per server process, shared by every session.
+# It only hands that object out on a script thread, one running a session's script
+@st.experimental_singleton
+def refresh_service():
+  return RefreshService()
+
+
+ACTIONS_DIR = 'fact_stake_pool_actions'
+ADDRESS_BOOK_FILE = 'addresses.parquet'
+ADDRESS_BOOK_MIGRATED = 'addresses.migrated'
+MIGRATE_STALE_SECONDS = 600
+ACTIONS_WATERMARK_FILE = 'fact_stake_pool_actions_watermark.json'
+STAKER_BALANCES_WATERMARK_FILE = 'staker_balances_watermark.json'
+SNAPSHOT_DIR = 'data/snapshots'
+STAGING_DIR = 'data/snapshots/next'
+CURRENT_PATH = 'data/CURRENT'
+SNAPSHOT_KEEP = 2
+REFRESH_LOCK_PATH = 'data/refresh.lock'
+REFRESH_STATE_PATH = 'data/refresh_state.json'
+# a lock whose heartbeat is older than this belongs to a refresh that died
+REFRESH_STALE_SECONDS = st.secrets.get('refresh_stale_seconds', 120)
+# how often a session on the About tab reruns to follow a refresh
+REFRESH_POLL_SECONDS = 2
+PAGE_SIZE = 100000
+FETCH_WORKERS = 4
+CHUNK_SIZE = 16000
+QUERY_WORKERS = st.secrets.get('query_workers', 4)
+# every warehouse call of a refresh takes a slot, however the stage, chunk and page pools nest
+warehouse_slots = threading.BoundedSemaphore(QUERY_WORKERS)
+QUERY_RETRIES = 5
+QUERY_CACHE_DIR = 'data/query_cache'
+QUERY_CACHE_MAX_BYTES = st.secrets.get('query_cache_max_mb', 1024) * 2**20
+# without a ttl only queries over closed months are cached
+QUERY_CACHE_TTL_HOURS = st.secrets.get('query_cache_ttl_hours')
+query_cache_lock = threading.Lock()
+CHECKPOINT_DIR = os.path.join(STAGING_DIR, 'refresh_checkpoint')
+CHECKPOINT_MAX_AGE_HOURS = st.secrets.get('checkpoint_max_age_hours', 24)
+# upper bucket edges of the User Analysis histograms, in SOL staked and in days since a wallet's first action in the pool
+STAKE_AMOUNT_EDGES = st.secrets.get('stake_amount_edges', [10, 100, 1000, 10000])
+STAKE_AGE_EDGES = st.secrets.get('stake_age_edges', [7, 30, 90, 180, 360])
+# rendered figures kept for repeat views by every session, as plotly JSON
+FIGURE_CACHE_MAX_BYTES = st.secrets.get('figure_cache_max_mb', 256) * 2**20
+# after a publish, and on startup, the tab selections most requested among the last warmup_history
+# are drawn into the figure cache before anyone opens them
+WARMUP_HISTORY = st.secrets.get('warmup_history', 5000)
+WARMUP_TOP = st.secrets.get('warmup_top', 20)
+WARMUP_WORKERS = st.secrets.get('warmup_workers', 2)
+# only the tab on screen is computed; off, every tab is built on each rerun as st.tabs needs
+LAZY_TABS = st.secrets.get('lazy_tabs', True)
+
+# SNAPSHOTS
+def current_snapshot_dir():
+  try:
+    with open(CURRENT_PATH) as f:
+      return os.path.join(SNAPSHOT_DIR, f.read().strip())
+  except FileNotFoundError:
+    # before the first background refresh the csvs in data/ are the snapshot
+    return 'data'
+
+def seed_snapshot(source, target):
+  # the incremental actions ingest starts from its own copy, every other dataset is rewritten whole
+  os.makedirs(target, exist_ok = True)
+  migrate_snapshot(source)
+  # carried over so wallets keep their ids, and the staging snapshot never holds wallet strings
+  if os.path.exists(os.path.join(source, ADDRESS_BOOK_FILE)):
+    shutil.copy2(os.path.join(source, ADDRESS_BOOK_FILE), os.path.join(target, ADDRESS_BOOK_FILE))
+  open(os.path.join(target, ADDRESS_BOOK_MIGRATED), 'w').close()
+  if os.path.isdir(os.path.join(source, ACTIONS_DIR)):
+    shutil.rmtree(os.path.join(target, ACTIONS_DIR), ignore_errors = True)
+    # partitions are only ever replaced, never written in place, so both snapshots can share the files
+    shutil.copytree(os.path.join(source, ACTIONS_DIR), os.path.join(target, ACTIONS_DIR), copy_function = link_or_copy)
+  if os.path.exists(os.path.join(source, ACTIONS_WATERMARK_FILE)):
+    shutil.copy2(os.path.join(source, ACTIONS_WATERMARK_FILE), os.path.join(target, ACTIONS_WATERMARK_FILE))
+
+def link_or_copy(source, target):
+  try:
+    os.link(source, target)
+  except OSError:
+    shutil.copy2(source, target)
+
+def publish_snapshot(staging):
+  # sorts by time for the pruning below, and the suffix keeps two publishes in the same instant apart
+  version = datetime.now().strftime('%Y%m%d%H%M%S%f') + '-' + uuid.uuid4().hex[:8]
+  os.replace(staging, os.path.join(SNAPSHOT_DIR, version))
+  # sessions pick the new snapshot up on their next rerun
+  with open(CURRENT_PATH + '.tmp', 'w') as f:
+    f.write(version)
+  os.replace(CURRENT_PATH + '.tmp', CURRENT_PATH)
+
+  old = sorted(name for name in os.listdir(SNAPSHOT_DIR) if name != os.path.basename(staging))
+  for name in old[:-SNAPSHOT_KEEP]:
+    shutil.rmtree(os.path.join(SNAPSHOT_DIR, name), ignore_errors = True)
+  return version
+
+# STORAGE
+# declared column types per dataset, anything not listed keeps the type arrow infers
+DATASETS = {
+  'fact_stake_pool_actions': {'block_timestamp': 'datetime', 'address': 'address', 'stake_pool_name': 'category', 'action': 'category'},
+  'sc': {},
+  'staker_balances': {'address': 'address', 'stake_pool_name': 'category'},
+  'staker_memberships': {},
+  'first_deposits': {'address': 'address', 'stake_pool_name': 'category'},
+  'scp': {'stake_pool_name': 'category'},
+  'sol_holdings_df': {'wallet': 'address', 'sol_amount': 'float', 'month_year': 'datetime'},
+  'protocol_interactions_df': {'wallet': 'address', 'protocol': 'category', 'month_year': 'datetime'},
+  'eth_bridgers_df': {'date': 'datetime', 'wallet': 'address', 'amount': 'float', 'mint': 'category', 'source': 'category'},
+  'sol_transfers_df': {'date': 'datetime', 'wallet': 'address', 'amount': 'float', 'mint': 'category', 'source': 'category'},
+  'df_stake_pools_all_sources': {'wallet': 'address', 'sources': 'category'},
+  'marinade_instant_unstaking': {'months': 'datetime'},
+}
+# the columns of fact_stake_pool_actions the dashboard reads, the snapshot keeps them all
+ACTIONS_COLUMNS = ['block_timestamp', 'tx_id', 'succeeded', 'address', 'stake_pool_name', 'action', 'amount']
+
+def apply_schema(df, name):
+  for column, kind in DATASETS[name].items():
+    if column not in df or kind == 'address':
+      continue
+    if kind == 'datetime':
+      # the warehouse returns utc strings, kept naive like they were in the csvs
+      df[column] = pd.to_datetime(df[column], utc = True).dt.tz_localize(None)
+    elif kind == 'float':
+      df[column] = pd.to_numeric(df[column], errors = 'coerce').astype('float64')
+    else:
+      df[column] = df[column].astype(kind)
+  return df
+
+def dataset_path(directory, name):
+  return os.path.join(directory, f'{name}.parquet')
+
+# wallets are stored as int32 ids into the snapshot's address book, strings only come back
+# where something outside the dashboard needs them (the sql IN lists of the refresh)
+address_book_lock = threading.Lock()
+
+class AddressBook:
+  # append only, an id once given means the same wallet in every later snapshot
+  def __init__(self, directory):
+    self.path = os.path.join(directory, ADDRESS_BOOK_FILE)
+    try:
+      self.addresses = pd.read_parquet(self.path)['address'].to_numpy(dtype = object)
+    except FileNotFoundError:
+      self.addresses = np.array([], dtype = object)
+    self.index = pd.Index(self.addresses)
+
+  def encode(self, values):
+    values = np.asarray(values, dtype = object)
+    ids = self.index.get_indexer(values)
+    missing = (ids < 0) & pd.notna(values)
+    if missing.any():
+      self.addresses = np.concatenate([self.addresses, pd.unique(values[missing])])
+      self.index = pd.Index(self.addresses)
+      write_parquet(pd.DataFrame({'address': self.addresses}), self.path)
+      ids = self.index.get_indexer(values)
+    return ids.astype('int32')
+
+  def decode(self, ids):
+    ids = np.asarray(ids)
+    addresses = self.addresses[np.where(ids < 0, 0, ids)] if len(self.addresses) > 0 else np.full(len(ids), None, dtype = object)
+    addresses[ids < 0] = None
+    return addresses
+
+def address_columns(df, name):
+  return [column for column, kind in DATASETS[name].items() if kind == 'address' and column in df]
+
+def encode_addresses(df, directory, name):
+  columns = [column for column in address_columns(df, name) if df[column].dtype == object]
+  if len(columns) == 0:
+    return df
+  df = df.copy()
+  # one writer at a time, every encode sees the ids handed out before it
+  with address_book_lock:
+    book = AddressBook(directory)
+    for column in columns:
+      df[column] = book.encode(df[column])
+  return df
+
+def decode_addresses(df, directory, name):
+  columns = [column for column in address_columns(df, name) if pd.api.types.is_integer_dtype(df[column])]
+  if len(columns) == 0:
+    return df
+  book = AddressBook(directory)
+  for column in columns:
+    df[column] = book.decode(df[column])
+  return df
+
+def migrate_snapshot(directory):
+  # one time, by whichever session or process gets there first while the others wait for it;
+  # two at once would hand out different ids for the same wallet
+  marker = os.path.join(directory, ADDRESS_BOOK_MIGRATED)
+  lock = os.path.join(directory, 'migrate.lock')
+  while not os.path.exists(marker):
+    try:
+      fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+      try:
+        if time.time() - os.path.getmtime(lock) > MIGRATE_STALE_SECONDS:
+          os.remove(lock)
+      except FileNotFoundError:
+        pass
+      time.sleep(0.5)
+      continue
+    os.close(fd)
+    try:
+      if not os.path.exists(marker):
+        migrate_datasets(directory)
+        open(marker, 'w').close()
+    finally:
+      os.remove(lock)
+
+def migrate_datasets(directory):
+  # csvs to parquet, the single actions file to partitions, wallet strings to ids
+  for name in DATASETS:
+    if name == 'fact_stake_pool_actions':
+      migrate_actions(directory)
+      if read_actions_manifest(directory) is not None:
+        actions = read_partitions(directory)
+        if any(actions[column].dtype == object for column in address_columns(actions, name)):
+          save_actions(actions, directory)
+      continue
+    csv = os.path.join(directory, f'{name}.csv')
+    if os.path.exists(dataset_path(directory, name)):
+      df = pd.read_parquet(dataset_path(directory, name))
+      if any(df[column].dtype == object for column in address_columns(df, name)):
+        save_dataset(df, directory, name)
+    elif os.path.exists(csv):
+      # the csv is left where it was
+      save_dataset(pd.read_csv(csv), directory, name)
+
+def save_dataset(df, directory, name):
+  df = apply_schema(df.reset_index(drop = True), name)
+  write_parquet(encode_addresses(df, directory, name), dataset_path(directory, name))
+  return df
+
+def read_dataset(directory, name, columns = None, decode = False):
+  migrate_snapshot(directory)
+  df = apply_schema(pd.read_parquet(dataset_path(directory, name), columns = columns), name)
+  return decode_addresses(df, directory, name) if decode else df
+
+# stake actions are stored as one file per month of block_timestamp plus a manifest
+# with each partition's row count and timestamp range, readers skip partitions by range
+def actions_manifest_path(directory):
+  return os.path.join(directory, ACTIONS_DIR, 'manifest.json')
+
+def read_actions_manifest(directory):
+  try:
+    with open(actions_manifest_path(directory)) as f:
+      return json.load(f)
+  except FileNotFoundError:
+    return None
+
+def migrate_actions(directory):
+  # one time, from the single file layout (or its csv)
+  if read_actions_manifest(directory) is not None:
+    return
+  single = dataset_path(directory, 'fact_stake_pool_actions')
+  csv = os.path.join(directory, 'fact_stake_pool_actions.csv')
+  if os.path.exists(single):
+    save_actions(pd.read_parquet(single), directory)
+    os.remove(single)
+  elif os.path.exists(csv):
+    save_actions(pd.read_csv(csv), directory)
+
+def save_actions(df, directory):
+  # the whole table, partitions of months it no longer has are removed
+  df = apply_schema(df.reset_index(drop = True), 'fact_stake_pool_actions')
+  stored = encode_addresses(df, directory, 'fact_stake_pool_actions')
+  os.makedirs(os.path.join(directory, ACTIONS_DIR), exist_ok = True)
+  old = (read_actions_manifest(directory) or {'partitions': {}})['partitions']
+  partitions = {}
+  for month, part in stored.groupby(stored['block_timestamp'].dt.strftime('%Y-%m')):
+    entry = partition_entry(month, part)
+    # actions are only ever appended, so a month with the same count and range holds the same rows
+    if old.get(month) != entry or not os.path.exists(os.path.join(directory, ACTIONS_DIR, entry['file'])):
+      write_parquet(part, os.path.join(directory, ACTIONS_DIR, entry['file']))
+    partitions[month] = entry
+  for month in set(old) - set(partitions):
+    os.remove(os.path.join(directory, ACTIONS_DIR, old[month]['file']))
+  write_actions_manifest(directory, partitions)
+  return df
+
+def append_actions(df, directory):
+  # new rows only: the partitions of the months they land in are extended, every other one is left as it is
+  df = apply_schema(df.reset_index(drop = True), 'fact_stake_pool_actions')
+  stored = encode_addresses(df, directory, 'fact_stake_pool_actions')
+  partitions = dict(read_actions_manifest(directory)['partitions'])
+  for month, part in stored.groupby(stored['block_timestamp'].dt.strftime('%Y-%m')):
+    if month in partitions:
+      part = pd.concat([pd.read_parquet(os.path.join(directory, ACTIONS_DIR, partitions[month]['file'])), part], ignore_index = True)
+    entry = partition_entry(month, part)
+    write_parquet(part, os.path.join(directory, ACTIONS_DIR, entry['file']))
+    partitions[month] = entry
+  write_actions_manifest(directory, partitions)
+  return df
+
+def partition_entry(month, part):
+  return {
+    'file': f'month={month}.parquet',
+    'rows': len(part),
+    'min': str(part['block_timestamp'].min()),
+    'max': str(part['block_timestamp'].max()),
+  }
+
+def write_actions_manifest(directory, partitions):
+  path = actions_manifest_path(directory)
+  with open(path + '.tmp', 'w') as f:
+    json.dump({'partitions': partitions}, f)
+  os.replace(path + '.tmp', path)
+
+def read_actions(directory, columns = None, since = None, before = None, decode = False):
+  migrate_snapshot(directory)
+  df = read_partitions(directory, columns, since, before)
+  return decode_addresses(df, directory, 'fact_stake_pool_actions') if decode else df
+
+def read_partitions(directory, columns = None, since = None, before = None):
+  # rows with since <= block_timestamp < before, either bound optional
+  partitions = read_actions_manifest(directory)['partitions']
+  read_columns = None if columns is None else list(dict.fromkeys(columns + ['block_timestamp']))
+
+  parts = []
+  for month in sorted(partitions):
+    entry = partitions[month]
+    if since is not None and pd.Timestamp(entry['max']) < since:
+      continue
+    if before is not None and pd.Timestamp(entry['min']) >= before:
+      continue
+    part = pd.read_parquet(os.path.join(directory, ACTIONS_DIR, entry['file']), columns = read_columns)
+    # only the partitions at the edges of the range hold rows outside it
+    if since is not None and pd.Timestamp(entry['min']) < since:
+      part = part[part['block_timestamp'] >= since]
+    if before is not None and pd.Timestamp(entry['max']) >= before:
+      part = part[part['block_timestamp'] < before]
+    parts.append(part)
+
+  if len(parts) == 0 and len(partitions) > 0:
+    # nothing in range, still the same columns
+    entry = partitions[min(partitions)]
+    parts.append(pd.read_parquet(os.path.join(directory, ACTIONS_DIR, entry['file']), columns = read_columns).iloc[:0])
+  df = pd.concat(parts, ignore_index = True) if len(parts) > 0 else pd.DataFrame(columns = read_columns)
+  if columns is not None:
+    df = df[columns]
+  # partitions carry their own categories, concat falls back to object where they differ
+  return apply_schema(df, 'fact_stake_pool_actions')
+
+# REFRESH LOCK
+def read_refresh_state():
+  try:
+    with open(REFRESH_STATE_PATH) as f:
+      return json.load(f)
+  except (FileNotFoundError, ValueError):
+    return None
+
+def write_refresh_state(status, stages, version = None, error = None):
+  state = {
+    'pid': os.getpid(),
+    'heartbeat': time.time(),
+    'status': status,
+    'stages': [stage.state() for stage in stages],
+    'version': version,
+    'error': error,
+  }
+  tmp = f'{REFRESH_STATE_PATH}.{os.getpid()}.tmp'
+  with open(tmp, 'w') as f:
+    json.dump(state, f)
+  os.replace(tmp, REFRESH_STATE_PATH)
+
+def refresh_lock_age(path = REFRESH_LOCK_PATH):
+  # seconds since the holder of the lock was last heard from, None when nobody holds it
+  try:
+    age = time.time() - os.path.getmtime(path)
+  except FileNotFoundError:
+    return None
+  state = read_refresh_state()
+  if state is not None and state['status'] == 'running':
+    age = min(age, time.time() - state['heartbeat'])
+  return age
+
+def refresh_running():
+  age = refresh_lock_age()
+  return age is not None and age < REFRESH_STALE_SECONDS
+
+def acquire_refresh_lock():
+  # O_EXCL create is atomic across threads and processes sharing data/, on every platform
+  for attempt in range(2):
+    try:
+      fd = os.open(REFRESH_LOCK_PATH, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+      age = refresh_lock_age()
+      if attempt > 0 or (age is not None and age < REFRESH_STALE_SECONDS):
+        return False
+      if not break_stale_lock():
+        return False
+      continue
+    with os.fdopen(fd, 'w') as f:
+      json.dump({'pid': os.getpid(), 'started': time.time()}, f)
+    return True
+  return False
+
+def break_stale_lock():
+  # moved aside under a name of its own rather than removed, so of several processes breaking it at once only
+  # one gets the file. Another may have broken it and taken a new lock since this one looked, so the file is
+  # checked again once moved, and a live lock goes back
+  claimed = f'{REFRESH_LOCK_PATH}.{uuid.uuid4().hex}'
+  try:
+    os.rename(REFRESH_LOCK_PATH, claimed)
+  except FileNotFoundError:
+    # broken by someone else, the create decides who holds it now
+    return True
+  age = refresh_lock_age(claimed)
+  stale = age is None or age >= REFRESH_STALE_SECONDS
+  if not stale:
+    try:
+      os.link(claimed, REFRESH_LOCK_PATH)
+    except FileExistsError:
+      pass
+  os.remove(claimed)
+  return stale
+
+def release_refresh_lock():
+  try:
+    os.remove(REFRESH_LOCK_PATH)
+  except FileNotFoundError:
+    pass
+
+def chunk_addresses(addresses, chunk_size = CHUNK_SIZE):
+  # sorted so the same staker set always produces the same IN-lists
+  addresses = sorted(addresses)
+  return [tuple(addresses[i:i+chunk_size]) for i in range(0, len(addresses), chunk_size)]
+
+# UserError is a 4xx from the API (bad SQL etc.), retrying it won't help
+@retry(retry=retry_if_not_exception_type(UserError), stop=stop_after_attempt(QUERY_RETRIES),
+  wait=wait_exponential(multiplier=2, max=60), reraise=True)
+def query_with_retry(sql):
+  return query_pages(sql, sdk, PAGE_SIZE, FETCH_WORKERS, warehouse_slots)
+
+# QUERY CACHE
+def query_cache_key(sql):
+  # whitespace only; literals such as base58 addresses are case sensitive
+  return hashlib.sha256(' '.join(sql.split()).encode()).hexdigest()
+
+def is_closed_window(window_end):
+  current_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+  return window_end is not None and window_end < current_month
+
+def query_cache_path(key, closed):
+  # entries written while their month was still open carry a ttl and never count as closed
+  return os.path.join(QUERY_CACHE_DIR, key + ('.parquet' if closed else '.ttl.parquet'))
+
+def is_expired(path, mtime):
+  return path.endswith('.ttl.parquet') and (QUERY_CACHE_TTL_HOURS is None or time.time() - mtime > QUERY_CACHE_TTL_HOURS * 3600)
+
+def read_query_cache(key, closed):
+  for path in [query_cache_path(key, True)] + ([] if closed else [query_cache_path(key, False)]):
+    try:
+      mtime = os.path.getmtime(path)
+      if is_expired(path, mtime):
+        continue
+      df = pd.read_parquet(path)
+      # atime drives the lru eviction, mtime is left alone for the ttl
+      os.utime(path, (time.time(), mtime))
+      return df
+    except (OSError, ValueError):
+      continue
+  return None
+
+def write_parquet(df, path):
+  # readers only ever see a complete file
+  tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+  try:
+    df.to_parquet(tmp, index = False, compression = 'zstd')
+    os.replace(tmp, path)
+  except BaseException:
+    if os.path.exists(tmp):
+      os.remove(tmp)
+    raise
+
+def write_query_cache(key, df, closed):
+  os.makedirs(QUERY_CACHE_DIR, exist_ok = True)
+  try:
+    write_parquet(df, query_cache_path(key, closed))
+  except (OSError, ValueError, TypeError):
+    # a column pyarrow can't type is just not cached
+    return
+  if closed and os.path.exists(query_cache_path(key, False)):
+    os.remove(query_cache_path(key, False))
+  evict_query_cache()
+
+def evict_query_cache(max_bytes = QUERY_CACHE_MAX_BYTES):
+  with query_cache_lock:
+    entries = []
+    for entry in os.scandir(QUERY_CACHE_DIR):
+      if entry.name.endswith('.parquet'):
+        stat = entry.stat()
+        entries.append((stat.st_atime, stat.st_size, stat.st_mtime, entry.path))
+
+    total = sum(size for _, size, _, _ in entries)
+    for atime, size, mtime, path in sorted(entries):
+      if total <= max_bytes and not is_expired(path, mtime):
+        continue
+      try:
+        os.remove(path)
+      except FileNotFoundError:
+        pass
+      total = total - size
+
+# CHECKPOINTS
+class RefreshCheckpoint:
+  def __init__(self, directory = CHECKPOINT_DIR, fresh = False):
+    self.directory = directory
+    self.path = os.path.join(directory, 'stages.json')
+    state = None
+    if not fresh:
+      try:
+        with open(self.path) as f:
+          state = json.load(f)
+      except (FileNotFoundError, ValueError):
+        state = None
+    # too old to resume, the open months it holds have moved on
+    if state is None or time.time() - state['started'] > CHECKPOINT_MAX_AGE_HOURS * 3600:
+      shutil.rmtree(directory, ignore_errors = True)
+      state = {'started': time.time(), 'stages': []}
+    self.state = state
+    self.lock = threading.Lock()
+    os.makedirs(os.path.join(directory, 'units'), exist_ok = True)
+    self.save()
+
+  def save(self):
+    with open(self.path + '.tmp', 'w') as f:
+      json.dump(self.state, f)
+    os.replace(self.path + '.tmp', self.path)
+
+  def is_complete(self, name):
+    return name in self.state['stages']
+
+  def complete(self, name):
+    with self.lock:
+      self.state['stages'].append(name)
+      self.save()
+
+  def clear(self):
+    shutil.rmtree(self.directory, ignore_errors = True)
+
+def checkpoint_unit_path(key):
+  return os.path.join(CHECKPOINT_DIR, 'units', key + '.parquet')
+
+def read_checkpoint_unit(key):
+  try:
+    return pd.read_parquet(checkpoint_unit_path(key))
+  except (OSError, ValueError):
+    return None
+
+def write_checkpoint_unit(key, df):
+  # only while a refresh holds a checkpoint open
+  if os.path.isdir(os.path.dirname(checkpoint_unit_path(key))):
+    try:
+      write_parquet(df, checkpoint_unit_path(key))
+    except (OSError, ValueError, TypeError):
+      pass
+
+def cached_query(sql, window_end = None):
+  closed = is_closed_window(window_end)
+  key = query_cache_key(sql)
+  df = read_query_cache(key, closed)
+  if df is None:
+    df = read_checkpoint_unit(key)
+  if df is None:
+    df = query_with_retry(sql)
+    # closed months go to the query cache for good, open ones only need to survive until the refresh finishes
+    if closed or QUERY_CACHE_TTL_HOURS is not None:
+      write_query_cache(key, df, closed)
+    if not closed:
+      write_checkpoint_unit(key, df)
+  return df
+
+def run_queries(queries, bar = None, max_workers = QUERY_WORKERS):
+  # queries are (sql, window_end) pairs, window_end being the end of the block_timestamp range
+  # the sql covers; results come back in the order of queries whatever order they finish in
+  results = [None] * len(queries)
+  if len(queries) == 0:
+    return results
+
+  with ThreadPoolExecutor(max_workers = max_workers) as pool:
+    futures = {pool.submit(cached_query, sql, window_end): i for i, (sql, window_end) in enumerate(queries)}
+    try:
+      for done, future in enumerate(as_completed(futures), 1):
+        results[futures[future]] = future.result()
+        if bar is not None:
+          bar.progress(done/len(queries))
+    except BaseException:
+      for future in futures:
+        future.cancel()
+      raise
+  return results
+
+def load_actions_watermark(directory):
+  try:
+    with open(os.path.join(directory, ACTIONS_WATERMARK_FILE)) as f:
+      return json.load(f)
+  except (FileNotFoundError, ValueError):
+    return None
+
+def save_actions_watermark(df, directory):
+  # last ingested row, ties on block_timestamp broken by tx_id like the query ordering
+  last = df.sort_values(['block_timestamp', 'tx_id']).iloc[-1]
+  rows = sum(entry['rows'] for entry in read_actions_manifest(directory)['partitions'].values())
+  watermark = {'block_timestamp': str(last['block_timestamp']), 'tx_id': last['tx_id'], 'rows': rows}
+  path = os.path.join(directory, ACTIONS_WATERMARK_FILE)
+  with open(path + '.tmp', 'w') as f:
+    json.dump(watermark, f)
+  os.replace(path + '.tmp', path)
+
+def load_stake_pool_actions(full_refresh = False, directory = 'data'):
+  # brings the stored actions up to date, reading and writing only the months the new rows land in
+  watermark = None if full_refresh else load_actions_watermark(directory)
+  migrate_snapshot(directory)
+  incremental = watermark is not None and read_actions_manifest(directory) is not None
+
+  # rows sharing the watermark timestamp are fetched again and deduped below
+  where = f"where block_timestamp >= TO_TIMESTAMP('{watermark['block_timestamp']}')" if incremental else ''
   sql_1 = f'''
   select *
   from solana.core.fact_stake_pool_actions
-  order by block_timestamp'''
-
-  fact_stake_pool_actions = pd.DataFrame()
-  for i in range (1,10):
-    # print("Loading Page number", i)
-    result = sdk.query(sql_1, page_number=i)
-    result = pd.DataFrame(result.records)
-    fact_stake_pool_actions = pd.concat([fact_stake_pool_actions, result])
-
-  fact_stake_pool_actions = fact_stake_pool_actions.reset_index(drop = True)
-  fact_stake_pool_actions.to_csv('data/fact_stake_pool_actions.csv', index = False)
-
-  
-  st.write('Staking Pool data is up to date!')
-  my_bar.progress(curr/total)
-  curr = curr + 1
-
-  # UPDATE STAKER COUNT
-  st.write(curr, '/', total, 'Updating Stakers data ...')
-
-  sc = load_staker_count(fact_stake_pool_actions)
-  scp = load_staker_count_pool(fact_stake_pool_actions)  
-  
-  sc = sc.reset_index(drop = True)
-  sc.to_csv('data/sc.csv', index = False)
-
-  scp = scp.reset_index(drop = True)
-  scp.to_csv('data/scp.csv', index = False)
-
-  st.write('Stakers data is up to date!')
-  my_bar.progress(curr/total)
-  curr = curr + 1
-
-  # UPDATE SOL HOLDINGS
-  st.write(curr, '/', total, 'Updating SOL Holdings data ...')
-
-  sol_holdings_df = load_sol_holdings(fact_stake_pool_actions)
-  sol_holdings_df = sol_holdings_df.reset_index(drop = True)
-  sol_holdings_df.to_csv('data\sol_holdings_df.csv', index = False)
-
-  st.write('SOL Holdings data is up to date!')
-  my_bar.progress(curr/total)
-  curr = curr + 1
-
-  # UPDATE Protocol Interactions
-  st.write(curr, '/', total, 'Updating Protocol Interactions data ...')
-  protocol_interactions_df = load_protocol_interactions(fact_stake_pool_actions)
-  protocol_interactions_df = protocol_interactions_df.reset_index(drop = True)
-  protocol_interactions_df.to_csv('data\protocol_interactions_df.csv', index = False)
-  st.write('Protocol Interactions data is up to date!')
-  my_bar.progress(curr/total)
-  curr = curr + 1
-
-  # UPDATE BRIDGERS
-  st.write(curr, '/', total, 'Updating Bridgers data ...')
-  eth_bridgers_df = load_bridge_sources(fact_stake_pool_actions)
-  eth_bridgers_df = eth_bridgers_df.reset_index(drop = True)
-  eth_bridgers_df.to_csv('data\eth_bridgers_df.csv', index = False)
-  st.write('Bridgers data is up to date!')
-  my_bar.progress(curr/total)
-  curr = curr + 1
-
-  # UPDATE sol_transfers_df
-  st.write(curr, '/', total, 'Updating sol_transfers_df data ...')
-  sol_transfers_df = load_sol_transfer_sources(fact_stake_pool_actions)
-  sol_transfers_df = sol_transfers_df.reset_index(drop = True)
-  sol_transfers_df.to_csv('data\sol_transfers_df.csv', index = False)
-  st.write('sol_transfers_df data is up to date!')
-  my_bar.progress(curr/total)
-  curr = curr + 1
-
-    # UPDATE ALL SOURCES
-  st.write(curr, '/', total, 'Updating ALL SOURCES data ...')
-  df_all_sources = load_all_sources(eth_bridgers_df, sol_transfers_df)
-  df_all_sources = df_all_sources.reset_index(drop = True)
-  df_all_sources.to_csv('data\df_stake_pools_all_sources.csv', index = False)
-  st.write('ALL SOURCES data is up to date!')
-  my_bar.progress(curr/total)
-  curr = curr + 1
-
-  # UPDATE Marinade Instant Unstaking
-  st.write(curr, '/', total, 'Updating Marinade Instant Unstaking data ...')
-  marinade_instant_unstaking = load_marinade_instant_unstaking()
-  marinade_instant_unstaking = marinade_instant_unstaking.reset_index(drop = True)
-  marinade_instant_unstaking.to_csv('data\marinade_instant_unstaking.csv', index = False)
-  st.write('ALL marinade_instant_unstaking data is up to date!')
-  my_bar.progress(curr/total)
-  curr = curr + 1
-
-
-def load_data():
-    df = pd.read_csv(
-        "data/fact_stake_pool_actions.csv"
-    )
-
+  {where}
+  order by block_timestamp, tx_id'''
+
+  new_actions = query_with_retry(sql_1)
+
+  if not incremental:
+    new_actions = save_actions(new_actions, directory)
+  else:
+    # only the partition holding the watermark is read for them
+    boundary = read_actions(directory, since = pd.Timestamp(watermark['block_timestamp']))
+    new_actions = new_actions[~new_actions['tx_id'].isin(boundary['tx_id'])]
+    new_actions = append_actions(new_actions.reindex(columns = boundary.columns), directory)
+
+  if len(new_actions) > 0:
+    save_actions_watermark(new_actions, directory)
+  return new_actions
+
+# STAKER COUNTS
+# the engine's state is kept next to the counts it publishes, so the next refresh carries on from it
+def load_staker_engine(directory):
+  try:
+    with open(os.path.join(directory, STAKER_BALANCES_WATERMARK_FILE)) as f:
+      state = json.load(f)
+  except (FileNotFoundError, ValueError):
+    return StakerCountEngine()
+  if 'pools' not in state or not os.path.exists(dataset_path(directory, 'first_deposits')):
+    # kept before pools or first deposits were tracked, both have to be rebuilt
+    return StakerCountEngine()
+  return StakerCountEngine(read_dataset(directory, 'staker_balances', decode = True), read_dataset(directory, 'sc'), read_dataset(directory, 'scp'),
+    read_dataset(directory, 'staker_memberships'), state['watermark'], state['pools'], read_dataset(directory, 'first_deposits', decode = True))
+
+def save_staker_engine(engine, directory):
+  save_dataset(engine.balances, directory, 'staker_balances')
+  save_dataset(engine.memberships, directory, 'staker_memberships')
+  save_dataset(engine.first_deposits, directory, 'first_deposits')
+  path = os.path.join(directory, STAKER_BALANCES_WATERMARK_FILE)
+  with open(path + '.tmp', 'w') as f:
+    json.dump({'watermark': engine.watermark, 'pools': engine.pools}, f)
+  os.replace(path + '.tmp', path)
+
+def read_data(directory):
     #STAKER COUNT
-    sc = pd.read_csv(
-        "data/sc.csv"
+    sc = read_dataset(
+        directory, "sc"
     )
 
     #STAKER COUNT POOL
-    scp = pd.read_csv(
-        "data/scp.csv"
+    scp = read_dataset(
+        directory, "scp"
     )
 
-    sol_holdings_df = pd.read_csv(
-      'data/sol_holdings_df.csv'
+    sol_holdings_df = read_dataset(
+      directory, 'sol_holdings_df'
       )
 
-    funds_df = pd.read_csv(
-      'data/df_stake_pools_all_sources.csv'
+    funds_df = read_dataset(
+      directory, 'df_stake_pools_all_sources'
     )
 
-    protocol_df = pd.read_csv(
-      'data/protocol_interactions_df.csv'
+    protocol_df = read_dataset(
+      directory, 'protocol_interactions_df'
     )
 
     
-    return df, sc, scp, sol_holdings_df, funds_df, protocol_df
-
-def load_marinade_instant_unstaking():
+    return sc, scp, sol_holdings_df, funds_df, protocol_df
+
+class FigureCache:
+  def __init__(self, max_bytes = FIGURE_CACHE_MAX_BYTES):
+    self.max_bytes = max_bytes
+    self.lock = threading.Lock()
+    # least recently drawn first
+    self.figures = OrderedDict()
+    self.bytes = 0
+    self.hits = 0
+    self.misses = 0
+
+  def get(self, key, build):
+    with self.lock:
+      figure = self.figures.get(key)
+      if figure is not None:
+        self.figures.move_to_end(key)
+        self.hits += 1
+        return figure
+      self.misses += 1
+    # built outside the lock so other sessions' views are not held up; two sessions on the same miss both build it
+    figure = build().to_json().encode()
+    with self.lock:
+      if key not in self.figures:
+        self.figures[key] = figure
+        self.bytes += len(figure)
+        while self.bytes > self.max_bytes:
+          self.bytes -= len(self.figures.popitem(last = False)[1])
+    return figure
+
+  def stats(self):
+    with self.lock:
+      return {'figures': len(self.figures), 'mb': round(self.bytes / 2**20, 1), 'hits': self.hits, 'misses': self.misses}
+
+@st.experimental_singleton
+def figure_cache():
+  return FigureCache()
+
+def figure_view(view = None, dated = False):
+  # a view returns its figure and this draws it. The data it is given all comes from the snapshot it is
+  # drawn for, so the snapshot and the selected options, the string arguments, tell one render from another.
+  # A dated view also depends on when it is drawn, its renders are kept for the running month only
+  if view is None:
+    return lambda view: figure_view(view, dated)
+
+  def figure(snapshot, *args, figures = None):
+    month = datetime.now().strftime('%Y-%m') if dated else None
+    key = (view.__name__, snapshot, month, tuple(arg for arg in args if isinstance(arg, str)))
+    return (figures or figure_cache()).get(key, lambda: view(*args))
+
+  @functools.wraps(view)
+  def show(snapshot, *args):
+    st.plotly_chart(pio.from_json(figure(snapshot, *args)), use_container_width=True)
+  # for building the figure without drawing it
+  show.figure = figure
+  return show
+
+class TabTraffic:
+  def __init__(self, history = WARMUP_HISTORY):
+    self.lock = threading.Lock()
+    # (tab, options) of the latest reruns, older ones fall off
+    self.requests = deque(maxlen = history)
+
+  def record(self, tab, options):
+    with self.lock:
+      self.requests.append((tab, options))
+
+  def popular(self, top = WARMUP_TOP):
+    with self.lock:
+      counts = Counter(self.requests)
+    return [request for request, count in counts.most_common(top)]
+
+@st.experimental_singleton
+def tab_traffic():
+  return TabTraffic()
+
+class WarmUp:
+  # the caches it fills are handed over when the process-wide one is made, since its workers run no
+  # session's script and the singletons would give them new, empty ones. The workers are its own: started
+  # here, fed through its queue and never tied to a session, which may end while they draw. They are
+  # daemon threads, so a server shutting down drops what is still queued instead of drawing it first
+  def __init__(self, figures, snapshots, traffic, workers = WARMUP_WORKERS):
+    self.figures = figures
+    self.snapshots = snapshots
+    self.traffic = traffic
+    self.lock = threading.Lock()
+    self.started = set()
+    # (function, args) in the order they were queued, None to stop a worker
+    self.tasks = queue.Queue()
+    self.workers = [threading.Thread(target = self.work, name = f'warmup-{i}', daemon = True) for i in range(workers)]
+    for worker in self.workers:
+      worker.start()
+
+  def start(self, snapshot):
+    # once per snapshot, and planned by the workers too so neither a session nor the refresh waits on it
+    with self.lock:
+      if snapshot in self.started:
+        return
+      self.started.add(snapshot)
+    self.tasks.put((self.plan, (snapshot,)))
+
+  def plan(self, snapshot):
+    requests = self.traffic.popular()
+    for request in default_tab_options(snapshot, self.snapshots):
+      if request not in requests:
+        requests.append(request)
+    # the workers take them in order, so the most requested are drawn first
+    for tab, options in requests:
+      self.tasks.put((self.draw, (snapshot, tab, options)))
+
+  def draw(self, snapshot, tab, options):
+    for view, args in tab_figures(snapshot, tab, options, self.snapshots):
+      view.figure(snapshot, *args, figures = self.figures)
+
+  def work(self):
+    while True:
+      task = self.tasks.get()
+      if task is None:
+        return
+      function, args = task
+      try:
+        function(*args)
+      except Exception:
+        # a selection that fails here fails again in the session that asks for it, which shows the error
+        pass
+
+  def close(self):
+    # drops what is still queued, each worker stops once it is done with what it is drawing
+    with self.tasks.mutex:
+      self.tasks.queue.clear()
+    for worker in self.workers:
+      self.tasks.put(None)
+
+@st.experimental_singleton
+def warm_up():
+  warm = WarmUp(figure_cache(), snapshot_cache(), tab_traffic())
+  atexit.register(warm.close)
+  return warm
+
+@st.experimental_singleton
+def snapshot_cache():
+  return SnapshotCache(SNAPSHOT_KEEP)
+
+def load_data(snapshot, snapshots = None):
+  return (snapshots or snapshot_cache()).get(snapshot, 'data', lambda: read_data(snapshot))
+
+def load_net(snapshot, snapshots = None):
+  return (snapshots or snapshot_cache()).get(snapshot, 'net', lambda: prepare_net(load_events(snapshot, snapshots)))
+
+def load_events(snapshot, snapshots = None):
+  return (snapshots or snapshot_cache()).get(snapshot, 'events', lambda: prepare_events(read_actions(snapshot, ACTIONS_COLUMNS)))
+
+def load_balance_index(snapshot, snapshots = None):
+  return (snapshots or snapshot_cache()).get(snapshot, 'balance_index', lambda: BalanceIndex(load_events(snapshot, snapshots)))
+
+def load_market_share(snapshot, snapshots = None):
+  return (snapshots or snapshot_cache()).get(snapshot, 'market_share', lambda: MarketShareCube(load_net(snapshot, snapshots), load_events(snapshot, snapshots), load_data(snapshot, snapshots)[1]))
+
+def load_cohorts(snapshot, snapshots = None):
+  def build():
+    try:
+      first_deposits = read_dataset(snapshot, 'first_deposits')
+    except FileNotFoundError:
+      # published before the staker engine kept them
+      first_deposits = first_deposits_of(load_events(snapshot, snapshots))
+    return CohortIndex(first_deposits, load_balance_index(snapshot, snapshots))
+  return (snapshots or snapshot_cache()).get(snapshot, 'cohorts', build)
+
+def load_churn(snapshot, snapshots = None):
+  return (snapshots or snapshot_cache()).get(snapshot, 'churn', lambda: ChurnTable(load_events(snapshot, snapshots)))
+
+def load_crossover(snapshot, snapshots = None):
+  return (snapshots or snapshot_cache()).get(snapshot, 'crossover', lambda: CrossoverMatrix(load_balance_index(snapshot, snapshots)))
+
+def load_histograms(snapshot, snapshots = None):
+  # the ages run to now, so they are built again once a new month starts
+  month = datetime.now().strftime('%Y-%m')
+  return (snapshots or snapshot_cache()).get(snapshot, ('histograms', month), lambda: StakeHistograms(load_events(snapshot, snapshots), load_balance_index(snapshot, snapshots), STAKE_AMOUNT_EDGES, STAKE_AGE_EDGES))
+
+def load_marinade_instant_unstaking(bar = None):
   num_months = (datetime.now().year - dt.datetime(2021,8,31).year) * 12 + datetime.now().month - dt.datetime(2021,8,31).month
   marinade_unstaking = pd.DataFrame()
 
+  queries = []
   for i in range(0, num_months + 1):
     date_needed = dt.datetime(2021,8,31) + relativedelta(months=+i)
     date_needed_string = date_needed.strftime('%Y-%m-%d')
-    print('Month', i, date_needed_string)
-    sql_marinade_unstaking = f"""
+    queries.append((f"""
     with base as (select distinct(tx_id) as tx_id
       from solana.core.fact_transactions
       where log_messages::string like '%LiquidUnstake%'
@@ -170,13 +1122,9 @@ def load_marinade_instant_unstaking():
       and mint = 'So11111111111111111111111111111111111111112'
       and tx_id in (select tx_id from base)
       group by 1
-    """
+    """, date_needed))
 
-    current_marinade_unstaking = sdk.query(sql_marinade_unstaking)
-
-    marinade_unstaking_temp = pd.DataFrame(current_marinade_unstaking.records)
-
-    marinade_unstaking = marinade_unstaking.append(marinade_unstaking_temp)
+  marinade_unstaking = pd.concat([marinade_unstaking] + run_queries(queries, bar))
 
   marinade_unstaking = marinade_unstaking.sort_values(by=['months'])
   temp_df = pd.DataFrame()
@@ -186,7 +1134,6 @@ def load_marinade_instant_unstaking():
   return temp_df
 
 
-
 def load_all_sources(eth_bridgers_df, sol_transfers_df):
 
   df = pd.concat([sol_transfers_df, eth_bridgers_df])
@@ -205,16 +1152,19 @@ def load_all_sources(eth_bridgers_df, sol_transfers_df):
 
   return df_all_sources
 
-def load_sol_transfer_sources(df):
+def load_sol_transfer_sources(df, bar = None):
+  if bar is None:
+    bar = st.progress(0)
   sol_transfers_df = pd.DataFrame(columns=['date', 'wallet', 'amount', 'mint', 'source'])
 
   #transforms on the df
   df = df[(df.succeeded == True)]
-  addresses = list(set(df['address'].tolist()))
+  addresses = set(df['address'].tolist())
 
   num_months = (datetime.now().year - dt.datetime(2020,3,31).year) * 12 + datetime.now().month - dt.datetime(2020,3,31).month
 
   for i in range(0, num_months + 1):
+    bar.progress(i/num_months)
     date_needed = dt.datetime(2022,1,31) + relativedelta(months=+i)
     last_day_string = date_needed.strftime('%Y-%m-%d')
     first_day_string = date_needed.replace(day=1).strftime('%Y-%m-%d')
@@ -222,17 +1172,9 @@ def load_sol_transfer_sources(df):
     if len(addresses) == 0:
       break
 
-    addresses_left = list(addresses)
-    
-    chunked_list = list()
-    chunk_size = 16000
-
-    wallets_to_remove = []
-
-
-    for i in range(0, len(addresses_left), chunk_size):
-        query_stakers = tuple(addresses_left[i:i+chunk_size])
-        sql_first_transfer = f"""
+    queries = []
+    for query_stakers in chunk_addresses(addresses):
+      queries.append((f"""
           WITH base AS (
             SELECT t.block_timestamp AS date, t.tx_to AS wallet, t.amount, 'SOL' AS mint,
               CASE
@@ -252,37 +1194,32 @@ def load_sol_transfer_sources(df):
           WHERE row_number = 1
           ORDER BY wallet, source
 
-        """
-        first_transfer_result = sdk.query(sql_first_transfer)
-
-        if len(first_transfer_result.rows) == 0:
-          continue
-        else:
-          df_sol_transfers = pd.DataFrame(first_transfer_result.records)
-
-          sol_transfers_df = sol_transfers_df.append(df_sol_transfers)
+      """, date_needed))
 
-          wallets_to_remove.extend(list(set(df_sol_transfers['wallet'].tolist())))
+    # only wallets still without a first transfer are looked up in the following months
+    results = [result for result in run_queries(queries) if len(result) > 0]
+    if len(results) == 0:
+      continue
+    df_sol_transfers = pd.concat(results)
+    sol_transfers_df = pd.concat([sol_transfers_df, df_sol_transfers])
+    addresses = addresses - set(df_sol_transfers['wallet'].tolist())
 
-    for wallet in list(set(wallets_to_remove)):
-      try:
-        addresses.remove(wallet)
-      except:
-        continue
-        
   return sol_transfers_df
 
-def load_bridge_sources(df):
+def load_bridge_sources(df, bar = None):
+  if bar is None:
+    bar = st.progress(0)
   eth_bridgers_df = pd.DataFrame(columns=['date', 'wallet', 'amount', 'mint', 'source'])
 
 
   #transforms on the df
   df = df[(df.succeeded == True)]
-  addresses = list(set(df['address'].tolist()))
+  addresses = set(df['address'].tolist())
 
   num_months = (datetime.now().year - dt.datetime(2021,9,30).year) * 12 + datetime.now().month - dt.datetime(2021,9,30).month
 
   for i in range(0, num_months + 1):
+    bar.progress(i/num_months)
     date_needed = dt.datetime(2022,1,31) + relativedelta(months=+i)
     last_day_string = date_needed.strftime('%Y-%m-%d')
     first_day_string = date_needed.replace(day=1).strftime('%Y-%m-%d')
@@ -290,17 +1227,9 @@ def load_bridge_sources(df):
     if len(addresses) == 0:
       break
 
-    addresses_left = list(addresses)
-    
-    chunked_list = list()
-    chunk_size = 16000
-
-    wallets_to_remove = []
-
-
-    for i in range(0, len(addresses_left), chunk_size):
-        query_stakers = tuple(addresses_left[i:i+chunk_size])
-        sql_eth_bridgers = f"""
+    queries = []
+    for query_stakers in chunk_addresses(addresses):
+      queries.append((f"""
           with bridged_token as (
             select 'AjkPkq3nsyDe1yKcbyZT7N4aK4Evv9om9tzhQD3wsRC' as address, '1INCH' as symbol, '1INCH Token (Portal)' as name, 'eth' as origin, 'sol' as dest, 8.0 as decimal UNION
             select '4ThReWAbAVZjNVgs5Ui9Pk3cZ5TYaD9u6Y89fp6EFzoF' as address, '1SOL' as symbol, '1sol.io (Portal)' as name, 'eth' as origin, 'sol' as dest, 8.0 as decimal UNION
@@ -432,27 +1361,20 @@ def load_bridge_sources(df):
             FROM base
             WHERE row_number = 1
             ORDER BY wallet, source
-        """
-        eth_bridgers_result = sdk.query(sql_eth_bridgers)
-
-        if len(eth_bridgers_result.rows) == 0:
-          continue
-        else:
-          eth_bridgers_df_temp = pd.DataFrame(eth_bridgers_result.records)
-
-          eth_bridgers_df = eth_bridgers_df.append(eth_bridgers_df_temp)
+      """, date_needed))
 
-          wallets_to_remove.extend(list(set(eth_bridgers_df['wallet'].tolist())))
+    results = [result for result in run_queries(queries) if len(result) > 0]
+    if len(results) == 0:
+      continue
+    eth_bridgers_df_temp = pd.concat(results)
+    eth_bridgers_df = pd.concat([eth_bridgers_df, eth_bridgers_df_temp])
+    addresses = addresses - set(eth_bridgers_df_temp['wallet'].tolist())
 
-    for wallet in list(set(wallets_to_remove)):
-      try:
-        addresses.remove(wallet)
-      except:
-        continue
-        
   return eth_bridgers_df
   
-def load_protocol_interactions(df):
+def load_protocol_interactions(df, bar = None):
+  if bar is None:
+    bar = st.progress(0)
   protocol_interactions_df = pd.DataFrame(columns=['wallet', 'protocol', 'month_year'])
 
   #transforms on the df
@@ -463,21 +1385,16 @@ def load_protocol_interactions(df):
 
   num_months = (datetime.now().year - dt.datetime(2022,1,31).year) * 12 + datetime.now().month - dt.datetime(2022,1,31).month
 
+  queries = []
   for i in range(0, num_months + 1):
     date_needed = dt.datetime(2022,1,31) + relativedelta(months=+i)
     date_needed_string = date_needed.strftime('%Y-%m-%d')
 
     mask = df['block_timestamp'] <= date_needed
     df_filtered = df.loc[mask]
-    addresses = tuple(set(df_filtered['address'].tolist()))
-    
-    chunked_list = list()
-    chunk_size = 16000
-
 
-    for i in range(0, len(addresses), chunk_size):
-        query_stakers = tuple(addresses[i:i+chunk_size])
-        sql_protocol_interactions = f"""
+    for query_stakers in chunk_addresses(set(df_filtered['address'].tolist())):
+      queries.append((f"""
           select 
           t.signers[0] as wallet,  initcap(l.label) as protocol, '{date_needed_string}' AS month_year
           from solana.core.fact_transactions t 
@@ -485,18 +1402,14 @@ def load_protocol_interactions(df):
           WHERE block_timestamp >= TO_DATE('{date_needed_string}') - 30 AND block_timestamp < TO_DATE('{date_needed_string}') and l.label_subtype != 'token_contract' and l.label != 'solana' and t.succeeded = TRUE
             and t.signers[0] in {query_stakers}
           group by wallet, protocol
-        """
-
-        protocol_interactions_result = sdk.query(sql_protocol_interactions)
+      """, date_needed))
 
-        protocol_interactions_df_temp = pd.DataFrame(protocol_interactions_result.records)
-
-        protocol_interactions_df = protocol_interactions_df.append(protocol_interactions_df_temp)
+  protocol_interactions_df = pd.concat([protocol_interactions_df] + run_queries(queries, bar))
 
   return protocol_interactions_df
   
-def load_sol_holdings(df):
-  sol_holdings_bar = st.progress(0)
+def load_sol_holdings(df, bar = None):
+  sol_holdings_bar = st.progress(0) if bar is None else bar
   sol_holdings_df = pd.DataFrame(columns=['wallet', 'token', 'sol_amount', 'amount_type', 'month_year'])
 
   #transforms on the df
@@ -507,22 +1420,16 @@ def load_sol_holdings(df):
 
   num_months = (datetime.now().year - dt.datetime(2022,1,31).year) * 12 + datetime.now().month - dt.datetime(2022,1,31).month
 
+  queries = []
   for i in range(0, num_months + 1):
-    sol_holdings_bar.progress(i/num_months)
     date_needed = dt.datetime(2022,1,31) + relativedelta(months=+i)
     date_needed_string = date_needed.strftime('%Y-%m-%d')
 
     mask = df['block_timestamp'] <= date_needed
     df_filtered = df.loc[mask]
-    addresses = tuple(set(df_filtered['address'].tolist()))
-    
-    chunked_list = list()
-    chunk_size = 16000
-
 
-    for i in range(0, len(addresses), chunk_size):
-        query_stakers = tuple(addresses[i:i+chunk_size])
-        sql_current_stakers_sol_holdings = f"""
+    for query_stakers in chunk_addresses(set(df_filtered['address'].tolist())):
+      queries.append((f"""
           WITH token_holdings AS (
             SELECT block_timestamp, post_tokens.value:owner AS wallet, post_tokens.value:mint AS token, post_tokens.value:uiTokenAmount:uiAmount AS amount,
               ROW_NUMBER() OVER (PARTITION BY wallet, token ORDER BY block_timestamp DESC) AS rn
@@ -550,239 +1457,63 @@ def load_sol_holdings(df):
               ELSE 'f. SOL > 10k'
             END AS amount_type, '{date_needed_string}' AS month_year
           from latest_holdings
-        """
-
-        current_stakers_sol_holdings_result = sdk.query(sql_current_stakers_sol_holdings)
-
-        sol_holdings_df_temp = pd.DataFrame(current_stakers_sol_holdings_result.records)
+      """, date_needed))
 
-        sol_holdings_df = sol_holdings_df.append(sol_holdings_df_temp)
+  sol_holdings_df = pd.concat([sol_holdings_df] + run_queries(queries, sol_holdings_bar))
 
   return sol_holdings_df
 
-def load_net(df):
-  # GET NET DEPOSIT
-  actions = df["action"].isin(['deposit', 'deposit_stake', 'deposit_dao', 'deposit_dao_stake', 'deposit_dao_with_referrer'])
-  cols = ['stake_pool_name', 'tx_id', 'block_timestamp',
-          'succeeded', 'action', 'amount', 'address']
-  deposits = df.loc[actions, cols]
-
-  deposits['amount'] = deposits['amount'].astype('float')/10**9
-  deposits = deposits[(deposits.succeeded == True)]
-
-  deposits['block_timestamp'] = pd.to_datetime(deposits.block_timestamp)
-  deposits['month'] = deposits.block_timestamp.dt.strftime('%Y-%m')
-  deposits = deposits.drop('block_timestamp', axis = 1)
-  deposits = deposits.groupby(['month', 'stake_pool_name']).sum().reset_index()
-
-  actions = df["action"].isin(['withdraw', 'withdraw_stake', 'withdraw_dao', 'withdraw_dao_stake', 'claim'])
-  cols = ['stake_pool_name', 'tx_id', 'block_timestamp',
-          'succeeded', 'action', 'amount', 'address']
-  withdrawals = df.loc[actions, cols]
-
-  withdrawals['amount'] = withdrawals['amount'].astype('float')/10**9
-  withdrawals = withdrawals[(withdrawals.succeeded == True)]
-  withdrawals['block_timestamp'] = pd.to_datetime(withdrawals.block_timestamp)
-  withdrawals['month'] = withdrawals.block_timestamp.dt.strftime('%Y-%m')
-  withdrawals = withdrawals.drop('block_timestamp', axis = 1)
-  withdrawals = withdrawals.groupby(['month', 'stake_pool_name']).sum().reset_index()
-
-  net = deposits.merge(withdrawals, how='outer', left_on = ['month', 'stake_pool_name'], right_on = ['month', 'stake_pool_name'])
-  net = net.fillna(0)
-  net = net.rename(columns={'amount_x': 'deposit', 'amount_y': 'withdraw'})
-
-  net['net_deposit'] = net['deposit'] - net['withdraw']
-  net['stake_pool_name'] = net['stake_pool_name'].str.capitalize()
-  net['cumulative_net_deposit'] = net.groupby(['stake_pool_name'])['net_deposit'].apply(lambda x: x.cumsum())
-  net.sort_values(by = 'month', ascending = True)
-  return net
-
-def load_staker_count(df):
-  actions = df["action"].isin(['deposit', 'deposit_stake', 'deposit_dao', 'deposit_dao_stake', 'deposit_dao_with_referrer'])
-  cols = ['stake_pool_name', 'address', 'tx_id', 'block_timestamp',
-          'succeeded', 'action', 'amount']
-  deposits = df.loc[actions, cols]
-
-  deposits['amount'] = deposits['amount'].astype('float')/10**9
-  deposits = deposits[(deposits.succeeded == True)]
-
-  deposits['block_timestamp'] = pd.to_datetime(deposits.block_timestamp)
-  deposits['month'] = deposits.block_timestamp.dt.strftime('%Y-%m')
-  deposits = deposits.drop('block_timestamp', axis = 1)
-  date = list(deposits['month'].unique())
-
-  staker_count_list = []
-  for i in date:
-    actions = df["action"].isin(['deposit', 'deposit_stake', 'deposit_dao', 'deposit_dao_stake', 'deposit_dao_with_referrer'])
-    cols = ['stake_pool_name', 'address', 'tx_id', 'block_timestamp',
-            'succeeded', 'action', 'amount']
-    deposits = df.loc[actions, cols]
-
-    deposits['amount'] = deposits['amount'].astype('float')/10**9
-    deposits = deposits[(deposits.succeeded == True)]
-
-    deposits['block_timestamp'] = pd.to_datetime(deposits.block_timestamp)
-    deposits['month'] = deposits.block_timestamp.dt.strftime('%Y-%m')
-    deposits = deposits.drop('block_timestamp', axis = 1)
-    filtered_deposit = deposits.loc[deposits['month'] <= i]
-
-    deposits = filtered_deposit.groupby(['address', 'stake_pool_name']).sum().reset_index()
-
-    actions = df["action"].isin(['withdraw', 'withdraw_stake', 'withdraw_dao', 'withdraw_dao_stake', 'claim'])
-    cols = ['stake_pool_name', 'address', 'tx_id', 'block_timestamp',
-            'succeeded', 'action', 'amount']
-    withdrawals = df.loc[actions, cols]
-
-    withdrawals['amount'] = withdrawals['amount'].astype('float')/10**9
-    withdrawals = withdrawals[(withdrawals.succeeded == True)]
-    withdrawals['block_timestamp'] = pd.to_datetime(withdrawals.block_timestamp)
-    withdrawals['month'] = withdrawals.block_timestamp.dt.strftime('%Y-%m')
-
-    withdrawals = withdrawals.drop('block_timestamp', axis = 1)
-
-    filtered_withdrawals = withdrawals.loc[withdrawals['month'] <= i]
-    withdrawals = filtered_withdrawals.groupby(['address', 'stake_pool_name']).sum().reset_index()
-
-
-  # Net Deposits and Withdrawals
-    net = deposits.merge(withdrawals, how='left', left_on = ['address', 'stake_pool_name'], right_on = ['address', 'stake_pool_name']).drop(['succeeded_x', 'succeeded_y', 'stake_pool_name'], axis = 1)
-    net = net.fillna(0)
-    net = net.rename(columns={'amount_x': 'deposit', 'amount_y': 'withdraw'})
-    net['net_deposit'] = net['deposit'] - net['withdraw']
-    net = net.groupby(by = ['address']).sum().reset_index()
-    net['staker_status'] = net['net_deposit'].apply(lambda x: 1 if x > 0 else 0)
-    staker_count_list.append(net['staker_status'].sum())
-
-  # Staker Count
-  staker_count = {
-      'month' : date,
-      'staker_count' : staker_count_list
-  }
-
-  staker_count_df = pd.DataFrame(staker_count)
-  return staker_count_df
-
-def load_staker_count_pool(df):
-  actions = df["action"].isin(['deposit', 'deposit_stake', 'deposit_dao', 'deposit_dao_stake', 'deposit_dao_with_referrer'])
-  cols = ['stake_pool_name', 'address', 'tx_id', 'block_timestamp',
-          'succeeded', 'action', 'amount']
-  deposits = df.loc[actions, cols]
-
-  deposits['amount'] = deposits['amount'].astype('float')/10**9
-  deposits = deposits[(deposits.succeeded == True)]
-  deposits['block_timestamp'] = pd.to_datetime(deposits.block_timestamp)
-  deposits['month'] = deposits.block_timestamp.dt.strftime('%Y-%m')
-  deposits = deposits.drop('block_timestamp', axis = 1)
-  date = list(deposits['month'].unique())
-
-  date_list = []
-  staker_count_list = []
-  stake_pool_name_list = []
-
-  staker_count = {
-      'date_stake' : date_list,
-      'staker_status' : staker_count_list,
-      'stake_pool_name' : stake_pool_name_list
-  }
-  staker_count_df = pd.DataFrame(staker_count)
-
-  for i in date:
-    actions = df["action"].isin(['deposit', 'deposit_stake', 'deposit_dao', 'deposit_dao_stake', 'deposit_dao_with_referrer'])
-    cols = ['stake_pool_name', 'address', 'tx_id', 'block_timestamp',
-            'succeeded', 'action', 'amount']
-    deposits = df.loc[actions, cols]
-
-    deposits['amount'] = deposits['amount'].astype('float')/10**9
-    deposits = deposits[(deposits.succeeded == True)]
-
-    deposits['block_timestamp'] = pd.to_datetime(deposits.block_timestamp)
-    deposits['month'] = deposits.block_timestamp.dt.strftime('%Y-%m')
-    deposits = deposits.drop('block_timestamp', axis = 1)
-    filtered_deposit = deposits.loc[deposits['month'] <= i]
-
-    deposits = filtered_deposit.groupby(['address', 'stake_pool_name']).sum().reset_index()
-
-    actions = df["action"].isin(['withdraw', 'withdraw_stake', 'withdraw_dao', 'withdraw_dao_stake', 'claim'])
-    cols = ['stake_pool_name', 'address', 'tx_id', 'block_timestamp',
-            'succeeded', 'action', 'amount']
-    withdrawals = df.loc[actions, cols]
-
-    withdrawals['amount'] = withdrawals['amount'].astype('float')/10**9
-    withdrawals = withdrawals[(withdrawals.succeeded == True)]
-    withdrawals['block_timestamp'] = pd.to_datetime(withdrawals.block_timestamp)
-    withdrawals['month'] = withdrawals.block_timestamp.dt.strftime('%Y-%m')
-
-    withdrawals = withdrawals.drop('block_timestamp', axis = 1)
-
-    filtered_withdrawals = withdrawals.loc[withdrawals['month'] <= i]
-    withdrawals = filtered_withdrawals.groupby(['address', 'stake_pool_name']).sum().reset_index()
-
-
-  # Net Deposits and Withdrawals
-    net = deposits.merge(withdrawals, how='left', left_on = ['address', 'stake_pool_name'], right_on = ['address', 'stake_pool_name']).drop(['succeeded_x', 'succeeded_y'], axis = 1)
-    net = net.fillna(0)
-    net = net.rename(columns={'amount_x': 'deposit', 'amount_y': 'withdraw'})
-    net['date_stake'] = i
-    net['net_deposit'] = net['deposit'] - net['withdraw']
-    net['stake_pool_name'] = net['stake_pool_name'].str.capitalize()  
-    net['staker_status'] = net['net_deposit'].apply(lambda x: 1 if x > 0 else 0)
-    net = net['stake_pool_name'].groupby([net.date_stake, net.address, net.deposit, net.withdraw, net.net_deposit, net.staker_status]).apply(list).reset_index()
-
-    net['stake_pool_name'] = [','.join(map(str, l)) for l in net['stake_pool_name']]
-
-    staker_count_df = staker_count_df.append(net)
-
-  staker_count_df = staker_count_df.groupby([staker_count_df.date_stake, staker_count_df.stake_pool_name]).sum().reset_index()
-  return staker_count_df
-
 def dd_stake_pool_name(df): # Dropdown
-  df.stake_pool_name = df.stake_pool_name.str.title()
   option = st.selectbox(
       'Select Staking Pool',
-      df['stake_pool_name'].unique())
+      df['stake_pool_name'].astype('string').str.title().unique())
   # st.write('You selected:', option)
   return option
 
 def dd_stake_multiselect(df):
   options = st.multiselect(
     'Select Staking Pool(s)',
-      df['stake_pool_name'].astype('string').str.capitalize().unique())
+      pool_names(df))
 
   # st.write('You selected:', options)
   return options
 
+OVERVIEW_METRICS = ['SOL Staked', 'Stake Transaction', 'Staker Count']
+
 def dd_overview(df): # Dropdown
   option = st.selectbox(
       'Choose a Metric',
-      ['SOL Staked', 'Stake Transaction', 'Staker Count'])
+      OVERVIEW_METRICS)
   # st.write('You selected:', option)
   return option
 
 def dd_date_range(df): # Dropdown
-  df.stake_pool_name = df.stake_pool_name.str.title()
   option = st.selectbox(
       'Select Date Range',
       [7,15,30,60,90,180])
   # st.write('You selected:', option)
   return option
 
+@figure_view
 def c_net_deposit(net):
   fig = px.bar(net, x='month', y='net_deposit', color = 'stake_pool_name', title = 'Net SOL Deposit', color_discrete_sequence=px.colors.qualitative.Prism
   , labels=dict(x='Month'))
   fig.update
   fig.update_xaxes(showgrid=False)
   fig.update_yaxes(showgrid=False)
-  st.plotly_chart(fig, use_container_width=True)
+  return fig
 
+@figure_view
 def c_net_deposit2(net):
   fig2 = px.bar(net, x='month', y='cumulative_net_deposit', color = 'stake_pool_name', title = 'Net SOL Deposit - Cumulative', color_discrete_sequence=px.colors.qualitative.Prism)
   fig2.update_xaxes(showgrid=False)
   fig2.update_yaxes(showgrid=False)
   fig2.update_xaxes(title_text='Month')
   fig2.update_yaxes(title_text='Net Stake (SOL)')
-  st.plotly_chart(fig2, use_container_width=True)
+  return fig2
 
-def i_total_staked(net, df, sc):
+@figure_view
+def i_total_staked(net, events, sc):
   total_staked = sum(net['net_deposit'])
 
   fig = go.Figure()
@@ -802,28 +1533,10 @@ def i_total_staked(net, df, sc):
       domain = {'row': 1, 'column': 0},
       title = {'text': "Current Unique Stakers"})
 
-  actions = df["action"].isin(['deposit', 'deposit_stake', 'deposit_dao', 'deposit_dao_stake', 'deposit_dao_with_referrer'])
-  cols = ['address', 'tx_id', 'block_timestamp',
-          'succeeded', 'action', 'amount']
-  deposits = df.loc[actions, cols]
-  deposits['amount'] = deposits['amount'].astype('float')/10**9
-  deposits = deposits[(deposits.succeeded == True)]
-  deposits['block_timestamp'] = pd.to_datetime(deposits.block_timestamp)
-  deposits['month'] = deposits.block_timestamp.dt.strftime('%Y-%m')
-  deposits = deposits.drop('block_timestamp', axis = 1)
-  deposits = deposits.groupby(['month']).nunique().reset_index()
-  deposits['stake_transactions'] = deposits['tx_id']
-  actions = df["action"].isin(['withdraw', 'withdraw_stake', 'withdraw_dao', 'withdraw_dao_stake', 'claim'])
-  cols = ['address', 'tx_id', 'block_timestamp',
-          'succeeded', 'action', 'amount']
-  withdrawals = df.loc[actions, cols]
-  withdrawals['amount'] = withdrawals['amount'].astype('float')/10**9
-  withdrawals = withdrawals[(withdrawals.succeeded == True)]
-  withdrawals['block_timestamp'] = pd.to_datetime(withdrawals.block_timestamp)
-  withdrawals['month'] = withdrawals.block_timestamp.dt.strftime('%Y-%m')
-  withdrawals = withdrawals.drop('block_timestamp', axis = 1)
-  withdrawals = withdrawals.groupby(['month']).nunique().reset_index()
-  withdrawals['unstake_transactions'] = withdrawals['tx_id']
+  deposits = events[events['kind'] == 'deposit']
+  deposits = deposits.groupby(['month']).agg(stake_transactions=('tx_id', 'nunique')).reset_index()
+  withdrawals = events[events['kind'] == 'withdraw']
+  withdrawals = withdrawals.groupby(['month']).agg(unstake_transactions=('tx_id', 'nunique')).reset_index()
   stake_tx = sum(deposits['stake_transactions'])
 
   fig5 = go.Indicator(
@@ -855,8 +1568,9 @@ def i_total_staked(net, df, sc):
   fig.update_layout(
     grid = {'rows': 4, 'columns': 1, 'pattern': "independent"}, height=1000)
       
-  st.plotly_chart(fig, use_container_width=True)
+  return fig
 
+@figure_view
 def i_net_month(net):
   recent_month = max(net['month'])
   recent_month_data_net_deposit = net[(net.month == recent_month)]
@@ -871,15 +1585,12 @@ def i_net_month(net):
       domain = {'x': [0, 1], 'y': [0, 1]},
       title = {'text': "Net Staked This Month"}))
   fig6.update_layout( height=280)
-  st.plotly_chart(fig6, use_container_width=True)
+  return fig6
 
-def i_active_wallet(df):
-  df['block_timestamp'] = pd.to_datetime(df.block_timestamp)
-  df['month'] = df.block_timestamp.dt.strftime('%Y-%m')
-  df = df.drop('block_timestamp', axis = 1)
-  df = df[(df.succeeded == True)] 
-  recent_month = max(df['month']) 
-  recent_month_active_wallets = df[(df.month == recent_month)]
+@figure_view
+def i_active_wallet(events):
+  recent_month = events['month_key'].max()
+  recent_month_active_wallets = events[(events.month_key == recent_month)]
   recent_month_active_wallets_value = recent_month_active_wallets['address'].nunique()
 
   fig6 = go.Figure(go.Indicator(
@@ -892,40 +1603,12 @@ def i_active_wallet(df):
       title = {'text': "Active Wallets This Month"}))
 
   fig6.update_layout(height=280)
-  st.plotly_chart(fig6, use_container_width=True)
-
-def i_new_staker(df):
-  #transforms on the df
-  df['amount'] = df['amount'].astype('float')/10**9
-  df = df[(df.succeeded == True)]
-  df['block_timestamp'] = pd.to_datetime(df.block_timestamp)
-  df['month'] = df.block_timestamp.dt.strftime('%Y-%m')
-  recent_month = max(df['month'])
-
-  deposit_actions = ['deposit_stake', 'deposit', 'deposit_dao', 'deposit_dao_stake', 'deposit_dao_with_referrer']
-  df.loc[df.action.isin(deposit_actions), 'action'] = 'deposit'
-
-  withdraw_actions = ['order_unstake', 'claim', 'withdraw_stake', 'withdraw', 'withdraw_dao', 'withdraw_dao_stake']
-  df.loc[df.action.isin(withdraw_actions), 'action'] = 'withdraw'
-
-  # dt.strptime('Jun 1 2005', '%Y-%m-%d').datetime()
-  month_year_filter = datetime.now().strftime('%Y-%m')
-  # mask = df['block_timestamp'] <= datetime.strptime(month_year_filter, '%Y-%m-%d')
-  # df_filtered = df.loc[mask]
-  # df_filtered = df[(df.month == recent_month)]
-  df_filtered = df[(df.month <= month_year_filter)]
-
-  deposits_df = df_filtered[df_filtered["action"] == 'deposit']
+  return fig6
 
-  #group by withdraws by stake pool and address
-  # earliest_stake_df = deposits_df.groupby(['address', 'stake_pool_name']).agg(min_date=('month', np.min)).reset_index()
-  earliest_stake_df = deposits_df.groupby(['address']).agg(min_date=('month', np.min)).reset_index()
-
-  # earliest_stake_df['min_month'] = earliest_stake_df.min_date.dt.strftime('%Y-%m')
-
-  new_stakers = earliest_stake_df[(earliest_stake_df.min_date == month_year_filter)]
-
-  number_stakers = new_stakers.address.nunique()
+@figure_view(dated = True)
+def i_new_staker(cohorts):
+  month_key = month_key_of(datetime.now().strftime('%Y-%m'))
+  number_stakers = cohorts.new_stakers(month_key)
   fig3 = go.Figure(go.Indicator(
       mode = 'number',
       gauge = {'shape': "bullet"},
@@ -935,97 +1618,69 @@ def i_new_staker(df):
       domain = {'x': [0, 1], 'y': [0, 1]},
       title = {'text': "New Stakers This Month"}))
   fig3.update_layout( height=280)
-  st.plotly_chart(fig3, use_container_width=True)
+  return fig3
 
-def c_market_share2(net):
-  net2 = net.groupby(by = 'month').sum()
-
-  monthly_net = net.merge(net2, how='outer', left_on = ['month'], right_on = ['month'])
-  monthly_net['market_share'] =  monthly_net['cumulative_net_deposit_x'] / monthly_net['cumulative_net_deposit_y'] * 100
-  monthly_net = monthly_net[['month', 'stake_pool_name', 'market_share']]
-  recent_month = max(monthly_net['month'])
-  recent_month_data = monthly_net[(monthly_net.month == recent_month)]
-  recent_month_data = recent_month_data[(recent_month_data.market_share == max(recent_month_data.market_share))].reset_index()
-  recent_month_data = recent_month_data[['month', 'stake_pool_name', 'market_share']]
-  recent_month_data['market_share'] = recent_month_data['market_share'].astype('float')
-  recent_month_data['stake_pool_name'] = recent_month_data['stake_pool_name'].astype('string').str.capitalize()
+@figure_view
+def c_market_share2(shares):
+  pool, market_share = shares.top('sol')
 
   fig5 = go.Figure(go.Indicator(
       mode = 'number',
       gauge = {'shape': "bullet"},
       #delta = {'reference': 0},
-      value = recent_month_data['market_share'].iloc[0],
+      value = market_share.iloc[-1],
     # color='#1f77b4',
       domain = {'x': [0, 1], 'y': [0, 1]},
       number = {"suffix": "%"},
-      title = {'text': 'Top Market Share : ' + recent_month_data['stake_pool_name'].iloc[0]}))
+      title = {'text': 'Top Market Share : ' + pool}))
   
 
-  df = monthly_net[monthly_net.stake_pool_name == recent_month_data['stake_pool_name'].iloc[0]].reset_index()
   fig5.add_trace(go.Scatter(
-      x = df['month'], y = df['market_share'], name=recent_month_data['stake_pool_name'].iloc[0]))
+      x = market_share.index, y = market_share.values, name=pool))
   fig5.data[1].line.color = '#5F4690'
   fig5.update_xaxes(title_text='Month')
   fig5.update_yaxes(title_text='Market Share in %')
   fig5.update_layout(title="Top Market Share Stake Pool (in %)")
   fig5.update_xaxes(showgrid=False)
   fig5.update_yaxes(showgrid=False)
-  st.plotly_chart(fig5, use_container_width=True)
-
-def c_market_share(net):
-  net2 = net.groupby(by = 'month').sum()
+  return fig5
 
-  monthly_net = net.merge(net2, how='outer', left_on = ['month'], right_on = ['month'])
-  monthly_net['market_share'] =  monthly_net['cumulative_net_deposit_x'] / monthly_net['cumulative_net_deposit_y'] * 100
-  monthly_net = monthly_net[['month', 'stake_pool_name', 'market_share']]
+@figure_view
+def c_market_share(shares):
+  monthly_net = shares.frame('sol')
   fig4 = px.area(monthly_net, x='month', y='market_share', color = 'stake_pool_name', title = 'Stake Pool Market Share by SOL Staked', color_discrete_sequence=px.colors.qualitative.Prism)
   fig4.update_xaxes(title_text='Month')
   fig4.update_yaxes(title_text='Market Share in %')
   fig4.update_xaxes(showgrid=False)
   fig4.update_yaxes(showgrid=False)
-  st.plotly_chart(fig4, use_container_width=True)
+  return fig4
 
 def update_button_callback():
   duration = 0
   # st.write('Latest data is', max(df.block_timestamp)) 
-  latest = datetime.strptime(max(df.block_timestamp)[:-4], '%Y-%m-%d %H:%M:%S')
+  latest = load_events(snapshot).block_timestamp.max()
   duration = np.round((datetime.now() - latest).total_seconds() /3600, 2)
   st.write('Last Update was', duration, 'hours ago')
 
   if duration > st.secrets['update_delay']:
     st.write('Latest data was more than', st.secrets['update_delay'], 'hours ago!')
-    st.text('Fetching new data. This may take a while ...')
-    update_data()
-    st.text('All Data is up to date!')
+    started = refresh_service().start(snapshot)
+    if started == 'started':
+      st.text('Fetching new data in the background. The dashboard keeps showing the current data until it is done.')
+    elif started == 'running':
+      st.text('A refresh is already running, following that one.')
+    else:
+      st.text('New data was just published, rerun to load it.')
   else: # data was recently updated
     st.text('Data is up to date! There is no need to fetch.')
 
-def c_deposits_and_withdrawals_cumu(df):
-  actions = df["action"].isin(['deposit', 'deposit_stake', 'deposit_dao', 'deposit_dao_stake', 'deposit_dao_with_referrer'])
-  cols = ['address', 'tx_id', 'block_timestamp',
-          'succeeded', 'action', 'amount']
-  deposits = df.loc[actions, cols]
-
-  deposits['amount'] = deposits['amount'].astype('float')/10**9
-  deposits = deposits[(deposits.succeeded == True)]
-  deposits['block_timestamp'] = pd.to_datetime(deposits.block_timestamp)
-  deposits['month'] = deposits.block_timestamp.dt.strftime('%Y-%m')
-  deposits = deposits.drop('block_timestamp', axis = 1)
-  deposits = deposits.groupby(['month']).nunique().reset_index()
-  deposits['stake_transactions'] = deposits['tx_id']
-
-  actions = df["action"].isin(['withdraw', 'withdraw_stake', 'withdraw_dao', 'withdraw_dao_stake', 'claim'])
-  cols = ['stake_pool_name', 'tx_id', 'block_timestamp',
-          'succeeded', 'action', 'amount']
-  withdrawals = df.loc[actions, cols]
-
-  withdrawals['amount'] = withdrawals['amount'].astype('float')/10**9
-  withdrawals = withdrawals[(withdrawals.succeeded == True)]
-  withdrawals['block_timestamp'] = pd.to_datetime(withdrawals.block_timestamp)
-  withdrawals['month'] = withdrawals.block_timestamp.dt.strftime('%Y-%m')
-  withdrawals = withdrawals.drop('block_timestamp', axis = 1)
-  withdrawals = withdrawals.groupby(['month']).nunique().reset_index()
-  withdrawals['unstake_transactions'] = withdrawals['tx_id']
+@figure_view
+def c_deposits_and_withdrawals_cumu(events):
+  deposits = events[events['kind'] == 'deposit']
+  deposits = deposits.groupby(['month']).agg(stake_transactions=('tx_id', 'nunique')).reset_index()
+
+  withdrawals = events[events['kind'] == 'withdraw']
+  withdrawals = withdrawals.groupby(['month']).agg(unstake_transactions=('tx_id', 'nunique')).reset_index()
   #fig = px.bar(withdrawals, x='month', y='unstake_transactions', title = 'Unstake Transactions')
   #fig.show()
 
@@ -1043,34 +1698,15 @@ def c_deposits_and_withdrawals_cumu(df):
   fig2.update_yaxes(showgrid=False)
   fig2.data[0].marker.color = '#5F4690'
   fig2.data[1].marker.color = '#1D6996'
-  st.plotly_chart(fig2, use_container_width=True)
-
-def c_deposits_and_withdrawals(df):
-  actions = df["action"].isin(['deposit', 'deposit_stake', 'deposit_dao', 'deposit_dao_stake', 'deposit_dao_with_referrer'])
-  cols = ['address', 'tx_id', 'block_timestamp',
-          'succeeded', 'action', 'amount']
-  deposits = df.loc[actions, cols]
-
-  deposits['amount'] = deposits['amount'].astype('float')/10**9
-  deposits = deposits[(deposits.succeeded == True)]
-  deposits['block_timestamp'] = pd.to_datetime(deposits.block_timestamp)
-  deposits['month'] = deposits.block_timestamp.dt.strftime('%Y-%m')
-  deposits = deposits.drop('block_timestamp', axis = 1)
-  deposits = deposits.groupby(['month']).nunique().reset_index()
-  deposits['stake_transactions'] = deposits['tx_id']
-
-  actions = df["action"].isin(['withdraw', 'withdraw_stake', 'withdraw_dao', 'withdraw_dao_stake', 'claim'])
-  cols = ['stake_pool_name', 'tx_id', 'block_timestamp',
-          'succeeded', 'action', 'amount']
-  withdrawals = df.loc[actions, cols]
-
-  withdrawals['amount'] = withdrawals['amount'].astype('float')/10**9
-  withdrawals = withdrawals[(withdrawals.succeeded == True)]
-  withdrawals['block_timestamp'] = pd.to_datetime(withdrawals.block_timestamp)
-  withdrawals['month'] = withdrawals.block_timestamp.dt.strftime('%Y-%m')
-  withdrawals = withdrawals.drop('block_timestamp', axis = 1)
-  withdrawals = withdrawals.groupby(['month']).nunique().reset_index()
-  withdrawals['unstake_transactions'] = withdrawals['tx_id']
+  return fig2
+
+@figure_view
+def c_deposits_and_withdrawals(events):
+  deposits = events[events['kind'] == 'deposit']
+  deposits = deposits.groupby(['month']).agg(stake_transactions=('tx_id', 'nunique')).reset_index()
+
+  withdrawals = events[events['kind'] == 'withdraw']
+  withdrawals = withdrawals.groupby(['month']).agg(unstake_transactions=('tx_id', 'nunique')).reset_index()
   #fig = px.bar(withdrawals, x='month', y='unstake_transactions', title = 'Unstake Transactions')
   #fig.show()
 
@@ -1085,85 +1721,44 @@ def c_deposits_and_withdrawals(df):
   fig.update_yaxes(showgrid=False)
   fig.data[0].marker.color = '#5F4690'
   fig.data[1].marker.color = '#1D6996'
-  st.plotly_chart(fig, use_container_width=True)
-
-def c_stake_transaction_market_share(df):
-  actions = df["action"].isin(['deposit', 'deposit_stake', 'deposit_dao', 'deposit_dao_stake', 'deposit_dao_with_referrer'])
-  cols = ['stake_pool_name', 'tx_id', 'block_timestamp',
-          'succeeded', 'action', 'amount']
-  deposits = df.loc[actions, cols]
-
-  deposits['amount'] = deposits['amount'].astype('float')/10**9
-  deposits = deposits[(deposits.succeeded == True)]
-
-  deposits['block_timestamp'] = pd.to_datetime(deposits.block_timestamp)
-  deposits['month'] = deposits.block_timestamp.dt.strftime('%Y-%m')
-  deposits = deposits.drop('block_timestamp', axis = 1)
-  deposits = deposits.groupby(['month', 'stake_pool_name']).nunique().reset_index()
-  deposits['stake_pool_name'] = deposits['stake_pool_name'].str.capitalize()
-  deposits['cumulative_deposit_tx'] = deposits.groupby(['stake_pool_name'])['tx_id'].apply(lambda x: x.cumsum())
-
-  deposits2 = deposits.groupby(by = 'month').sum()
-  monthly_deposits = deposits.merge(deposits2, how='outer', left_on = ['month'], right_on = ['month'])
-  monthly_deposits['market_share'] =  monthly_deposits['cumulative_deposit_tx_x'] / monthly_deposits['cumulative_deposit_tx_y'] * 100
-  monthly_deposits = monthly_deposits[['month', 'stake_pool_name', 'market_share']]
+  return fig
+
+@figure_view
+def c_stake_transaction_market_share(shares):
+  monthly_deposits = shares.frame('transactions')
   fig2 = px.area(monthly_deposits, x='month', y='market_share', color = 'stake_pool_name', title = 'Stake Pool Market Share by Cumulative Stake Transactions'
   , color_discrete_sequence=px.colors.qualitative.Prism)
   fig2.update_xaxes(showgrid=False)
   fig2.update_yaxes(showgrid=False)
   fig2.update_xaxes(title_text='Month')
   fig2.update_yaxes(title_text='Market Share in %')
-  st.plotly_chart(fig2, use_container_width=True)
-
-def c_top_share_stake_tx(df):
-  actions = df["action"].isin(['deposit', 'deposit_stake', 'deposit_dao', 'deposit_dao_stake', 'deposit_dao_with_referrer'])
-  cols = ['stake_pool_name', 'tx_id', 'block_timestamp',
-          'succeeded', 'action', 'amount']
-  deposits = df.loc[actions, cols]
-
-  deposits['amount'] = deposits['amount'].astype('float')/10**9
-  deposits = deposits[(deposits.succeeded == True)]
-
-  deposits['block_timestamp'] = pd.to_datetime(deposits.block_timestamp)
-  deposits['month'] = deposits.block_timestamp.dt.strftime('%Y-%m')
-  deposits = deposits.drop('block_timestamp', axis = 1)
-  deposits = deposits.groupby(['month', 'stake_pool_name']).nunique().reset_index()
-  deposits['stake_pool_name'] = deposits['stake_pool_name'].str.capitalize()
-  deposits['cumulative_deposit_tx'] = deposits.groupby(['stake_pool_name'])['tx_id'].apply(lambda x: x.cumsum())
-
-  deposits2 = deposits.groupby(by = 'month').sum()
-  monthly_deposits = deposits.merge(deposits2, how='outer', left_on = ['month'], right_on = ['month'])
-  monthly_deposits['market_share'] =  monthly_deposits['cumulative_deposit_tx_x'] / monthly_deposits['cumulative_deposit_tx_y'] * 100
-  monthly_deposits = monthly_deposits[['month', 'stake_pool_name', 'market_share']]
-  recent_month = max(monthly_deposits['month'])
-  recent_month_data = monthly_deposits[(monthly_deposits.month == recent_month)]
-  recent_month_data = recent_month_data[(recent_month_data.market_share == max(recent_month_data.market_share))].reset_index()
-  recent_month_data = recent_month_data[['month', 'stake_pool_name', 'market_share']]
-  recent_month_data['market_share'] = recent_month_data['market_share'].astype('float')
-  recent_month_data['stake_pool_name'] = recent_month_data['stake_pool_name'].astype('string').str.capitalize()
+  return fig2
 
+@figure_view
+def c_top_share_stake_tx(shares):
+  pool, market_share = shares.top('transactions')
 
   fig5 = go.Figure(go.Indicator(
       mode = 'number',
       gauge = {'shape': "bullet"},
       #delta = {'reference': 0},
-      value = recent_month_data['market_share'].iloc[0],
+      value = market_share.iloc[-1],
     # color='#1f77b4',
       number = {"suffix": "%"},
       domain = {'x': [0, 1], 'y': [0, 1]},
-      title = {'text': 'Top Market Share : ' + recent_month_data['stake_pool_name'].iloc[0]}))
+      title = {'text': 'Top Market Share : ' + pool}))
 
-  df = monthly_deposits[monthly_deposits.stake_pool_name == recent_month_data['stake_pool_name'].iloc[0]].reset_index()
   fig5.add_trace(go.Scatter(
-      x = df['month'], y = df['market_share'], name=recent_month_data['stake_pool_name'].iloc[0]))
+      x = market_share.index, y = market_share.values, name=pool))
   fig5.update_xaxes(title_text='Month')
   fig5.update_yaxes(title_text='Market Share in %')
   fig5.update_layout(title="Top Market Share Stake Pool (in %)")
   fig5.data[1].line.color = '#5F4690'
   fig5.update_xaxes(showgrid=False)
   fig5.update_yaxes(showgrid=False)
-  st.plotly_chart(fig5, use_container_width=True)
+  return fig5
 
+@figure_view
 def c_net_stake_total(net):
   net2 = net.groupby(by = ['month']).sum().reset_index()
   net2['Inflow&Outflow'] = net2['net_deposit'].apply(lambda x: 'Positive Net Stake' if x > 0 else 'Negative Net Stake')
@@ -1174,8 +1769,9 @@ def c_net_stake_total(net):
   fig.update_yaxes(title_text='Net Stake (SOL)')
   fig.update_layout(showlegend=False)
 
-  st.plotly_chart(fig, use_container_width=True)
+  return fig
 
+@figure_view
 def c_net_stake_total_cumsum(net):
   net2 = net.groupby(by = ['month']).sum().reset_index()
   net2['cumulative_net_deposit'] = net2['net_deposit'].cumsum()
@@ -1185,10 +1781,9 @@ def c_net_stake_total_cumsum(net):
   fig.update_yaxes(showgrid=False)
   fig.update_xaxes(title_text='Month')
   fig.update_yaxes(title_text='Net Stake (SOL) - Cumulative')
-  st.plotly_chart(fig, use_container_width=True)
-
-  net2['cumulative_net_deposit'] = net2['net_deposit'].cumsum()
+  return fig
 
+@figure_view
 def c_staker_count(sc):
 
   fig = px.bar(sc, x='month', y='staker_count', title = 'Staker Count', color_discrete_sequence=px.colors.qualitative.Prism)
@@ -1196,271 +1791,141 @@ def c_staker_count(sc):
   fig.update_yaxes(showgrid=False)
   fig.update_xaxes(title_text='Month')
   fig.update_yaxes(title_text='Staker Count')
-  st.plotly_chart(fig, use_container_width=True)
-
-def c_new_stakers(df):
-
-  deposit_actions = ['deposit_stake', 'deposit', 'deposit_dao', 'deposit_dao_stake', 'deposit_dao_with_referrer']
-  df.loc[df.action.isin(deposit_actions), 'action'] = 'deposit'
-  deposits_df = df[df["action"] == 'deposit']
+  return fig
 
-  df = deposits_df[(deposits_df.succeeded == True)]
-  df = df.assign(occurence=np.where(~df['address'].duplicated(),'New','Existing'))
-  df['New_Wallets'] = 1
-  df['block_timestamp'] = pd.to_datetime(df.block_timestamp)
-  df['month'] = df.block_timestamp.dt.strftime('%Y-%m')
-  df = df.drop('block_timestamp', axis = 1)
-  df = df[df.occurence == 'New']
-  df = df.groupby('month').sum().reset_index()
+@figure_view
+def c_new_stakers(cohorts):
+  # a wallet is new in the month of its first deposit
+  df = cohorts.new_stakers_by_month()
 
   fig = px.bar(df, x='month', y='New_Wallets', title = 'New Stakers', color_discrete_sequence=px.colors.qualitative.Prism)
   fig.update_xaxes(showgrid=False)
   fig.update_yaxes(showgrid=False)
   fig.update_xaxes(title_text='Month')
   fig.update_yaxes(title_text='Wallet Count')
-  st.plotly_chart(fig, use_container_width=True)
+  return fig
 
-def c_staker_market_share(sc):
-  net2 = sc.groupby(by = 'date_stake').sum().reset_index()
-
-  monthly_net = sc.merge(net2, how='outer', left_on = ['date_stake'], right_on = ['date_stake'])
-  monthly_net['market_share'] =  monthly_net['staker_status_x'] / monthly_net['staker_status_y'] * 100
-  monthly_net = monthly_net[['date_stake', 'stake_pool_name', 'market_share']]
-  fig4 = px.area(monthly_net, x='date_stake', y='market_share', color = 'stake_pool_name', title = 'Stake Pool Market Share by Staker', color_discrete_sequence=px.colors.qualitative.Prism)
+@figure_view
+def c_staker_market_share(shares):
+  monthly_net = shares.frame('stakers')
+  fig4 = px.area(monthly_net, x='month', y='market_share', color = 'stake_pool_name', title = 'Stake Pool Market Share by Staker', color_discrete_sequence=px.colors.qualitative.Prism)
   fig4.update_xaxes(showgrid=False)
   fig4.update_yaxes(showgrid=False)
   fig4.update_xaxes(title_text='Month')
   fig4.update_yaxes(title_text='Market Share in %')
-  st.plotly_chart(fig4, use_container_width=True)
-
-def c_top_staker_market_share(sc):
-  net2 = sc.groupby(by = 'date_stake').sum().reset_index()
-  monthly_net = sc.merge(net2, how='outer', left_on = ['date_stake'], right_on = ['date_stake'])
-  monthly_net['market_share'] =  monthly_net['staker_status_x'] / monthly_net['staker_status_y'] * 100
-  monthly_net = monthly_net[['date_stake', 'stake_pool_name', 'market_share']]
-  recent_month = max(monthly_net['date_stake'])
-  recent_month_data = monthly_net[(monthly_net.date_stake == recent_month)]
-  recent_month_data = recent_month_data[(recent_month_data.market_share == max(recent_month_data.market_share))].reset_index()
-  recent_month_data = recent_month_data[['date_stake', 'stake_pool_name', 'market_share']]
-  recent_month_data['market_share'] = recent_month_data['market_share'].astype('float')
-  recent_month_data['market_share'] = recent_month_data['market_share'].astype('float')
-  recent_month_data['stake_pool_name'] = recent_month_data['stake_pool_name'].astype('string').str.capitalize()
+  return fig4
+
+@figure_view
+def c_top_staker_market_share(shares):
+  pool, market_share = shares.top('stakers')
+
   fig5 = go.Figure(go.Indicator(
       mode = 'number',
       gauge = {'shape': "bullet"},
       #delta = {'reference': 0},
-      value = recent_month_data['market_share'].iloc[0],
+      value = market_share.iloc[-1],
     # color='#1f77b4',
       number = {"suffix": "%"},
       domain = {'x': [0, 1], 'y': [0, 1]},
-      title = {'text': 'Top Market Share : ' + recent_month_data['stake_pool_name'].iloc[0]}))
+      title = {'text': 'Top Market Share : ' + pool}))
 
-  df = monthly_net[monthly_net.stake_pool_name == recent_month_data['stake_pool_name'].iloc[0]].reset_index()
   fig5.add_trace(go.Scatter(
-      x = df['date_stake'], y = df['market_share']))
+      x = market_share.index, y = market_share.values))
   fig5.update_xaxes(title_text='Month')
   fig5.update_yaxes(title_text='Market Share in %')
   fig5.update_layout(title="Top Market Share Stake Pool (in %)")
   fig5.update_xaxes(showgrid=False)
   fig5.update_yaxes(showgrid=False)
   fig5.data[1].line.color = '#5F4690'
-  st.plotly_chart(fig5, use_container_width=True)
+  return fig5
 
 #PAGE2
-def c_staker(scp, result):
-  scp = scp.loc[scp['stake_pool_name'].str.contains(result, case=False)]
-  fig = px.bar(scp, x='date_stake', y='staker_status', color = 'stake_pool_name', title = 'Staker Count by Stake Pool', color_discrete_sequence=px.colors.qualitative.Prism)
+@figure_view
+def c_staker(shares, result):
+  scp = shares.frame('stakers', result)
+  fig = px.bar(scp, x='month', y='value', color = 'stake_pool_name', title = 'Staker Count by Stake Pool', color_discrete_sequence=px.colors.qualitative.Prism)
   fig.update_xaxes(showgrid=False)
   fig.update_yaxes(showgrid=False)
   fig.update_xaxes(title_text='Month')
   fig.update_yaxes(title_text='Staker Count')
-  st.plotly_chart(fig, use_container_width=True)
-
-def c_stake_transaction(df, result):
-
-  df = df.loc[df['stake_pool_name'].str.contains(result, case=False)]
-  actions = df["action"].isin(['deposit', 'deposit_stake', 'deposit_dao', 'deposit_dao_stake', 'deposit_dao_with_referrer'])
-  cols = ['stake_pool_name', 'tx_id', 'block_timestamp',
-          'succeeded', 'action', 'amount']
-  deposits = df.loc[actions, cols]
+  return fig
 
-  deposits['amount'] = deposits['amount'].astype('float')/10**9
-  deposits = deposits[(deposits.succeeded == True)]
+@figure_view
+def c_stake_transaction(shares, result):
+  deposits = shares.frame('transactions', result)
 
-  deposits['block_timestamp'] = pd.to_datetime(deposits.block_timestamp)
-  deposits['month'] = deposits.block_timestamp.dt.strftime('%Y-%m')
-  deposits = deposits.drop('block_timestamp', axis = 1)
-  deposits = deposits.groupby(['month', 'stake_pool_name']).nunique().reset_index()
-  deposits['stake_pool_name'] = deposits['stake_pool_name'].str.capitalize()
-  deposits['cumulative_deposit_tx'] = deposits.groupby(['stake_pool_name'])['tx_id'].apply(lambda x: x.cumsum())
-
-  deposits['stake_transactions'] = deposits['tx_id']
-  fig3 = px.bar(deposits, x='month', y='stake_transactions', color = 'stake_pool_name', title = 'Stake Transactions by Stake Pool', color_discrete_sequence=px.colors.qualitative.Prism)
+  fig3 = px.bar(deposits, x='month', y='value', color = 'stake_pool_name', title = 'Stake Transactions by Stake Pool', color_discrete_sequence=px.colors.qualitative.Prism)
   fig3.update_xaxes(showgrid=False)
   fig3.update_yaxes(showgrid=False)
   fig3.update_xaxes(title_text='Month')
   fig3.update_yaxes(title_text='Transaction Count')
-  st.plotly_chart(fig3, use_container_width=True)
-
-def c_net_stake(df, result):
-  df = df.loc[df['stake_pool_name'].str.contains(result, case=False)]
-  actions = df["action"].isin(['deposit', 'deposit_stake', 'deposit_dao', 'deposit_dao_stake', 'deposit_dao_with_referrer'])
-  cols = ['stake_pool_name', 'tx_id', 'block_timestamp',
-          'succeeded', 'action', 'amount']
-  deposits = df.loc[actions, cols]
-
-  deposits['amount'] = deposits['amount'].astype('float')
-  deposits = deposits[(deposits.succeeded == True)]
-
-  deposits['block_timestamp'] = pd.to_datetime(deposits.block_timestamp)
-  deposits['month'] = deposits.block_timestamp.dt.strftime('%Y-%m')
-  deposits = deposits.drop('block_timestamp', axis = 1)
-  deposits = deposits.groupby(['month', 'stake_pool_name']).sum().reset_index()
-
-  recent_month = max(deposits['month'])
-  before_deposits = deposits[(deposits.month < recent_month)]
-
-  actions = df["action"].isin(['withdraw', 'withdraw_stake', 'withdraw_dao', 'withdraw_dao_stake', 'claim'])
-  cols = ['stake_pool_name', 'tx_id', 'block_timestamp',
-          'succeeded', 'action', 'amount']
-  withdrawals = df.loc[actions, cols]
-
-  withdrawals['amount'] = withdrawals['amount'].astype('float')
-  withdrawals = withdrawals[(withdrawals.succeeded == True)]
-  withdrawals['block_timestamp'] = pd.to_datetime(withdrawals.block_timestamp)
-  withdrawals['month'] = withdrawals.block_timestamp.dt.strftime('%Y-%m')
-  withdrawals = withdrawals.drop('block_timestamp', axis = 1)
-  withdrawals = withdrawals.groupby(['month', 'stake_pool_name']).sum().reset_index()
-  net = deposits.merge(withdrawals, how='outer', left_on = ['month', 'stake_pool_name'], right_on = ['month', 'stake_pool_name'])
-  net = net.fillna(0)
-  net = net.rename(columns={'amount_x': 'deposit', 'amount_y': 'withdraw'})
-
-  net['net_deposit'] = net['deposit'] - net['withdraw']
-  net['stake_pool_name'] = net['stake_pool_name'].str.capitalize()
-  #net['cumulative_net_deposit'] = net['deposit'].cumsum()
-  net['cumulative_net_deposit'] = net.groupby(['stake_pool_name'])['net_deposit'].apply(lambda x: x.cumsum())
-  net.sort_values(by = 'month', ascending = True)
-  fig = px.bar(net, x='month', y='net_deposit', color = 'stake_pool_name', title = 'SOL Staked by Stake Pool', color_discrete_sequence=px.colors.qualitative.Prism)
+  return fig3
+
+@figure_view
+def c_net_stake(shares, result):
+  net = shares.frame('sol', result)
+  fig = px.bar(net, x='month', y='value', color = 'stake_pool_name', title = 'SOL Staked by Stake Pool', color_discrete_sequence=px.colors.qualitative.Prism)
   fig.update_xaxes(showgrid=False)
   fig.update_yaxes(showgrid=False)
   fig.update_xaxes(title_text='Month')
   fig.update_yaxes(title_text='Net Stake (SOL)')
-  st.plotly_chart(fig, use_container_width=True)
-
-def c_net_stake_cumsum(df, result):
-  df = df.loc[df['stake_pool_name'].str.contains(result, case=False)]
-  actions = df["action"].isin(['deposit', 'deposit_stake', 'deposit_dao', 'deposit_dao_stake', 'deposit_dao_with_referrer'])
-  cols = ['stake_pool_name', 'tx_id', 'block_timestamp',
-          'succeeded', 'action', 'amount']
-  deposits = df.loc[actions, cols]
-
-  deposits['amount'] = deposits['amount'].astype('float')
-  deposits = deposits[(deposits.succeeded == True)]
-
-  deposits['block_timestamp'] = pd.to_datetime(deposits.block_timestamp)
-  deposits['month'] = deposits.block_timestamp.dt.strftime('%Y-%m')
-  deposits = deposits.drop('block_timestamp', axis = 1)
-  deposits = deposits.groupby(['month', 'stake_pool_name']).sum().reset_index()
-
-  recent_month = max(deposits['month'])
-  before_deposits = deposits[(deposits.month < recent_month)]
-
-  actions = df["action"].isin(['withdraw', 'withdraw_stake', 'withdraw_dao', 'withdraw_dao_stake', 'claim'])
-  cols = ['stake_pool_name', 'tx_id', 'block_timestamp',
-          'succeeded', 'action', 'amount']
-  withdrawals = df.loc[actions, cols]
-
-  withdrawals['amount'] = withdrawals['amount'].astype('float')
-  withdrawals = withdrawals[(withdrawals.succeeded == True)]
-  withdrawals['block_timestamp'] = pd.to_datetime(withdrawals.block_timestamp)
-  withdrawals['month'] = withdrawals.block_timestamp.dt.strftime('%Y-%m')
-  withdrawals = withdrawals.drop('block_timestamp', axis = 1)
-  withdrawals = withdrawals.groupby(['month', 'stake_pool_name']).sum().reset_index()
-  net = deposits.merge(withdrawals, how='outer', left_on = ['month', 'stake_pool_name'], right_on = ['month', 'stake_pool_name'])
-  net = net.fillna(0)
-  net = net.rename(columns={'amount_x': 'deposit', 'amount_y': 'withdraw'})
-
-  net['net_deposit'] = net['deposit'] - net['withdraw']
-  net['stake_pool_name'] = net['stake_pool_name'].str.capitalize()
-  #net['cumulative_net_deposit'] = net['deposit'].cumsum()
-  net['cumulative_net_deposit'] = net.groupby(['stake_pool_name'])['net_deposit'].apply(lambda x: x.cumsum())
-  net.sort_values(by = 'month', ascending = True)
-  fig = px.bar(net, x='month', y='cumulative_net_deposit', color = 'stake_pool_name', title = 'SOL Staked by Stake Pool', color_discrete_sequence=px.colors.qualitative.Prism)
+  return fig
+
+@figure_view
+def c_net_stake_cumsum(shares, result):
+  net = shares.frame('sol', result)
+  fig = px.bar(net, x='month', y='cumulative', color = 'stake_pool_name', title = 'SOL Staked by Stake Pool', color_discrete_sequence=px.colors.qualitative.Prism)
   fig.update_xaxes(showgrid=False)
   fig.update_yaxes(showgrid=False)
   fig.update_xaxes(title_text='Month')
   fig.update_yaxes(title_text='Net Stake (SOL)')
-  st.plotly_chart(fig, use_container_width=True)
+  return fig
 
-def c_market_share_comparison(net, result):
-  net = net.loc[net['stake_pool_name'].str.contains(result, case=False)]
-  net2 = net.groupby(by = 'month').sum()
-
-  monthly_net = net.merge(net2, how='outer', left_on = ['month'], right_on = ['month'])
-  monthly_net['market_share'] =  monthly_net['cumulative_net_deposit_x'] / monthly_net['cumulative_net_deposit_y'] * 100
-  monthly_net = monthly_net[['month', 'stake_pool_name', 'market_share']]
+@figure_view
+def c_market_share_comparison(shares, result):
+  monthly_net = shares.frame('sol', result)
   fig4 = px.area(monthly_net, x='month', y='market_share', color = 'stake_pool_name', title = 'Stake Pool Market Share by SOL Staked', color_discrete_sequence=px.colors.qualitative.Prism)
   fig4.update_xaxes(showgrid=False)
   fig4.update_yaxes(showgrid=False)
   fig4.update_xaxes(title_text='Month')
   fig4.update_yaxes(title_text='Market Share in %')
-  st.plotly_chart(fig4, use_container_width=True)
-
-def c_stake_transaction_market_share_comparison(df, result):
-  df = df.loc[df['stake_pool_name'].str.contains(result, case=False)]
-  actions = df["action"].isin(['deposit', 'deposit_stake', 'deposit_dao', 'deposit_dao_stake', 'deposit_dao_with_referrer'])
-  cols = ['stake_pool_name', 'tx_id', 'block_timestamp',
-          'succeeded', 'action', 'amount']
-  deposits = df.loc[actions, cols]
-
-  deposits['amount'] = deposits['amount'].astype('float')/10**9
-  deposits = deposits[(deposits.succeeded == True)]
-
-  deposits['block_timestamp'] = pd.to_datetime(deposits.block_timestamp)
-  deposits['month'] = deposits.block_timestamp.dt.strftime('%Y-%m')
-  deposits = deposits.drop('block_timestamp', axis = 1)
-  deposits = deposits.groupby(['month', 'stake_pool_name']).nunique().reset_index()
-  deposits['stake_pool_name'] = deposits['stake_pool_name'].str.capitalize()
-  deposits['cumulative_deposit_tx'] = deposits.groupby(['stake_pool_name'])['tx_id'].apply(lambda x: x.cumsum())
-
-  deposits2 = deposits.groupby(by = 'month').sum()
-  monthly_deposits = deposits.merge(deposits2, how='outer', left_on = ['month'], right_on = ['month'])
-  monthly_deposits['market_share'] =  monthly_deposits['cumulative_deposit_tx_x'] / monthly_deposits['cumulative_deposit_tx_y'] * 100
-  monthly_deposits = monthly_deposits[['month', 'stake_pool_name', 'market_share']]
+  return fig4
+
+@figure_view
+def c_stake_transaction_market_share_comparison(shares, result):
+  monthly_deposits = shares.frame('transactions', result)
   fig2 = px.area(monthly_deposits, x='month', y='market_share', color = 'stake_pool_name', title = 'Stake Pool Market Share by Cumulative Stake Transactions'
   , color_discrete_sequence=px.colors.qualitative.Prism)
   fig2.update_xaxes(showgrid=False)
   fig2.update_yaxes(showgrid=False)
   fig2.update_xaxes(title_text='Month')
   fig2.update_yaxes(title_text='Market Share in %')
-  st.plotly_chart(fig2, use_container_width=True)
+  return fig2
 
-def c_staker_market_share_comparison(scp, result):
-  scp = scp.loc[scp['stake_pool_name'].str.contains(result, case=False)]
-  net2 = scp.groupby(by = 'date_stake').sum().reset_index()
-
-  monthly_net = scp.merge(net2, how='outer', left_on = ['date_stake'], right_on = ['date_stake'])
-  monthly_net['market_share'] =  monthly_net['staker_status_x'] / monthly_net['staker_status_y'] * 100
-  monthly_net = monthly_net[['date_stake', 'stake_pool_name', 'market_share']]
-  fig4 = px.area(monthly_net, x='date_stake', y='market_share', color = 'stake_pool_name', title = 'Stake Pool Market Share by Staker', color_discrete_sequence=px.colors.qualitative.Prism)
+@figure_view
+def c_staker_market_share_comparison(shares, result):
+  monthly_net = shares.frame('stakers', result)
+  fig4 = px.area(monthly_net, x='month', y='market_share', color = 'stake_pool_name', title = 'Stake Pool Market Share by Staker', color_discrete_sequence=px.colors.qualitative.Prism)
   fig4.update_xaxes(showgrid=False)
   fig4.update_yaxes(showgrid=False)
   fig4.update_xaxes(title_text='Month')
   fig4.update_yaxes(title_text='Market Share in %')
-  st.plotly_chart(fig4, use_container_width=True)
+  return fig4
 
 #PAGE3
 
+def pool_names(df):
+  return df['stake_pool_name'].astype('string').str.capitalize().unique()
+
 def dd_stake_pool(df):
   options = st.selectbox(
     'Select Staking Pool',
-      df['stake_pool_name'].astype('string').str.capitalize().unique())
+      pool_names(df))
 
   # st.write('You selected:', options)
   return options
 
-def dd_month(): # Dropdown
-  months = [
+ANALYSIS_MONTHS = [
     '2022-12',
     '2022-11',
     '2022-10',
@@ -1474,60 +1939,20 @@ def dd_month(): # Dropdown
     '2022-02',
     '2022-01'
 ]
+
+def dd_month(): # Dropdown
   option = st.selectbox(
       'Select Month',
-      months) 
+      ANALYSIS_MONTHS) 
   return option
 
-def i_analysis_stakers(df, option_stake_pool, option_month):
-  #transforms on the df
-  df['amount'] = df['amount'].astype('float')/10**9
-  df = df[(df.succeeded == True)]
-  df['block_timestamp'] = pd.to_datetime(df.block_timestamp)
-  df['month'] = df.block_timestamp.dt.strftime('%Y-%m')
-
-  deposit_actions = ['deposit_stake', 'deposit', 'deposit_dao', 'deposit_dao_stake', 'deposit_dao_with_referrer']
-  df.loc[df.action.isin(deposit_actions), 'action'] = 'deposit'
-
-  withdraw_actions = ['order_unstake', 'claim', 'withdraw_stake', 'withdraw', 'withdraw_dao', 'withdraw_dao_stake']
-  df.loc[df.action.isin(withdraw_actions), 'action'] = 'withdraw'
-
-  # dt.strptime('Jun 1 2005', '%Y-%m-%d').datetime()
+@figure_view
+def i_analysis_stakers(balances, option_stake_pool, option_month):
   month_year_filter = option_month #filter input
-  # mask = df['block_timestamp'] <= datetime.strptime(month_year_filter, '%Y-%m-%d')
-  # df_filtered = df.loc[mask]
-  df_filtered = df[(df.month <= month_year_filter)]
   stake_pool = option_stake_pool.lower()
-  df_filtered = df_filtered[df_filtered['stake_pool_name'] == stake_pool]
-
-
-  #df of deposits and df of withdraws
-  deposits_df = df_filtered[df_filtered["action"] == 'deposit']
-  withdraw_df = df_filtered[df_filtered["action"] == 'withdraw']
 
-  #group by deposits by stake pool and address
-  total_deposits_wallet_df = deposits_df.groupby(['address', 'stake_pool_name', 'action'])['amount'].sum().reset_index()
-  total_deposits_wallet_df.sort_values(['address'], inplace = True)
-
-  #group by withdraws by stake pool and address
-  total_withdraw_wallet_df = withdraw_df.groupby(['address', 'stake_pool_name', 'action'])['amount'].sum().reset_index()
-  total_withdraw_wallet_df.sort_values(['address'], inplace = True)
-
-  net_stake_df = total_deposits_wallet_df.merge(total_withdraw_wallet_df, on=['address', 'stake_pool_name'], how='left')
-
-  net_stake_df = net_stake_df.rename({'amount_x': 'deposit_amount', 'amount_y': 'withdraw_amount'}, axis=1)
-
-  net_stake_df['withdraw_amount'] = net_stake_df['withdraw_amount'].fillna(value=0)
-
-  net_stake_df['net_stake'] = net_stake_df.apply(lambda row: row.deposit_amount - row.withdraw_amount, axis=1)
-
-  #get whether wallet is currently staking by checking for net_stake > 0
-  row_indexes=net_stake_df[net_stake_df['net_stake']>0].index
-  net_stake_df.loc[row_indexes,'status']="staking"
-  row_indexes=net_stake_df[net_stake_df['net_stake']<=0].index
-  net_stake_df.loc[row_indexes,'status']="not staking"
-
-  staking_df = net_stake_df[net_stake_df["status"] == 'staking']
+  #wallets with a positive net stake in the pool at the end of the month
+  staking_df = balances.stakers(last_day_of(month_year_filter), stake_pool)
 
   number_stakers = staking_df.address.nunique()
 
@@ -1540,39 +1965,15 @@ def i_analysis_stakers(df, option_stake_pool, option_month):
       domain = {'x': [0, 1], 'y': [0, 1]},
       title = {'text': "Number of Stakers"}))
   fig3.update_layout( height=280)
-  st.plotly_chart(fig3, use_container_width=True)
-
-def i_analysis_new_stakers(df, option_stake_pool, option_month):
-  #transforms on the df
-  df['amount'] = df['amount'].astype('float')/10**9
-  df = df[(df.succeeded == True)]
-  df['block_timestamp'] = pd.to_datetime(df.block_timestamp)
-  df['month'] = df.block_timestamp.dt.strftime('%Y-%m')
-
-  deposit_actions = ['deposit_stake', 'deposit', 'deposit_dao', 'deposit_dao_stake', 'deposit_dao_with_referrer']
-  df.loc[df.action.isin(deposit_actions), 'action'] = 'deposit'
-
-  withdraw_actions = ['order_unstake', 'claim', 'withdraw_stake', 'withdraw', 'withdraw_dao', 'withdraw_dao_stake']
-  df.loc[df.action.isin(withdraw_actions), 'action'] = 'withdraw'
+  return fig3
 
-  # dt.strptime('Jun 1 2005', '%Y-%m-%d').datetime()
+@figure_view
+def i_analysis_new_stakers(cohorts, option_stake_pool, option_month):
   month_year_filter = option_month #filter input
-  # mask = df['block_timestamp'] <= datetime.strptime(month_year_filter, '%Y-%m-%d')
-  # df_filtered = df.loc[mask]
-  df_filtered = df[(df.month <= month_year_filter)]
+  month_key = month_key_of(month_year_filter)
   stake_pool = option_stake_pool.lower()
-  df_filtered = df_filtered[df_filtered['stake_pool_name'] == stake_pool]
 
-  deposits_df = df_filtered[df_filtered["action"] == 'deposit']
-
-  #group by withdraws by stake pool and address
-  earliest_stake_df = deposits_df.groupby(['address', 'stake_pool_name']).agg(min_date=('month', np.min)).reset_index()
-
-  # earliest_stake_df['min_month'] = earliest_stake_df.min_date.dt.strftime('%Y-%m')
-
-  new_stakers = earliest_stake_df[(earliest_stake_df.min_date == month_year_filter)]
-
-  number_stakers = new_stakers.address.nunique()
+  number_stakers = cohorts.new_stakers(month_key, stake_pool)
 
   fig3 = go.Figure(go.Indicator(
       mode = 'number',
@@ -1583,41 +1984,15 @@ def i_analysis_new_stakers(df, option_stake_pool, option_month):
       domain = {'x': [0, 1], 'y': [0, 1]},
       title = {'text': "Number of New Stakers"}))
   fig3.update_layout( height=280)
-  st.plotly_chart(fig3, use_container_width=True)
-
-def i_analysis_churn(df, option_stake, option_month):
-  #transforms on the df
-  df['amount'] = df['amount'].astype('float')/10**9
-  df = df[(df.succeeded == True)]
-  df['block_timestamp'] = pd.to_datetime(df.block_timestamp)
-  df['month'] = df.block_timestamp.dt.strftime('%Y-%m')
+  return fig3
 
-  deposit_actions = ['deposit_stake', 'deposit', 'deposit_dao', 'deposit_dao_stake', 'deposit_dao_with_referrer']
-  df.loc[df.action.isin(deposit_actions), 'action'] = 'deposit'
-
-  withdraw_actions = ['order_unstake', 'claim', 'withdraw_stake', 'withdraw', 'withdraw_dao', 'withdraw_dao_stake']
-  df.loc[df.action.isin(withdraw_actions), 'action'] = 'withdraw'
-
-  # dt.strptime('Jun 1 2005', '%Y-%m-%d').datetime()
+@figure_view
+def i_analysis_churn(churn, option_stake, option_month):
   month_year_filter = option_month #filter input
-  # mask = df['block_timestamp'] <= datetime.strptime(month_year_filter, '%Y-%m-%d')
-  # df_filtered = df.loc[mask]
-  df_filtered = df[(df.month <= month_year_filter)]
+  month_key = month_key_of(month_year_filter)
   stake_pool = option_stake.lower()
-  df_filtered = df_filtered[df_filtered['stake_pool_name'] == stake_pool]
-
-  df_filtered['deposit_amount'] = df_filtered.apply(lambda x: x.amount if x.action == 'deposit' else -x.amount, axis=1)
-
-  #https://stackoverflow.com/questions/25024797/max-and-min-date-in-pandas-groupby
-  net_deposits_last_df = df_filtered.groupby(['stake_pool_name','address']).agg(net_deposit=('deposit_amount', np.sum), last_date=('month', np.max)).reset_index()
-
-  zero_net_deposits_df = net_deposits_last_df[net_deposits_last_df['net_deposit'] <= 0]
 
-  # zero_net_deposits_df['month'] = zero_net_deposits_df.last_date.dt.strftime('%Y-%m')
-
-  zero_current_net_deposits_df = zero_net_deposits_df[(zero_net_deposits_df.last_date == month_year_filter)]
-
-  number_churn = zero_current_net_deposits_df.address.nunique()
+  number_churn, churned_sol = churn.churned(stake_pool, month_key)
 
   fig3 = go.Figure(go.Indicator(
       mode = 'number',
@@ -1626,67 +2001,21 @@ def i_analysis_churn(df, option_stake, option_month):
       value = number_churn,
     # color='#1f77b4',
       domain = {'x': [0, 1], 'y': [0, 1]},
-      title = {'text': "Number of Churn"}))
+      title = {'text': "Number of Churn<br><span style='font-size:0.6em'>" + f'{churned_sol:,.0f} SOL taken out' + "</span>"}))
   fig3.update_layout( height=280)
-  st.plotly_chart(fig3, use_container_width=True)
-
-def i_analysis_sol_holding(df, sol_holdings_df, option_stake, option_month):
-  #transforms on the df
-  df['amount'] = df['amount'].astype('float')/10**9
-  df = df[(df.succeeded == True)]
-  df['block_timestamp'] = pd.to_datetime(df.block_timestamp)
-  df['month'] = df.block_timestamp.dt.strftime('%Y-%m')
-
-  deposit_actions = ['deposit_stake', 'deposit', 'deposit_dao', 'deposit_dao_stake', 'deposit_dao_with_referrer']
-  df.loc[df.action.isin(deposit_actions), 'action'] = 'deposit'
-
-  withdraw_actions = ['order_unstake', 'claim', 'withdraw_stake', 'withdraw', 'withdraw_dao', 'withdraw_dao_stake']
-  df.loc[df.action.isin(withdraw_actions), 'action'] = 'withdraw'
+  return fig3
 
-  # dt.strptime('Jun 1 2005', '%Y-%m-%d').datetime()
+@figure_view
+def i_analysis_sol_holding(balances, sol_holdings_df, option_stake, option_month):
   month_year_filter = option_month #filter input
-  # mask = df['block_timestamp'] <= datetime.strptime(month_year_filter, '%Y-%m-%d')
-  # df_filtered = df.loc[mask]
-  df_filtered = df[(df.month <= month_year_filter)]
   stake_pool = option_stake.lower()
-  df_filtered = df_filtered[df_filtered['stake_pool_name'] == stake_pool]
 
+  #wallets with a positive net stake in the pool at the end of the month
+  staking_df = balances.stakers(last_day_of(month_year_filter), stake_pool)
 
-  #df of deposits and df of withdraws
-  deposits_df = df_filtered[df_filtered["action"] == 'deposit']
-  withdraw_df = df_filtered[df_filtered["action"] == 'withdraw']
+  current_stakers = staking_df['address'].unique()
 
-  #group by deposits by stake pool and address
-  total_deposits_wallet_df = deposits_df.groupby(['address', 'stake_pool_name', 'action'])['amount'].sum().reset_index()
-  total_deposits_wallet_df.sort_values(['address'], inplace = True)
-
-  #group by withdraws by stake pool and address
-  total_withdraw_wallet_df = withdraw_df.groupby(['address', 'stake_pool_name', 'action'])['amount'].sum().reset_index()
-  total_withdraw_wallet_df.sort_values(['address'], inplace = True)
-
-  net_stake_df = total_deposits_wallet_df.merge(total_withdraw_wallet_df, on=['address', 'stake_pool_name'], how='left')
-
-  net_stake_df = net_stake_df.rename({'amount_x': 'deposit_amount', 'amount_y': 'withdraw_amount'}, axis=1)
-
-  net_stake_df['withdraw_amount'] = net_stake_df['withdraw_amount'].fillna(value=0)
-
-  net_stake_df['net_stake'] = net_stake_df.apply(lambda row: row.deposit_amount - row.withdraw_amount, axis=1)
-
-  #get whether wallet is currently staking by checking for net_stake > 0
-  row_indexes=net_stake_df[net_stake_df['net_stake']>0].index
-  net_stake_df.loc[row_indexes,'status']="staking"
-  row_indexes=net_stake_df[net_stake_df['net_stake']<=0].index
-  net_stake_df.loc[row_indexes,'status']="not staking"
-
-  staking_df = net_stake_df[net_stake_df["status"] == 'staking']
-
-  current_stakers = list(set(staking_df['address'].tolist()))
-
-  sol_holdings_df.loc[sol_holdings_df.sol_amount.isna(), 'amount_type'] = 'a. No SOL related TX for current Month (inactive)'
-
-  sol_holdings_df['month_year'] = pd.to_datetime(sol_holdings_df.month_year).dt.strftime('%Y-%m')
-
-  sol_holdings_df_filtered = sol_holdings_df[(sol_holdings_df.month_year == month_year_filter)]
+  sol_holdings_df_filtered = sol_holdings_df[in_month(sol_holdings_df.month_year, month_year_filter)]
 
   stakers = sol_holdings_df_filtered["wallet"].isin(current_stakers)
   sol_holdings_df_filtered = sol_holdings_df_filtered.loc[stakers]
@@ -1700,68 +2029,24 @@ def i_analysis_sol_holding(df, sol_holdings_df, option_stake, option_month):
       domain = {'x': [0, 1], 'y': [0, 1]},
       title = {'text': "Average SOL Holdings"}))
   fig3.update_layout( height=280)
-  st.plotly_chart(fig3, use_container_width=True)
+  return fig3
 
-def c_sources_of_fund(df, funds_df, option_stake, option_month):
-  #transforms on the df
-  df['amount'] = df['amount'].astype('float')/10**9
-  df = df[(df.succeeded == True)]
-  df['block_timestamp'] = pd.to_datetime(df.block_timestamp)
-  df['month'] = df.block_timestamp.dt.strftime('%Y-%m')
-
-  deposit_actions = ['deposit_stake', 'deposit', 'deposit_dao', 'deposit_dao_stake', 'deposit_dao_with_referrer']
-  df.loc[df.action.isin(deposit_actions), 'action'] = 'deposit'
-
-  withdraw_actions = ['order_unstake', 'claim', 'withdraw_stake', 'withdraw', 'withdraw_dao', 'withdraw_dao_stake']
-  df.loc[df.action.isin(withdraw_actions), 'action'] = 'withdraw'
-
-  # dt.strptime('Jun 1 2005', '%Y-%m-%d').datetime()
+@figure_view
+def c_sources_of_fund(balances, funds_df, option_stake, option_month):
   month_year_filter = option_month #filter input
-  date_filter = datetime.strptime(month_year_filter, '%Y-%m')
-  date_filter_last = date_filter + relativedelta(day=31)
-  mask = df['block_timestamp'] <= date_filter_last
-  df_filtered = df.loc[mask]
   stake_pool = option_stake.lower()
-  df_filtered = df_filtered[df_filtered['stake_pool_name'] == stake_pool]
-
-
-  #df of deposits and df of withdraws
-  deposits_df = df_filtered[df_filtered["action"] == 'deposit']
-  withdraw_df = df_filtered[df_filtered["action"] == 'withdraw']
 
-  #group by deposits by stake pool and address
-  total_deposits_wallet_df = deposits_df.groupby(['address', 'stake_pool_name', 'action'])['amount'].sum().reset_index()
-  total_deposits_wallet_df.sort_values(['address'], inplace = True)
+  #wallets with a positive net stake in the pool at the end of the month
+  staking_df = balances.stakers(last_day_of(month_year_filter), stake_pool)
 
-  #group by withdraws by stake pool and address
-  total_withdraw_wallet_df = withdraw_df.groupby(['address', 'stake_pool_name', 'action'])['amount'].sum().reset_index()
-  total_withdraw_wallet_df.sort_values(['address'], inplace = True)
-
-  net_stake_df = total_deposits_wallet_df.merge(total_withdraw_wallet_df, on=['address', 'stake_pool_name'], how='left')
-
-  net_stake_df = net_stake_df.rename({'amount_x': 'deposit_amount', 'amount_y': 'withdraw_amount'}, axis=1)
-
-  net_stake_df['withdraw_amount'] = net_stake_df['withdraw_amount'].fillna(value=0)
-
-  net_stake_df['net_stake'] = net_stake_df.apply(lambda row: row.deposit_amount - row.withdraw_amount, axis=1)
-
-  #get whether wallet is currently staking by checking for net_stake > 0
-  row_indexes=net_stake_df[net_stake_df['net_stake']>0].index
-  net_stake_df.loc[row_indexes,'status']="staking"
-  row_indexes=net_stake_df[net_stake_df['net_stake']<=0].index
-  net_stake_df.loc[row_indexes,'status']="not staking"
-
-  staking_df = net_stake_df[net_stake_df["status"] == 'staking']
-
-  current_stakers = list(set(staking_df['address'].tolist()))
+  current_stakers = staking_df['address'].unique()
 
   stakers = funds_df["wallet"].isin(current_stakers)
   funds_df_filtered = funds_df.loc[stakers]
 
-  funds_df_filtered['sources'] = funds_df_filtered['sources'].str.replace('Bridge', '')
-  funds_df_filtered['sources'] = funds_df_filtered['sources'].str.replace('SOL Transfer', '')
+  funds_df_filtered = funds_df_filtered.assign(sources = funds_df_filtered['sources'].str.replace('Bridge', '').str.replace('SOL Transfer', ''))
 
-  funds_count_df = funds_df_filtered.groupby(['sources']).agg(count_wallets=('wallet', 'nunique')).reset_index()
+  funds_count_df = funds_df_filtered.groupby(['sources'], observed = True).agg(count_wallets=('wallet', 'nunique')).reset_index()
 
   fig2 = px.histogram(funds_count_df.sort_values(by='count_wallets', ascending = False), x='sources', y='count_wallets', color='sources',
               title='Sources of Funds', log_y= True, color_discrete_sequence=px.colors.qualitative.Prism)
@@ -1770,70 +2055,26 @@ def c_sources_of_fund(df, funds_df, option_stake, option_month):
 
   fig2.update_xaxes(showgrid=False)
   fig2.update_yaxes(showgrid=False)
-  st.plotly_chart(fig2, use_container_width=True)
-
-def c_sol_holdings(df, sol_holdings_df, option_stake, option_month):
-  #transforms on the df
-  df['amount'] = df['amount'].astype('float')/10**9
-  df = df[(df.succeeded == True)]
-  df['block_timestamp'] = pd.to_datetime(df.block_timestamp)
-  df['month'] = df.block_timestamp.dt.strftime('%Y-%m')
-
-  deposit_actions = ['deposit_stake', 'deposit', 'deposit_dao', 'deposit_dao_stake', 'deposit_dao_with_referrer']
-  df.loc[df.action.isin(deposit_actions), 'action'] = 'deposit'
-
-  withdraw_actions = ['order_unstake', 'claim', 'withdraw_stake', 'withdraw', 'withdraw_dao', 'withdraw_dao_stake']
-  df.loc[df.action.isin(withdraw_actions), 'action'] = 'withdraw'
+  return fig2
 
-  # dt.strptime('Jun 1 2005', '%Y-%m-%d').datetime()
+@figure_view
+def c_sol_holdings(balances, sol_holdings_df, option_stake, option_month):
   month_year_filter = option_month #filter input
-  # mask = df['block_timestamp'] <= datetime.strptime(month_year_filter, '%Y-%m-%d')
-  # df_filtered = df.loc[mask]
-  df_filtered = df[(df.month <= month_year_filter)]
   stake_pool = option_stake.lower()
-  df_filtered = df_filtered[df_filtered['stake_pool_name'] == stake_pool]
-
-
-  #df of deposits and df of withdraws
-  deposits_df = df_filtered[df_filtered["action"] == 'deposit']
-  withdraw_df = df_filtered[df_filtered["action"] == 'withdraw']
-
-  #group by deposits by stake pool and address
-  total_deposits_wallet_df = deposits_df.groupby(['address', 'stake_pool_name', 'action'])['amount'].sum().reset_index()
-  total_deposits_wallet_df.sort_values(['address'], inplace = True)
-
-  #group by withdraws by stake pool and address
-  total_withdraw_wallet_df = withdraw_df.groupby(['address', 'stake_pool_name', 'action'])['amount'].sum().reset_index()
-  total_withdraw_wallet_df.sort_values(['address'], inplace = True)
-
-  net_stake_df = total_deposits_wallet_df.merge(total_withdraw_wallet_df, on=['address', 'stake_pool_name'], how='left')
 
-  net_stake_df = net_stake_df.rename({'amount_x': 'deposit_amount', 'amount_y': 'withdraw_amount'}, axis=1)
+  #wallets with a positive net stake in the pool at the end of the month
+  staking_df = balances.stakers(last_day_of(month_year_filter), stake_pool)
 
-  net_stake_df['withdraw_amount'] = net_stake_df['withdraw_amount'].fillna(value=0)
+  current_stakers = staking_df['address'].unique()
 
-  net_stake_df['net_stake'] = net_stake_df.apply(lambda row: row.deposit_amount - row.withdraw_amount, axis=1)
-
-  #get whether wallet is currently staking by checking for net_stake > 0
-  row_indexes=net_stake_df[net_stake_df['net_stake']>0].index
-  net_stake_df.loc[row_indexes,'status']="staking"
-  row_indexes=net_stake_df[net_stake_df['net_stake']<=0].index
-  net_stake_df.loc[row_indexes,'status']="not staking"
-
-  staking_df = net_stake_df[net_stake_df["status"] == 'staking']
-
-  current_stakers = list(set(staking_df['address'].tolist()))
-
-  sol_holdings_df.loc[sol_holdings_df.sol_amount.isna(), 'amount_type'] = 'a. Inactive for current Month'
-
-  sol_holdings_df['month_year'] = pd.to_datetime(sol_holdings_df.month_year).dt.strftime('%Y-%m')
-
-  sol_holdings_df_filtered = sol_holdings_df[(sol_holdings_df.month_year == month_year_filter)]
+  sol_holdings_df_filtered = sol_holdings_df[in_month(sol_holdings_df.month_year, month_year_filter)]
 
   stakers = sol_holdings_df_filtered["wallet"].isin(current_stakers)
   sol_holdings_df_filtered = sol_holdings_df_filtered.loc[stakers]
+  sol_holdings_df_filtered = sol_holdings_df_filtered.assign(
+    amount_type = sol_holdings_df_filtered['amount_type'].astype(object).where(sol_holdings_df_filtered.sol_amount.notna(), 'a. Inactive for current Month'))
 
-  sol_holdings_count_df = sol_holdings_df_filtered.groupby(['amount_type']).agg(number_interactions=('wallet', 'count')).reset_index()
+  sol_holdings_count_df = sol_holdings_df_filtered.groupby(['amount_type'], observed = True).agg(number_interactions=('wallet', 'count')).reset_index()
 
   fig2 = px.histogram(sol_holdings_count_df.sort_values(by='amount_type'), x='amount_type', y='number_interactions', color='amount_type',
               title='SOL Holdings', log_y= True, color_discrete_sequence=px.colors.qualitative.Prism)
@@ -1842,70 +2083,28 @@ def c_sol_holdings(df, sol_holdings_df, option_stake, option_month):
   
   fig2.update_xaxes(showgrid=False)
   fig2.update_yaxes(showgrid=False)
-  st.plotly_chart(fig2, use_container_width=True)
+  return fig2
 
-def c_protocol_interactions(df, protocol_df, option_stake, option_month):
-  #transforms on the df
-  df['amount'] = df['amount'].astype('float')/10**9
-  df = df[(df.succeeded == True)]
-  df['block_timestamp'] = pd.to_datetime(df.block_timestamp)
-  df['month'] = df.block_timestamp.dt.strftime('%Y-%m')
-
-  deposit_actions = ['deposit_stake', 'deposit', 'deposit_dao', 'deposit_dao_stake', 'deposit_dao_with_referrer']
-  df.loc[df.action.isin(deposit_actions), 'action'] = 'deposit'
-
-  withdraw_actions = ['order_unstake', 'claim', 'withdraw_stake', 'withdraw', 'withdraw_dao', 'withdraw_dao_stake']
-  df.loc[df.action.isin(withdraw_actions), 'action'] = 'withdraw'
-
-  # dt.strptime('Jun 1 2005', '%Y-%m-%d').datetime()
+@figure_view
+def c_protocol_interactions(balances, protocol_df, option_stake, option_month):
   month_year_filter = option_month #filter input
-  # mask = df['block_timestamp'] <= datetime.strptime(month_year_filter, '%Y-%m-%d')
-  # df_filtered = df.loc[mask]
-  df_filtered = df[(df.month <= month_year_filter)]
   stake_pool = option_stake.lower()
-  df_filtered = df_filtered[df_filtered['stake_pool_name'] == stake_pool]
-
-
-  #df of deposits and df of withdraws
-  deposits_df = df_filtered[df_filtered["action"] == 'deposit']
-  withdraw_df = df_filtered[df_filtered["action"] == 'withdraw']
-
-  #group by deposits by stake pool and address
-  total_deposits_wallet_df = deposits_df.groupby(['address', 'stake_pool_name', 'action'])['amount'].sum().reset_index()
-  total_deposits_wallet_df.sort_values(['address'], inplace = True)
-
-  #group by withdraws by stake pool and address
-  total_withdraw_wallet_df = withdraw_df.groupby(['address', 'stake_pool_name', 'action'])['amount'].sum().reset_index()
-  total_withdraw_wallet_df.sort_values(['address'], inplace = True)
-
-  net_stake_df = total_deposits_wallet_df.merge(total_withdraw_wallet_df, on=['address', 'stake_pool_name'], how='left')
-
-  net_stake_df = net_stake_df.rename({'amount_x': 'deposit_amount', 'amount_y': 'withdraw_amount'}, axis=1)
-
-  net_stake_df['withdraw_amount'] = net_stake_df['withdraw_amount'].fillna(value=0)
 
-  net_stake_df['net_stake'] = net_stake_df.apply(lambda row: row.deposit_amount - row.withdraw_amount, axis=1)
+  #wallets with a positive net stake in the pool at the end of the month
+  staking_df = balances.stakers(last_day_of(month_year_filter), stake_pool)
 
-  #get whether wallet is currently staking by checking for net_stake > 0
-  row_indexes=net_stake_df[net_stake_df['net_stake']>0].index
-  net_stake_df.loc[row_indexes,'status']="staking"
-  row_indexes=net_stake_df[net_stake_df['net_stake']<=0].index
-  net_stake_df.loc[row_indexes,'status']="not staking"
-
-  staking_df = net_stake_df[net_stake_df["status"] == 'staking']
-
-  current_stakers = list(set(staking_df['address'].tolist()))
+  current_stakers = staking_df['address'].unique()
 
   protocol_interactions_df = protocol_df
 
-  protocol_interactions_df['month_year'] = pd.to_datetime(protocol_interactions_df.month_year).dt.strftime('%Y-%m')
-
-  protocol_interactions_df_filtered = protocol_interactions_df[(protocol_interactions_df.month_year == month_year_filter)]
+  protocol_interactions_df_filtered = protocol_interactions_df[in_month(protocol_interactions_df.month_year, month_year_filter)]
 
   stakers = protocol_interactions_df_filtered["wallet"].isin(current_stakers)
   protocol_interactions_df_filtered = protocol_interactions_df_filtered.loc[stakers]
 
-  protocol_interactions_count_df = protocol_interactions_df_filtered.groupby(['protocol']).agg(number_interactions=('wallet', 'count')).reset_index()
+  protocol_interactions_count_df = protocol_interactions_df_filtered.groupby(['protocol'], observed = True).agg(number_interactions=('wallet', 'count')).reset_index()
+  # plotly groups by every category of a categorical, used or not
+  protocol_interactions_count_df['protocol'] = protocol_interactions_count_df['protocol'].astype(str)
 
   fig2 = px.histogram(protocol_interactions_count_df.sort_values(by='number_interactions', ascending=False), x='protocol', y='number_interactions', color='protocol',
               title='Protocol Wallet Interactions', log_y= True, color_discrete_sequence=px.colors.qualitative.Prism)
@@ -1914,96 +2113,15 @@ def c_protocol_interactions(df, protocol_df, option_stake, option_month):
   
   fig2.update_xaxes(showgrid=False)
   fig2.update_yaxes(showgrid=False)
-  st.plotly_chart(fig2, use_container_width=True)
-
-def c_stake_pool_crossover(df, option_stake, option_month):
-  #transforms on the df
-  df['amount'] = df['amount'].astype('float')/10**9
-  df = df[(df.succeeded == True)]
-  df['block_timestamp'] = pd.to_datetime(df.block_timestamp)
-  df['month'] = df.block_timestamp.dt.strftime('%Y-%m')
-
-  deposit_actions = ['deposit_stake', 'deposit', 'deposit_dao', 'deposit_dao_stake', 'deposit_dao_with_referrer']
-  df.loc[df.action.isin(deposit_actions), 'action'] = 'deposit'
+  return fig2
 
-  withdraw_actions = ['order_unstake', 'claim', 'withdraw_stake', 'withdraw', 'withdraw_dao', 'withdraw_dao_stake']
-  df.loc[df.action.isin(withdraw_actions), 'action'] = 'withdraw'
-
-  # dt.strptime('Jun 1 2005', '%Y-%m-%d').datetime()
+@figure_view
+def c_stake_pool_crossover(crossover, option_stake, option_month):
   month_year_filter = option_month #filter input
-  # mask = df['block_timestamp'] <= datetime.strptime(month_year_filter, '%Y-%m-%d')
-  # df_filtered = df.loc[mask]
-  df_filtered = df[(df.month <= month_year_filter)]
   stake_pool = option_stake.lower()
-  df_filtered = df_filtered[df_filtered['stake_pool_name'] == stake_pool]
-
-
-  #df of deposits and df of withdraws
-  deposits_df = df_filtered[df_filtered["action"] == 'deposit']
-  withdraw_df = df_filtered[df_filtered["action"] == 'withdraw']
-
-  #group by deposits by stake pool and address
-  total_deposits_wallet_df = deposits_df.groupby(['address', 'stake_pool_name', 'action'])['amount'].sum().reset_index()
-  total_deposits_wallet_df.sort_values(['address'], inplace = True)
-
-  #group by withdraws by stake pool and address
-  total_withdraw_wallet_df = withdraw_df.groupby(['address', 'stake_pool_name', 'action'])['amount'].sum().reset_index()
-  total_withdraw_wallet_df.sort_values(['address'], inplace = True)
-
-  net_stake_df = total_deposits_wallet_df.merge(total_withdraw_wallet_df, on=['address', 'stake_pool_name'], how='left')
-
-  net_stake_df = net_stake_df.rename({'amount_x': 'deposit_amount', 'amount_y': 'withdraw_amount'}, axis=1)
-
-  net_stake_df['withdraw_amount'] = net_stake_df['withdraw_amount'].fillna(value=0)
-
-  net_stake_df['net_stake'] = net_stake_df.apply(lambda row: row.deposit_amount - row.withdraw_amount, axis=1)
-
-  #get whether wallet is currently staking by checking for net_stake > 0
-  row_indexes=net_stake_df[net_stake_df['net_stake']>0].index
-  net_stake_df.loc[row_indexes,'status']="staking"
-  row_indexes=net_stake_df[net_stake_df['net_stake']<=0].index
-  net_stake_df.loc[row_indexes,'status']="not staking"
 
-  staking_df = net_stake_df[net_stake_df["status"] == 'staking']
-
-  current_stakers = list(set(staking_df['address'].tolist()))
-
-  df_crossover = df[(df.month <= month_year_filter)]
-  # df_crossover = df[(df.month == month_year_filter)]
-  df_crossover = df_crossover[df_crossover['stake_pool_name'] != stake_pool]
-
-  stakers = df_crossover["address"].isin(current_stakers)
-  df_crossover = df_crossover.loc[stakers]
-
-  #df of deposits and df of withdraws
-  deposits_crossover_df = df_crossover[df_crossover["action"] == 'deposit']
-  withdraw_crossover_df = df_crossover[df_crossover["action"] == 'withdraw']
-
-  #group by deposits by stake pool and address
-  total_deposits_crossover_df = deposits_crossover_df.groupby(['address', 'stake_pool_name', 'action'])['amount'].sum().reset_index()
-  total_deposits_crossover_df.sort_values(['address'], inplace = True)
-
-  #group by withdraws by stake pool and address
-  total_withdraw_crossover_df = withdraw_crossover_df.groupby(['address', 'stake_pool_name', 'action'])['amount'].sum().reset_index()
-  total_withdraw_crossover_df.sort_values(['address'], inplace = True)
-
-  net_stake_crossover_df = total_deposits_crossover_df.merge(total_withdraw_crossover_df, on=['address', 'stake_pool_name'], how='left')
-
-  net_stake_crossover_df = net_stake_crossover_df.rename({'amount_x': 'deposit_amount', 'amount_y': 'withdraw_amount'}, axis=1)
-
-  net_stake_crossover_df['withdraw_amount'] = net_stake_crossover_df['withdraw_amount'].fillna(value=0)
-
-  net_stake_crossover_df['net_stake'] = net_stake_crossover_df.apply(lambda row: row.deposit_amount - row.withdraw_amount, axis=1)
-
-  #get whether wallet is currently staking by checking for net_stake > 0
-  row_indexes=net_stake_crossover_df[net_stake_crossover_df['net_stake']>0].index
-  net_stake_crossover_df.loc[row_indexes,'status']="staking"
-  row_indexes=net_stake_crossover_df[net_stake_crossover_df['net_stake']<=0].index
-  net_stake_crossover_df.loc[row_indexes,'status']="not staking"
-
-  staking_crossover_df = net_stake_crossover_df[net_stake_crossover_df["status"] == 'staking']
-
-  staking_crossover_count_df = staking_crossover_df.groupby(['stake_pool_name']).agg(count_wallets=('address', 'nunique')).reset_index()
+  #the pool's stakers by the other pools they also stake in at the end of the month
+  staking_crossover_count_df = crossover.crossover(stake_pool, month_year_filter).rename_axis('stake_pool_name').reset_index(name = 'count_wallets')
   staking_crossover_count_df['stake_pool_name'] = staking_crossover_count_df['stake_pool_name'].str.capitalize()
 
   fig2 = px.histogram(staking_crossover_count_df.sort_values(by='count_wallets', ascending = False), x='stake_pool_name', y='count_wallets', color='stake_pool_name',
@@ -2013,82 +2131,15 @@ def c_stake_pool_crossover(df, option_stake, option_month):
 
   fig2.update_xaxes(showgrid=False)
   fig2.update_yaxes(showgrid=False)
-  st.plotly_chart(fig2, use_container_width=True)
-
-def c_stake_amount(df, option_stake, option_month):
-  #transforms on the df
-  df['amount'] = df['amount'].astype('float')/10**9
-  df = df[(df.succeeded == True)]
-  df['block_timestamp'] = pd.to_datetime(df.block_timestamp)
-  df['month'] = df.block_timestamp.dt.strftime('%Y-%m')
-
-  deposit_actions = ['deposit_stake', 'deposit', 'deposit_dao', 'deposit_dao_stake', 'deposit_dao_with_referrer']
-  df.loc[df.action.isin(deposit_actions), 'action'] = 'deposit'
-
-  withdraw_actions = ['order_unstake', 'claim', 'withdraw_stake', 'withdraw', 'withdraw_dao', 'withdraw_dao_stake']
-  df.loc[df.action.isin(withdraw_actions), 'action'] = 'withdraw'
+  return fig2
 
-  # dt.strptime('Jun 1 2005', '%Y-%m-%d').datetime()
+@figure_view(dated = True)
+def c_stake_amount(histograms, option_stake, option_month):
   month_year_filter = option_month #filter input
-  # mask = df['block_timestamp'] <= datetime.strptime(month_year_filter, '%Y-%m-%d')
-  # df_filtered = df.loc[mask]
-  df_filtered = df[(df.month <= month_year_filter)]
-  # df_filtered = df[(df.month == month_year_filter)]
-
   stake_pool = option_stake.lower()
-  df_filtered = df_filtered[df_filtered['stake_pool_name'] == stake_pool]
-
-
-  #df of deposits and df of withdraws
-  deposits_df = df_filtered[df_filtered["action"] == 'deposit']
-  withdraw_df = df_filtered[df_filtered["action"] == 'withdraw']
-
-  #group by deposits by stake pool and address
-  total_deposits_wallet_df = deposits_df.groupby(['address', 'stake_pool_name', 'action'])['amount'].sum().reset_index()
-  total_deposits_wallet_df.sort_values(['address'], inplace = True)
-
-  #group by withdraws by stake pool and address
-  total_withdraw_wallet_df = withdraw_df.groupby(['address', 'stake_pool_name', 'action'])['amount'].sum().reset_index()
-  total_withdraw_wallet_df.sort_values(['address'], inplace = True)
-
-  net_stake_df = total_deposits_wallet_df.merge(total_withdraw_wallet_df, on=['address', 'stake_pool_name'], how='left')
-
-  net_stake_df = net_stake_df.rename({'amount_x': 'deposit_amount', 'amount_y': 'withdraw_amount'}, axis=1)
-
-  net_stake_df['withdraw_amount'] = net_stake_df['withdraw_amount'].fillna(value=0)
-
-  net_stake_df['net_stake'] = net_stake_df.apply(lambda row: row.deposit_amount - row.withdraw_amount, axis=1)
-
-  #get whether wallet is currently staking by checking for net_stake > 0
-  row_indexes=net_stake_df[net_stake_df['net_stake']>0].index
-  net_stake_df.loc[row_indexes,'status']="staking"
-  row_indexes=net_stake_df[net_stake_df['net_stake']<=0].index
-  net_stake_df.loc[row_indexes,'status']="not staking"
 
-  staking_df = net_stake_df[net_stake_df["status"] == 'staking']
-
-  def get_stake_amount_category(net_stake):
-
-    if net_stake < 10:
-      return "a. SOL < 10"
-    elif net_stake < 100:
-      return "b. 10 < SOL < 100"
-    elif net_stake < 1000:
-      return "c. 100 < SOL < 1,000"
-    elif net_stake < 10000:
-      return "d. 1,000 < SOL 10,000"
-    else:
-      return "e. 10,000 < SOL"
-    # elif net_stake < 100000:
-    #   return "e. 10,000 < SOL < 100,000"
-    # elif net_stake < 1000000:
-    #   return "f. 100,000 < SOL < 1,000,000"
-    # else:
-    #   return "g. 1M < SOL"
-
-  staking_df['stake_amount_category'] = staking_df['net_stake'].apply(get_stake_amount_category)
-
-  staking_cateogry_count_df = staking_df.groupby(['stake_amount_category']).agg(count_wallets=('address', 'nunique')).reset_index()
+  #the pool's stakers at the end of the month by their net stake
+  staking_cateogry_count_df = histograms.amount(stake_pool, month_year_filter).rename(columns = {'category': 'stake_amount_category'})
 
   fig2 = px.histogram(staking_cateogry_count_df, x='stake_amount_category', y='count_wallets', log_y= True,
               title='Amount of SOL Staked', color='stake_amount_category', color_discrete_sequence=px.colors.qualitative.Prism)
@@ -2097,95 +2148,15 @@ def c_stake_amount(df, option_stake, option_month):
 
   fig2.update_xaxes(showgrid=False)
   fig2.update_yaxes(showgrid=False)
-  st.plotly_chart(fig2, use_container_width=True)
+  return fig2
 
-def c_stake_duration(df, option_stake, option_month):
-  #transforms on the df
-  df['amount'] = df['amount'].astype('float')/10**9
-  df = df[(df.succeeded == True)]
-  df['block_timestamp'] = pd.to_datetime(df.block_timestamp)
-  df['month'] = df.block_timestamp.dt.strftime('%Y-%m')
-
-  deposit_actions = ['deposit_stake', 'deposit', 'deposit_dao', 'deposit_dao_stake', 'deposit_dao_with_referrer']
-  df.loc[df.action.isin(deposit_actions), 'action'] = 'deposit'
-
-  withdraw_actions = ['order_unstake', 'claim', 'withdraw_stake', 'withdraw', 'withdraw_dao', 'withdraw_dao_stake']
-  df.loc[df.action.isin(withdraw_actions), 'action'] = 'withdraw'
-
-  # dt.strptime('Jun 1 2005', '%Y-%m-%d').datetime()
+@figure_view(dated = True)
+def c_stake_duration(histograms, option_stake, option_month):
   month_year_filter = option_month #filter input
-  date_filter = datetime.strptime(month_year_filter, '%Y-%m')
-  date_filter_last = date_filter + relativedelta(day=31)
-  mask = df['block_timestamp'] <= date_filter_last
-  df_filtered = df.loc[mask]
   stake_pool = option_stake.lower()
-  df_filtered = df_filtered[df_filtered['stake_pool_name'] == stake_pool]
-
-
-  #df of deposits and df of withdraws
-  deposits_df = df_filtered[df_filtered["action"] == 'deposit']
-  withdraw_df = df_filtered[df_filtered["action"] == 'withdraw']
-
-  #group by deposits by stake pool and address
-  total_deposits_wallet_df = deposits_df.groupby(['address', 'stake_pool_name', 'action'])['amount'].sum().reset_index()
-  total_deposits_wallet_df.sort_values(['address'], inplace = True)
-
-  #group by withdraws by stake pool and address
-  total_withdraw_wallet_df = withdraw_df.groupby(['address', 'stake_pool_name', 'action'])['amount'].sum().reset_index()
-  total_withdraw_wallet_df.sort_values(['address'], inplace = True)
-
-  net_stake_df = total_deposits_wallet_df.merge(total_withdraw_wallet_df, on=['address', 'stake_pool_name'], how='left')
-
-  net_stake_df = net_stake_df.rename({'amount_x': 'deposit_amount', 'amount_y': 'withdraw_amount'}, axis=1)
-
-  net_stake_df['withdraw_amount'] = net_stake_df['withdraw_amount'].fillna(value=0)
-
-  net_stake_df['net_stake'] = net_stake_df.apply(lambda row: row.deposit_amount - row.withdraw_amount, axis=1)
-
-  #get whether wallet is currently staking by checking for net_stake > 0
-  row_indexes=net_stake_df[net_stake_df['net_stake']>0].index
-  net_stake_df.loc[row_indexes,'status']="staking"
-  row_indexes=net_stake_df[net_stake_df['net_stake']<=0].index
-  net_stake_df.loc[row_indexes,'status']="not staking"
-
-  staking_df = net_stake_df[net_stake_df["status"] == 'staking']
-
-  current_stakers = list(set(staking_df['address'].tolist()))
-
-  stakers = df_filtered["address"].isin(current_stakers)
-  stake_duration_df = df_filtered.loc[stakers]
-
-  stake_duration_df = stake_duration_df.groupby(['address']).agg(start_date=('block_timestamp', 'min')).reset_index()
-
-  def get_stake_duration(start_date):
-
-    current_date = datetime.now()
-
-    if date_filter_last < current_date:
-      return (date_filter_last - start_date).days
-    else:
-      return (current_date - start_date).days
-
-  stake_duration_df['stake_duration'] = stake_duration_df['start_date'].apply(get_stake_duration)
-
-  def get_stake_duration_category(stake_duration):
-
-    if stake_duration < 7:
-      return "a. Stake < 1 Week"
-    elif stake_duration < 30:
-      return "b. 1 Week < Stake < 1 Month"
-    elif stake_duration < 90:
-      return "c. 1 Month < Stake < 3 Months"
-    elif stake_duration < 180:
-      return "d. 3 Months < Stake < 6 Months"
-    elif stake_duration < 360:
-      return "e. 6 Months < Stake < 1 Year"
-    else:
-      return "f. 1 Year < Stake"
-
-  stake_duration_df['stake_duration_category'] = stake_duration_df['stake_duration'].apply(get_stake_duration_category)
 
-  stake_duration_cateogry_count_df = stake_duration_df.groupby(['stake_duration_category']).agg(count_wallets=('address', 'nunique')).reset_index()
+  #the pool's stakers at the end of the month by the time since their first action in it
+  stake_duration_cateogry_count_df = histograms.age(stake_pool, month_year_filter).rename(columns = {'category': 'stake_duration_category'})
 
   fig2 = px.histogram(stake_duration_cateogry_count_df, x='stake_duration_category', y='count_wallets',
               title='Platform Age of Staker', log_y= True, color='stake_duration_category', color_discrete_sequence=px.colors.qualitative.Prism)
@@ -2194,20 +2165,40 @@ def c_stake_duration(df, option_stake, option_month):
   
   fig2.update_xaxes(showgrid=False)
   fig2.update_yaxes(showgrid=False)
-  st.plotly_chart(fig2, use_container_width=True)
+  return fig2
 
-#LOAD CSVs and Create DFs
-df, sc, scp, sol_holdings_df, funds_df, protocol_df = load_data()
-net = load_net(df)
+@figure_view
+def c_cohort_retention(cohorts, option_stake, option_month):
+  month_year_filter = option_month #filter input
+  month_key = month_key_of(month_year_filter)
+  stake_pool = option_stake.lower()
 
-#DEPLOY WIDGETS
-overview, comparison, user_analysis, about = st.tabs(["Overview", 'Comparison', 'User Analysis', "About"])
+  #cohorts up to the month, each followed until the end of the month
+  retention = cohorts.retention(stake_pool)
+  retention = retention[retention.index <= month_year_filter]
+  followed = month_index_of(month_key) - month_index_of(np.array([month_key_of(cohort) for cohort in retention.index]))
+  retention = retention.where(retention.columns.values[None, :] <= followed[:, None])
+  retention = retention.loc[:, retention.notna().any()]
 
+  fig = px.imshow(retention, aspect='auto', title='Cohort Retention', color_continuous_scale='Purp',
+              labels=dict(x='Months Since First Deposit', y='First Deposit Month', color='Still Staking in %'))
+  fig.update_xaxes(showgrid=False)
+  fig.update_yaxes(showgrid=False, type='category')
+  return fig
 
+#DEPLOY WIDGETS
+# each tab loads what it shows, built once per snapshot and shared read-only by every session,
+# so a tab nobody opens after a publish is never built
+def show_overview(snapshot):
+  events = load_events(snapshot)
+  sc = load_data(snapshot)[0]
+  net = load_net(snapshot)
+  shares = load_market_share(snapshot)
+  cohorts = load_cohorts(snapshot)
 
-with overview:
   st.header('Stake Pool')
-  option = dd_overview(df) 
+  option = dd_overview(events) 
+  tab_traffic().record('Overview', (option,))
 
   # col61, col62 = st.columns([3,2]) 
   # col21, col22 = st.columns(2)
@@ -2218,113 +2209,126 @@ with overview:
   with st.container():
     col31, col32, col33 = st.columns(3)
     with col31:
-      i_net_month(net)
+      i_net_month(snapshot, net)
     with col32:
-      i_active_wallet(df)
+      i_active_wallet(snapshot, events)
     with col33:
-      i_new_staker(df)
+      i_new_staker(snapshot, cohorts)
 
     col51, col52, col53 = st.columns([1,2,2])
     with col51:    
-      i_total_staked(net, df, sc)     
+      i_total_staked(snapshot, net, events, sc)     
 
     with col52:      
 
       if option == 'SOL Staked':
-        # c_net_deposit2(net)
-        # c_net_deposit(net)
-        c_net_stake_total(net)
-        c_net_stake_total_cumsum(net)
+        # c_net_deposit2(snapshot, net)
+        # c_net_deposit(snapshot, net)
+        c_net_stake_total(snapshot, net)
+        c_net_stake_total_cumsum(snapshot, net)
         
 
       elif option == 'Stake Transaction':
-        c_deposits_and_withdrawals(df)
-        c_deposits_and_withdrawals_cumu(df)
+        c_deposits_and_withdrawals(snapshot, events)
+        c_deposits_and_withdrawals_cumu(snapshot, events)
 
       elif option == 'Staker Count':
-        c_staker_count(sc)
-        c_new_stakers(df)
+        c_staker_count(snapshot, sc)
+        c_new_stakers(snapshot, cohorts)
 
 
     with col53: 
       if option == 'SOL Staked':
-        c_market_share2(net)
-        c_market_share(net)
-      # c_net_deposit(net)
+        c_market_share2(snapshot, shares)
+        c_market_share(snapshot, shares)
+      # c_net_deposit(snapshot, net)
       elif option == 'Stake Transaction':
-        c_top_share_stake_tx(df)
-        c_stake_transaction_market_share(df)
+        c_top_share_stake_tx(snapshot, shares)
+        c_stake_transaction_market_share(snapshot, shares)
 
       elif option == 'Staker Count':
-        c_top_staker_market_share(scp)
-        c_staker_market_share(scp)
+        c_top_staker_market_share(snapshot, shares)
+        c_staker_market_share(snapshot, shares)
         
 
 
-with comparison:
+def show_comparison(snapshot):
+  events = load_events(snapshot)
+  shares = load_market_share(snapshot)
+
   st.header('Pool Comparison')
-  options = dd_stake_multiselect(df)
+  options = dd_stake_multiselect(events)
   if not options:
-    options = df['stake_pool_name'].astype('string').str.capitalize().unique()
+    options = pool_names(events)
   result = ""
   for d in options:
     result += d + '|'
   result = result[:-1]
+  tab_traffic().record('Comparison', (result,))
   # st.write(result)
   p2_col21, p2_col22 = st.columns(2)
   with p2_col21:
-    # c_net_stake(df, result)
-    c_net_stake_cumsum(df, result)
-    c_staker(scp, result)
-    c_stake_transaction(df, result)
+    # c_net_stake(snapshot, shares, result)
+    c_net_stake_cumsum(snapshot, shares, result)
+    c_staker(snapshot, shares, result)
+    c_stake_transaction(snapshot, shares, result)
 
   with p2_col22:
-    c_market_share_comparison(net, result)
-    c_staker_market_share_comparison(scp, result)
-    c_stake_transaction_market_share_comparison(df, result)
+    c_market_share_comparison(snapshot, shares, result)
+    c_staker_market_share_comparison(snapshot, shares, result)
+    c_stake_transaction_market_share_comparison(snapshot, shares, result)
     
 
-with user_analysis:
-  df, sc, scp, sol_holdings_df, funds_df, protocol_df = load_data()
+def show_user_analysis(snapshot):
+  events = load_events(snapshot)
+  balances = load_balance_index(snapshot)
+  sc, scp, sol_holdings_df, funds_df, protocol_df = load_data(snapshot)
+  cohorts = load_cohorts(snapshot)
+  churn = load_churn(snapshot)
+  crossover = load_crossover(snapshot)
+  histograms = load_histograms(snapshot)
+
   st.header('User Analysis')
 
   p3_col21, p3_col22 = st.columns(2)
   with p3_col21:
-    option_stake_pool = dd_stake_pool(df)
+    option_stake_pool = dd_stake_pool(events)
 
   with p3_col22:
     option_month = dd_month()
+  tab_traffic().record('User Analysis', (option_stake_pool, option_month))
 
-  
   p3_col41, p3_col42, p3_col43, p3_col44 = st.columns(4)
 
   with p3_col41:
-    i_analysis_stakers(df, option_stake_pool, option_month)
+    i_analysis_stakers(snapshot, balances, option_stake_pool, option_month)
   
   with p3_col42:
-    i_analysis_new_stakers(df, option_stake_pool, option_month)
+    i_analysis_new_stakers(snapshot, cohorts, option_stake_pool, option_month)
 
   with p3_col43:
-    i_analysis_churn(df, option_stake_pool, option_month)
+    i_analysis_churn(snapshot, churn, option_stake_pool, option_month)
 
   with p3_col44:
-    i_analysis_sol_holding(df, sol_holdings_df, option_stake_pool, option_month)
+    i_analysis_sol_holding(snapshot, balances, sol_holdings_df, option_stake_pool, option_month)
 
-  df, sc, scp, sol_holdings_df, funds_df, protocol_df = load_data()
-  
   p3_col21, p3_col22 = st.columns(2)
 
   with p3_col21:
-    c_stake_amount(df, option_stake_pool, option_month)
-    c_sol_holdings(df, sol_holdings_df, option_stake_pool, option_month)
-    c_protocol_interactions(df, protocol_df, option_stake_pool, option_month)
+    c_stake_amount(snapshot, histograms, option_stake_pool, option_month)
+    c_sol_holdings(snapshot, balances, sol_holdings_df, option_stake_pool, option_month)
+    c_protocol_interactions(snapshot, balances, protocol_df, option_stake_pool, option_month)
 
   with p3_col22:
-    c_stake_duration(df, option_stake_pool, option_month)
-    c_stake_pool_crossover(df, option_stake_pool, option_month)
-    c_sources_of_fund(df, funds_df, option_stake_pool, option_month)
+    c_stake_duration(snapshot, histograms, option_stake_pool, option_month)
+    c_stake_pool_crossover(snapshot, crossover, option_stake_pool, option_month)
+    c_sources_of_fund(snapshot, balances, funds_df, option_stake_pool, option_month)
+
+  c_cohort_retention(snapshot, cohorts, option_stake_pool, option_month)
+
+def show_about(snapshot):
+  events = load_events(snapshot)
 
-with about:
   st.write("### Dashboard by ")
   st.write('[h4wk](https://twitter.com/h4wk10)')
   st.write('[banbannard](https://twitter.com/banbannard)')
@@ -2332,15 +2336,88 @@ with about:
   st.write('Data from [Flipside Crypto](https://flipsidecrypto.xyz/)')
 
   duration = 0
-  latest = datetime.strptime(max(df.block_timestamp)[:-4], '%Y-%m-%d %H:%M:%S')
+  latest = events.block_timestamp.max()
   duration = np.round((datetime.now() - latest).total_seconds() /3600, 2)
   st.write('Last Update was', duration, 'hours ago')
 
   if st.secrets['dev'] == 'YES':
     st.button('Update Data' , on_click = update_button_callback, help="Check for the latest database update in the last 24 hours") 
-
-
-
-
-
-
+    st.write('Figure cache', figure_cache().stats())
+
+  # the refresh may be running in another server process, so progress comes from the shared state file
+  if refresh_running():
+    refresh_state = read_refresh_state()
+    if refresh_state is not None:
+      show_refresh_stages(refresh_state['stages'])
+    # last thing on the page. The session reruns to follow the refresh instead of holding its script
+    # thread for all of it, and stops following once it leaves the tab
+    time.sleep(REFRESH_POLL_SECONDS)
+    st.experimental_rerun()
+
+  refresh_state = read_refresh_state()
+  if refresh_state is not None and refresh_state['status'] != 'done' and not refresh_running():
+    if refresh_state['status'] == 'running':
+      st.error('Last refresh stopped without finishing')
+    elif refresh_state['error'] is not None:
+      st.error(f"Last refresh failed: {refresh_state['error']}")
+    else:
+      st.error('Last refresh could not update: ' + ', '.join(stage['label'] for stage in refresh_state['stages'] if stage['status'] != 'done'))
+    show_refresh_stages(refresh_state['stages'])
+  elif refresh_state is not None and refresh_state['version'] != os.path.basename(snapshot) and not refresh_running():
+    st.button('Load new data')
+
+def tab_figures(snapshot, tab, options, snapshots = None):
+  # the views a tab draws for its selection and the data they take, as the show_ functions above call them
+  if tab == 'Overview':
+    option, = options
+    events = load_events(snapshot, snapshots)
+    sc = load_data(snapshot, snapshots)[0]
+    net = load_net(snapshot, snapshots)
+    shares = load_market_share(snapshot, snapshots)
+    cohorts = load_cohorts(snapshot, snapshots)
+    figures = [(i_net_month, (net,)), (i_active_wallet, (events,)), (i_new_staker, (cohorts,)), (i_total_staked, (net, events, sc))]
+    if option == 'SOL Staked':
+      figures += [(c_net_stake_total, (net,)), (c_net_stake_total_cumsum, (net,)), (c_market_share2, (shares,)), (c_market_share, (shares,))]
+    elif option == 'Stake Transaction':
+      figures += [(c_deposits_and_withdrawals, (events,)), (c_deposits_and_withdrawals_cumu, (events,)), (c_top_share_stake_tx, (shares,)), (c_stake_transaction_market_share, (shares,))]
+    elif option == 'Staker Count':
+      figures += [(c_staker_count, (sc,)), (c_new_stakers, (cohorts,)), (c_top_staker_market_share, (shares,)), (c_staker_market_share, (shares,))]
+    return figures
+  if tab == 'Comparison':
+    shares = load_market_share(snapshot, snapshots)
+    views = [c_net_stake_cumsum, c_staker, c_stake_transaction, c_market_share_comparison, c_staker_market_share_comparison, c_stake_transaction_market_share_comparison]
+    return [(view, (shares,) + options) for view in views]
+  if tab == 'User Analysis':
+    balances = load_balance_index(snapshot, snapshots)
+    sc, scp, sol_holdings_df, funds_df, protocol_df = load_data(snapshot, snapshots)
+    cohorts = load_cohorts(snapshot, snapshots)
+    histograms = load_histograms(snapshot, snapshots)
+    return [
+      (i_analysis_stakers, (balances,) + options), (i_analysis_new_stakers, (cohorts,) + options),
+      (i_analysis_churn, (load_churn(snapshot, snapshots),) + options), (i_analysis_sol_holding, (balances, sol_holdings_df) + options),
+      (c_stake_amount, (histograms,) + options), (c_sol_holdings, (balances, sol_holdings_df) + options),
+      (c_protocol_interactions, (balances, protocol_df) + options), (c_stake_duration, (histograms,) + options),
+      (c_stake_pool_crossover, (load_crossover(snapshot, snapshots),) + options), (c_sources_of_fund, (balances, funds_df) + options),
+      (c_cohort_retention, (cohorts,) + options),
+    ]
+  return []
+
+def default_tab_options(snapshot, snapshots = None):
+  # what each tab shows before anything is selected, so a fresh server has them ready too
+  pools = pool_names(load_events(snapshot, snapshots))
+  return [('Overview', (OVERVIEW_METRICS[0],)), ('Comparison', ('|'.join(pools),)), ('User Analysis', (pools[0], ANALYSIS_MONTHS[0]))]
+
+TABS = {'Overview': show_overview, 'Comparison': show_comparison, 'User Analysis': show_user_analysis, 'About': show_about}
+
+# read once per run so every section sees the same snapshot even if a refresh publishes meanwhile
+snapshot = current_snapshot_dir()
+# the first run of a server process, a refresh starts one itself as soon as it publishes
+warm_up().start(snapshot)
+
+if LAZY_TABS:
+  tab = st.radio('Tab', list(TABS), horizontal = True, label_visibility = 'collapsed', key = 'tab')
+  TABS[tab](snapshot)
+else:
+  for tab, show in zip(st.tabs(list(TABS)), TABS.values()):
+    with tab:
+      show(snapshot)
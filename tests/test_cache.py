@@ -0,0 +1,142 @@
+import threading
+import time
+import unittest
+
+import pandas as pd
+
+from cache import FrozenError, SnapshotCache
+
+def events():
+  return pd.DataFrame({
+    'address': ['w1', 'w2', 'w3'],
+    'stake_pool_name': pd.Categorical(['lido', 'marinade', 'lido']),
+    'amount': [1.5e9, 2e9, 3e9],
+    'block_timestamp': pd.to_datetime(['2022-01-05', '2022-02-03', '2022-02-20']),
+  })
+
+class SharedFrameTest(unittest.TestCase):
+  def setUp(self):
+    self.cache = SnapshotCache(keep = 2)
+    self.df = self.cache.get('data/snapshots/1', 'events', events)
+
+  def assertUnchanged(self):
+    pd.testing.assert_frame_equal(pd.DataFrame(self.cache.get('data/snapshots/1', 'events', events)), events())
+
+  def test_same_object_for_every_caller(self):
+    self.assertIs(self.cache.get('data/snapshots/1', 'events', events), self.df)
+
+  def test_column_assignment_raises(self):
+    with self.assertRaises(FrozenError):
+      self.df['amount'] = self.df['amount'] / 1e9
+    with self.assertRaises(FrozenError):
+      self.df['month'] = self.df['block_timestamp'].dt.strftime('%Y-%m')
+    with self.assertRaises(FrozenError):
+      self.df.stake_pool_name = self.df.stake_pool_name.str.title()
+    with self.assertRaises(FrozenError):
+      del self.df['amount']
+    self.assertUnchanged()
+
+  def test_loc_writes_raise(self):
+    with self.assertRaises(FrozenError):
+      self.df.loc[self.df['amount'] > 2e9, 'address'] = 'other'
+    with self.assertRaises(FrozenError):
+      self.df.loc[0, 'amount'] = 0
+    with self.assertRaises(FrozenError):
+      self.df.iloc[0, 0] = 'other'
+    with self.assertRaises(FrozenError):
+      self.df.at[0, 'address'] = 'other'
+    self.assertUnchanged()
+
+  def test_inplace_methods_raise(self):
+    with self.assertRaises(FrozenError):
+      self.df.drop(columns = ['amount'], inplace = True)
+    with self.assertRaises(FrozenError):
+      self.df.rename(columns = {'amount': 'sol'}, inplace = True)
+    with self.assertRaises(FrozenError):
+      self.df.sort_values('amount', ascending = False, inplace = True)
+    with self.assertRaises(FrozenError):
+      self.df.reset_index(drop = True, inplace = True)
+    with self.assertRaises(FrozenError):
+      self.df += 1
+    with self.assertRaises(FrozenError):
+      self.df.insert(0, 'month', '2022-01')
+    self.assertUnchanged()
+
+  def test_column_writes_raise(self):
+    with self.assertRaises(FrozenError):
+      self.df['address'].loc[0] = 'other'
+    with self.assertRaises(FrozenError):
+      self.df['amount'][0] = 0
+    with self.assertRaises(FrozenError):
+      self.df['amount'].fillna(0, inplace = True)
+    with self.assertRaises(ValueError):
+      self.df['amount'].values[0] = 0
+    self.assertUnchanged()
+
+  def test_derived_frames_are_the_callers(self):
+    selected = self.df[self.df['stake_pool_name'] == 'lido']
+    selected['amount'] = selected['amount'] / 1e9
+    copied = self.df.copy()
+    copied.loc[0, 'address'] = 'other'
+    copied.drop(columns = ['amount'], inplace = True)
+    self.assertEqual(selected['amount'].tolist(), [1.5, 3.0])
+    self.assertEqual(copied.columns.tolist(), ['address', 'stake_pool_name', 'block_timestamp'])
+    self.assertUnchanged()
+
+  def test_old_snapshots_are_pruned(self):
+    self.cache.get('data/snapshots/2', 'events', events)
+    self.cache.get('data/snapshots/3', 'events', events)
+    self.assertEqual(list(self.cache.entries), ['data/snapshots/2', 'data/snapshots/3'])
+
+class BuildTest(unittest.TestCase):
+  def setUp(self):
+    self.cache = SnapshotCache(keep = 2)
+
+  def slow_build(self, started, release):
+    def build():
+      started.set()
+      release.wait(5)
+      return events()
+    return build
+
+  def test_hit_does_not_wait_for_another_build(self):
+    self.cache.get('data/snapshots/1', 'events', events)
+    started, release = threading.Event(), threading.Event()
+    builder = threading.Thread(target = self.cache.get, args = ('data/snapshots/2', 'events', self.slow_build(started, release)))
+    builder.start()
+    started.wait(5)
+    begin = time.monotonic()
+    self.cache.get('data/snapshots/1', 'events', events)
+    self.cache.get('data/snapshots/2', 'net', events)
+    waited = time.monotonic() - begin
+    release.set()
+    builder.join()
+    self.assertLess(waited, 0.5)
+
+  def test_same_entry_builds_once(self):
+    started, release = threading.Event(), threading.Event()
+    builds = []
+    def build():
+      builds.append(1)
+      return self.slow_build(started, release)()
+    results = []
+    threads = [threading.Thread(target = lambda: results.append(self.cache.get('data/snapshots/1', 'events', build))) for _ in range(4)]
+    for thread in threads:
+      thread.start()
+    started.wait(5)
+    release.set()
+    for thread in threads:
+      thread.join()
+    self.assertEqual(len(builds), 1)
+    self.assertEqual(len(results), 4)
+    self.assertTrue(all(result is results[0] for result in results))
+
+  def test_failed_build_is_built_again(self):
+    def fail():
+      raise OSError('partition missing')
+    with self.assertRaises(OSError):
+      self.cache.get('data/snapshots/1', 'events', fail)
+    self.assertEqual(len(self.cache.get('data/snapshots/1', 'events', events)), 3)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,173 @@
+import unittest
+from datetime import datetime
+
+import pandas as pd
+
+from indexes import BalanceIndex, CrossoverMatrix, StakeHistograms, StakerCountEngine, prepare_events
+
+SOL = 10**9
+
+def actions(rows):
+  # (block_timestamp, tx_id, address, stake_pool_name, action, SOL) as fact_stake_pool_actions stores them
+  return pd.DataFrame({
+    'block_timestamp': pd.to_datetime([row[0] for row in rows]),
+    'tx_id': [row[1] for row in rows],
+    'succeeded': True,
+    'address': [row[2] for row in rows],
+    'stake_pool_name': [row[3] for row in rows],
+    'action': [row[4] for row in rows],
+    'amount': [row[5] * SOL for row in rows],
+  })
+
+# w1 stakes in lido and marinade, w2 in lido, w3 leaves marinade in February and w4 joins socean in March
+ACTIONS = actions([
+  ('2022-01-03', 't01', 'w1', 'lido', 'deposit', 50),
+  ('2022-01-05', 't02', 'w1', 'marinade', 'deposit_stake', 20),
+  ('2022-01-10', 't03', 'w2', 'lido', 'deposit', 500),
+  ('2022-01-20', 't04', 'w3', 'marinade', 'deposit', 5),
+  ('2022-02-02', 't05', 'w3', 'marinade', 'withdraw', 5),
+  ('2022-02-02', 't06', 'w2', 'lido', 'deposit', 1000),
+  ('2022-02-15', 't07', 'w1', 'lido', 'withdraw_stake', 10),
+  ('2022-03-01', 't08', 'w4', 'socean', 'deposit', 20000),
+  ('2022-03-01', 't09', 'w1', 'marinade', 'order_unstake', 20),
+  ('2022-03-09', 't10', 'w3', 'marinade', 'deposit', 1),
+])
+
+def sorted_frame(df):
+  df = df.astype({column: str for column in df.columns if df[column].dtype.name in ('object', 'category')})
+  return df.sort_values(df.columns.tolist()).reset_index(drop = True)
+
+class StakerCountEngineTest(unittest.TestCase):
+  def built(self, *batches):
+    engine = StakerCountEngine()
+    for batch in batches:
+      engine.append(batch)
+    return engine
+
+  def assertSameEngine(self, engine, expected):
+    for name in ('counts', 'pool_counts', 'memberships', 'balances', 'first_deposits'):
+      pd.testing.assert_frame_equal(sorted_frame(getattr(engine, name)), sorted_frame(getattr(expected, name)), check_dtype = False, obj = name)
+    self.assertEqual(engine.pools, expected.pools)
+    self.assertEqual(engine.watermark['block_timestamp'], expected.watermark['block_timestamp'])
+
+  def test_two_batches_equal_one(self):
+    once = self.built(ACTIONS)
+    self.assertSameEngine(self.built(ACTIONS.iloc[:5], ACTIONS.iloc[5:]), once)
+    self.assertSameEngine(self.built(ACTIONS.iloc[:2], ACTIONS.iloc[2:]), once)
+
+  def test_batches_fetched_again_from_the_watermark(self):
+    # the ingest fetches again from the watermark timestamp, rows seen already are skipped
+    once = self.built(ACTIONS)
+    twice = self.built(ACTIONS.iloc[:5], ACTIONS.iloc[4:], ACTIONS.iloc[7:])
+    self.assertSameEngine(twice, once)
+
+  def test_staker_counts(self):
+    engine = self.built(ACTIONS)
+    self.assertEqual(dict(zip(engine.counts['month'], engine.counts['staker_count'])), {'2022-01': 3, '2022-02': 2, '2022-03': 4})
+    pool_counts = {(row.date_stake, row.stake_pool_name): row.staker_status for row in engine.pool_counts.itertuples()}
+    self.assertEqual(pool_counts, {
+      ('2022-01', 'Lido'): 2, ('2022-01', 'Marinade'): 2, ('2022-02', 'Lido'): 2, ('2022-02', 'Marinade'): 1,
+      ('2022-03', 'Lido'): 2, ('2022-03', 'Marinade'): 2, ('2022-03', 'Socean'): 1,
+    })
+
+  def test_multi_pool_memberships(self):
+    engine = self.built(ACTIONS)
+    bit = {pool: 1 << engine.pools.index(pool) for pool in engine.pools}
+    memberships = {(row.date_stake, row.pool_mask): row.staker_count for row in engine.memberships.itertuples()}
+    self.assertEqual(memberships, {
+      # w1 in both, w2 in lido, w3 in marinade
+      ('2022-01', bit['lido'] | bit['marinade']): 1, ('2022-01', bit['lido']): 1, ('2022-01', bit['marinade']): 1,
+      # w3 has left marinade
+      ('2022-02', bit['lido'] | bit['marinade']): 1, ('2022-02', bit['lido']): 1,
+      ('2022-03', bit['lido'] | bit['marinade']): 1, ('2022-03', bit['lido']): 1, ('2022-03', bit['marinade']): 1,
+      ('2022-03', bit['socean']): 1,
+    })
+
+  def test_first_deposits(self):
+    engine = self.built(ACTIONS.iloc[:6], ACTIONS.iloc[6:])
+    first = {(row.address, row.stake_pool_name): row.month_key for row in engine.first_deposits.itertuples()}
+    self.assertEqual(first, {('w1', 'lido'): 202201, ('w1', 'marinade'): 202201, ('w2', 'lido'): 202201, ('w3', 'marinade'): 202201, ('w4', 'socean'): 202203})
+
+  def test_mask_pools_overflow(self):
+    engine = self.built(ACTIONS)
+    pools = [f'pool{i}' for i in range(StakerCountEngine.MASK_POOLS - len(engine.pools))]
+    engine.append(actions([('2022-04-01', f'f{i}', 'w5', pool, 'deposit', 1) for i, pool in enumerate(pools)]))
+    self.assertEqual(len(engine.pools), StakerCountEngine.MASK_POOLS)
+    counts = engine.counts.copy()
+    with self.assertRaises(ValueError):
+      engine.append(actions([('2022-04-02', 'f99', 'w5', 'one_too_many', 'deposit', 1)]))
+    self.assertEqual(len(engine.pools), StakerCountEngine.MASK_POOLS)
+    pd.testing.assert_frame_equal(engine.counts, counts)
+
+class BalanceIndexTest(unittest.TestCase):
+  def setUp(self):
+    self.balances = BalanceIndex(prepare_events(ACTIONS))
+
+  def test_as_of(self):
+    stakers = self.balances.stakers('2022-02-28')
+    self.assertEqual(sorted(zip(stakers['address'], stakers['stake_pool_name'].astype(str), stakers['net_stake'])),
+      [('w1', 'lido', 40.0), ('w1', 'marinade', 20.0), ('w2', 'lido', 1500.0)])
+    # an unstake order takes the stake out for the User Analysis views
+    stakers = self.balances.stakers('2022-03-31', 'marinade')
+    self.assertEqual(list(zip(stakers['address'], stakers['net_stake'])), [('w3', 1.0)])
+    self.assertEqual(len(self.balances.stakers('2021-12-31')), 0)
+    self.assertEqual(len(self.balances.stakers('2022-03-31', 'jito')), 0)
+
+  def test_staking_months(self):
+    staking = self.balances.staking_months('marinade')
+    months = sorted((address, str(month.astype('datetime64[M]'))) for address, month in zip(staking['address'], staking['month'].values))
+    self.assertEqual(months, [('w1', '2022-01'), ('w1', '2022-02'), ('w3', '2022-01'), ('w3', '2022-03')])
+
+class CrossoverMatrixTest(unittest.TestCase):
+  def setUp(self):
+    self.crossover = CrossoverMatrix(BalanceIndex(prepare_events(ACTIONS)))
+
+  def test_pairs(self):
+    pairs = self.crossover.pairs('2022-02')
+    self.assertEqual(pairs.loc['lido', 'lido'], 2)
+    self.assertEqual(pairs.loc['marinade', 'marinade'], 1)
+    self.assertEqual(pairs.loc['lido', 'marinade'], 1)
+    self.assertEqual(pairs.loc['marinade', 'lido'], 1)
+    self.assertEqual(pairs.loc['socean'].sum(), 0)
+    # before the first month nobody stakes, after the last one it holds
+    self.assertEqual(self.crossover.pairs('2021-12').values.sum(), 0)
+    pd.testing.assert_frame_equal(self.crossover.pairs('2022-09'), self.crossover.pairs('2022-03'))
+
+  def test_crossover(self):
+    self.assertEqual(self.crossover.crossover('lido', '2022-01').to_dict(), {'marinade': 1})
+    self.assertEqual(len(self.crossover.crossover('lido', '2022-03')), 0)
+    self.assertEqual(len(self.crossover.crossover('jito', '2022-01')), 0)
+
+  def test_overlap(self):
+    self.assertEqual(self.crossover.overlap(['lido', 'marinade'], '2022-01'), 1)
+    self.assertEqual(self.crossover.overlap(['lido', 'marinade'], '2022-03'), 0)
+    self.assertEqual(self.crossover.overlap(['lido'], '2022-02'), 2)
+
+class StakeHistogramsTest(unittest.TestCase):
+  def setUp(self):
+    events = prepare_events(ACTIONS)
+    self.histograms = StakeHistograms(events, BalanceIndex(events), [10, 100, 1000, 10000], [7, 30, 90, 180, 360], now = datetime(2022, 3, 20))
+
+  def histogram(self, df):
+    return dict(zip(df['category'], df['count_wallets']))
+
+  def test_labels(self):
+    self.assertEqual(self.histograms.amount_labels, ['a. SOL < 10', 'b. 10 < SOL < 100', 'c. 100 < SOL < 1,000', 'd. 1,000 < SOL < 10,000', 'e. 10,000 < SOL'])
+    self.assertEqual(self.histograms.age_labels[:3], ['a. Stake < 1 Week', 'b. 1 Week < Stake < 1 Month', 'c. 1 Month < Stake < 3 Months'])
+
+  def test_amount(self):
+    self.assertEqual(self.histogram(self.histograms.amount('lido', '2022-01')), {'b. 10 < SOL < 100': 1, 'c. 100 < SOL < 1,000': 1})
+    self.assertEqual(self.histogram(self.histograms.amount('lido', '2022-02')), {'b. 10 < SOL < 100': 1, 'd. 1,000 < SOL < 10,000': 1})
+    self.assertEqual(self.histogram(self.histograms.amount('socean', '2022-03')), {'e. 10,000 < SOL': 1})
+    self.assertEqual(len(self.histograms.amount('lido', '2021-12')), 0)
+
+  def test_age(self):
+    # from the wallet's first action in the pool to the month end
+    self.assertEqual(self.histogram(self.histograms.age('lido', '2022-02')), {'c. 1 Month < Stake < 3 Months': 2})
+    # w1's unstake order took it out, w3 counts from its first deposit in January
+    self.assertEqual(self.histogram(self.histograms.age('marinade', '2022-03')), {'c. 1 Month < Stake < 3 Months': 1})
+    # the running month is aged to now rather than to its end
+    self.assertEqual(self.histogram(self.histograms.age('socean', '2022-03')), {'b. 1 Week < Stake < 1 Month': 1})
+
+if __name__ == '__main__':
+  unittest.main()
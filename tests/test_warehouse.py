@@ -0,0 +1,77 @@
+import threading
+import time
+import types
+import unittest
+
+from warehouse import query_pages
+
+class StubShroomDK:
+  # serves canned rows a page at a time like ShroomDK.query, later pages answering faster
+  def __init__(self, rows, latency = 0.02):
+    self.rows = rows
+    self.latency = latency
+    self.lock = threading.Lock()
+    self.pages = []
+    self.running = 0
+    self.peak = 0
+
+  def query(self, sql, page_size, page_number):
+    with self.lock:
+      self.pages.append(page_number)
+      self.running += 1
+      self.peak = max(self.peak, self.running)
+    time.sleep(self.latency / page_number)
+    with self.lock:
+      self.running -= 1
+    rows = self.rows[(page_number - 1) * page_size:page_number * page_size]
+    return types.SimpleNamespace(columns = ['TX_ID', 'AMOUNT'], rows = [list(row) for row in rows])
+
+def actions(count):
+  return [(f't{i}', i * 10**9) for i in range(count)]
+
+class QueryPagesTest(unittest.TestCase):
+  def fetch(self, client, page_size = 10, max_workers = 4, slots = None):
+    return query_pages('select * from solana.core.fact_stake_pool_actions', client, page_size, max_workers, slots)
+
+  def assertRows(self, df, count):
+    self.assertEqual(df.columns.tolist(), ['tx_id', 'amount'])
+    self.assertEqual(df['tx_id'].tolist(), [f't{i}' for i in range(count)])
+    self.assertEqual(df.index.tolist(), list(range(count)))
+
+  def test_short_page_partway_through_a_wave(self):
+    # pages 2-5 come back full, then page 6 of the wave 6-9 is short and the rest empty
+    client = StubShroomDK(actions(57))
+    self.assertRows(self.fetch(client), 57)
+    self.assertEqual(sorted(client.pages), list(range(1, 10)))
+
+  def test_exact_multiple_of_page_size(self):
+    # the last full page is only known to be the last once a wave of empty pages comes back
+    client = StubShroomDK(actions(50))
+    self.assertRows(self.fetch(client), 50)
+    self.assertEqual(sorted(client.pages), list(range(1, 10)))
+
+  def test_short_first_page(self):
+    client = StubShroomDK(actions(7))
+    self.assertRows(self.fetch(client), 7)
+    self.assertEqual(client.pages, [1])
+
+  def test_zero_rows(self):
+    client = StubShroomDK([])
+    df = self.fetch(client)
+    self.assertEqual(df.columns.tolist(), ['tx_id', 'amount'])
+    self.assertEqual(len(df), 0)
+    self.assertEqual(client.pages, [1])
+
+  def test_row_order_across_concurrent_waves(self):
+    # later pages of a wave finish first, the rows still come back in page order
+    client = StubShroomDK(actions(333), latency = 0.05)
+    self.assertRows(self.fetch(client, max_workers = 8), 333)
+    self.assertGreater(client.peak, 1)
+
+  def test_slots_cap_concurrent_calls(self):
+    client = StubShroomDK(actions(200))
+    self.assertRows(self.fetch(client, max_workers = 8, slots = threading.BoundedSemaphore(2)), 200)
+    self.assertLessEqual(client.peak, 2)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,35 @@
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+# WAREHOUSE PAGES
+# a query's result set, fetched page by page from anything with ShroomDK's
+# query(sql, page_size=, page_number=) signature, so a stand-in serving canned pages works as well
+
+def query_pages(sql, client, page_size, max_workers, slots = None):
+  # slots, when given, is taken around every call, so the pages share one cap with the other queries
+  slots = slots or contextlib.nullcontext()
+
+  def fetch(page_number):
+    with slots:
+      return client.query(sql, page_size=page_size, page_number=page_number)
+
+  first = fetch(1)
+  columns = [c.lower() for c in first.columns or []]
+  pages = [first.rows or []]
+
+  # a full first page means there is more; the result set carries no total row count,
+  # so the remaining pages are pulled in concurrent waves until a short page comes back
+  if len(pages[0]) == page_size:
+    with ThreadPoolExecutor(max_workers = max_workers) as pool:
+      next_page = 2
+      while len(pages[-1]) == page_size:
+        wave = pool.map(fetch, range(next_page, next_page + max_workers))
+        pages.extend(result.rows or [] for result in wave)
+        next_page = next_page + max_workers
+
+  frames = [pd.DataFrame(rows, columns = columns) for rows in pages if rows]
+  if len(frames) == 0:
+    return pd.DataFrame(columns = columns)
+  return pd.concat(frames, ignore_index = True)